@@ -8,31 +8,71 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parents[2]
 
 UPLOAD_DIR = str(BASE_DIR / "backend" / "data" / "uploads")
+# Batch uploads: parser processes (0 = parse inline; default leaves one core to the
+# server) and files written per transaction
+UPLOAD_PARSE_WORKERS = int(os.getenv("UPLOAD_PARSE_WORKERS", str(min(4, (os.cpu_count() or 1) - 1))))
+UPLOAD_COMMIT_BATCH = int(os.getenv("UPLOAD_COMMIT_BATCH", "16"))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "500"))
+# Decompressed size limits for archive members and for everything one batch writes;
+# members over the limit are reported as failed instead of filling the upload folder
+UPLOAD_MAX_MEMBER_BYTES = int(os.getenv("UPLOAD_MAX_MEMBER_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_MAX_BATCH_BYTES = int(os.getenv("UPLOAD_MAX_BATCH_BYTES", str(2 * 1024 * 1024 * 1024)))
 CHROMA_DIR = str(BASE_DIR / "backend" / "chroma_store")
 FAISS_DIR = str(BASE_DIR / "backend" / "faiss_store")
 STORE_DB_PATH = str(BASE_DIR / "backend" / "data" / "rag_store.sqlite3")
-
-# Create folders if not exist
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(CHROMA_DIR, exist_ok=True)
-os.makedirs(FAISS_DIR, exist_ok=True)
+# Full rebuilds write a new store generation here and swap it in via the pointer file
+STORE_GENERATIONS_DIR = str(BASE_DIR / "backend" / "data" / "generations")
+STORE_POINTER_PATH = str(BASE_DIR / "backend" / "data" / "rag_store.current")
+# Present while a rebuild runs; uploads are refused until the new generation is live
+STORE_REBUILD_MARKER_PATH = str(BASE_DIR / "backend" / "data" / "rag_store.rebuilding")
+STORE_KEEP_GENERATIONS = int(os.getenv("STORE_KEEP_GENERATIONS", "2"))
+STORE_BUSY_TIMEOUT_SECONDS = float(os.getenv("STORE_BUSY_TIMEOUT_SECONDS", "30"))
+# Threads (each with its own connection) serving store reads for async routes; writes use one thread
+STORE_READER_THREADS = int(os.getenv("STORE_READER_THREADS", "4"))
+# Admission control per route group: requests served at once, requests allowed to wait
+# for a slot (beyond that the API answers 503 with Retry-After) and the longest wait
+# before giving up with 503; a concurrency of 0 disables the limit
+ADMISSION_LIMITS = {
+    group: {
+        "concurrency": int(os.getenv(f"ADMISSION_{group.upper()}_CONCURRENCY", concurrency)),
+        "queue_size": int(os.getenv(f"ADMISSION_{group.upper()}_QUEUE", queue_size)),
+        "timeout": float(os.getenv(f"ADMISSION_{group.upper()}_TIMEOUT_SECONDS", timeout)),
+    }
+    for group, concurrency, queue_size, timeout in (
+        ("query", "8", "32", "30"),
+        ("upload", "2", "8", "300"),
+        ("debug", "2", "4", "10"),
+    )
+}
+# Memory-mapped retrieval index, one file per corpus version shared by all workers
+RETRIEVAL_INDEX_DIR = str(BASE_DIR / "backend" / "data" / "index")
 
 # RAG logs
 LOG_DIR = str(BASE_DIR / "backend" / "data" / "logs")
 LOG_PATH = str(Path(LOG_DIR) / "rag_queries.jsonl")
 TRACE_LOG_PATH = str(Path(LOG_DIR) / "rag_trace.jsonl")
 APP_LOG_PATH = str(Path(LOG_DIR) / "app.log")
-os.makedirs(LOG_DIR, exist_ok=True)
 
 # Local Ollama defaults
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
 OLLAMA_TIMEOUT_SECONDS = int(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120"))
+# Model lifecycle: keep_alive sent with every call ("30m", seconds, -1 = forever),
+# preload on startup, idle keep-warm ping interval (0 disables) and a fixed context
+# window (0 = sized from CONTEXT_TOKEN_BUDGET) so calls never force a reload
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip()
+OLLAMA_PRELOAD = os.getenv("OLLAMA_PRELOAD", "true").strip().lower() == "true"
+OLLAMA_KEEP_WARM_SECONDS = float(os.getenv("OLLAMA_KEEP_WARM_SECONDS", "300"))
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
 
 # Hosted Groq defaults for free-tier usage
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
 GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "").strip()
+# Free-tier budgets for llama-3.1-8b-instant; response headers refine them at runtime
+GROQ_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", "30"))
+GROQ_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", "6000"))
+GROQ_COMPLETION_TOKEN_RESERVE = int(os.getenv("GROQ_COMPLETION_TOKEN_RESERVE", "256"))
 
 _requested_provider = os.getenv("LLM_PROVIDER", "").strip().lower()
 if _requested_provider:
@@ -55,11 +95,84 @@ if not LLM_API_KEY and LLM_PROVIDER == "groq":
     LLM_API_KEY = GROQ_API_KEY
 
 LLM_TIMEOUT_SECONDS = int(os.getenv("LLM_TIMEOUT_SECONDS", str(OLLAMA_TIMEOUT_SECONDS)))
+
+# Provider routing: failover (off unless LLM_FALLBACK_PROVIDER is set), retries,
+# circuit breaker and hedging
+LLM_FALLBACK_PROVIDER = os.getenv("LLM_FALLBACK_PROVIDER", "").strip().lower()
+LLM_PROVIDER_SETTINGS = {
+    "groq": {
+        "model": GROQ_MODEL,
+        "base_url": GROQ_BASE_URL,
+        "api_key": GROQ_API_KEY,
+        "timeout": LLM_TIMEOUT_SECONDS,
+    },
+    "ollama": {
+        "model": OLLAMA_MODEL,
+        "base_url": OLLAMA_BASE_URL,
+        "api_key": "",
+        "timeout": OLLAMA_TIMEOUT_SECONDS,
+    },
+}
+if LLM_PROVIDER in LLM_PROVIDER_SETTINGS:
+    LLM_PROVIDER_SETTINGS[LLM_PROVIDER] = {
+        "model": LLM_MODEL,
+        "base_url": LLM_BASE_URL,
+        "api_key": LLM_API_KEY,
+        "timeout": LLM_TIMEOUT_SECONDS,
+    }
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_WAIT_SECONDS = float(os.getenv("LLM_RETRY_MAX_WAIT_SECONDS", "8"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").strip().lower() == "true"
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "1000"))
+LLM_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "5000"))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 TRACE_PREVIEW_CHARS = int(os.getenv("TRACE_PREVIEW_CHARS", "280"))
 TRACE_MAX_CHUNKS_LOGGED = int(os.getenv("TRACE_MAX_CHUNKS_LOGGED", "200"))
+# Share (0-1) of query traces written to rag_trace.jsonl, decided per trace_id
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+# How retrieved chunks are logged: "refs" (ids + content hashes, resolved from the
+# store on read), "preview" (refs plus previews) or "full" (chunk text and context)
+LOG_DETAIL = os.getenv("LOG_DETAIL", "refs").strip().lower()
+
+# Early abstention: thresholds fitted by scripts/calibrate_abstention.py; low-confidence
+# retrievals are refused before the LLM call (nothing is refused until the file exists)
+ABSTAIN_CALIBRATION_PATH = str(BASE_DIR / "backend" / "data" / "abstain_calibration.json")
+EARLY_ABSTAIN = os.getenv("EARLY_ABSTAIN", "true").strip().lower() == "true"
+
+# Prompt context packing (estimated tokens, ~4 characters each)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+
+# On-demand profiling (also enabled per request with the X-Profile header)
+PROFILE_DIR = str(Path(LOG_DIR) / "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2"))
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "100"))
+
+# Opt-in per-request memory accounting with tracemalloc: share of requests traced (0-1;
+# the X-Memory-Trace: 1 header forces it), stack frames kept per allocation (each one
+# slows traced requests; deeper stacks attribute library allocations to app code),
+# allocation sites reported, records kept and how often the peak is sampled
+MEMORY_TRACE_SAMPLE_RATE = float(os.getenv("MEMORY_TRACE_SAMPLE_RATE", "0"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "4"))
+MEMORY_TRACE_TOP_SITES = int(os.getenv("MEMORY_TRACE_TOP_SITES", "10"))
+MEMORY_TRACE_MAX_RECORDS = int(os.getenv("MEMORY_TRACE_MAX_RECORDS", "500"))
+MEMORY_TRACE_INTERVAL_MS = float(os.getenv("MEMORY_TRACE_INTERVAL_MS", "20"))
+# Warn when a route's peak allocations scale with corpus size at least this steeply
+# (1 = proportional), judged once the corpus has grown by MEMORY_GROWTH_MIN_CORPUS_RATIO
+MEMORY_GROWTH_WARN_ELASTICITY = float(os.getenv("MEMORY_GROWTH_WARN_ELASTICITY", "0.5"))
+MEMORY_GROWTH_MIN_CORPUS_RATIO = float(os.getenv("MEMORY_GROWTH_MIN_CORPUS_RATIO", "2"))
 
 # MongoDB logging (optional)
 MONGO_URI = os.getenv("MONGO_URI", "")
 MONGO_DB = os.getenv("MONGO_DB", "personal_rag")
 MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "rag_logs")
+
+
+def ensure_data_dirs() -> None:
+    """Create runtime data folders; called on startup instead of at import time."""
+    for path in (UPLOAD_DIR, LOG_DIR):
+        os.makedirs(path, exist_ok=True)
@@ -0,0 +1,103 @@
+import json
+import math
+from pathlib import Path
+from threading import Lock
+
+from app.config import ABSTAIN_CALIBRATION_PATH, EARLY_ABSTAIN
+
+
+# A retrieval is refused when any feature falls below its calibrated threshold
+CONFIDENCE_FEATURES = ("top_score", "token_coverage")
+# Threshold candidates tried per feature during calibration
+MAX_CANDIDATES = 40
+
+_lock = Lock()
+_loaded: dict = {"mtime": None, "thresholds": None}
+
+
+def confidence_features(tokens: set[str], chunks: list[dict]) -> dict:
+    """Retrieval confidence known before the LLM call.
+
+    ``top_score`` is the best chunk's retrieval score; ``token_coverage`` the
+    share of the query's meaningful tokens found anywhere in the retrieved text.
+    """
+    if not chunks:
+        return {"top_score": 0, "token_coverage": 0.0}
+    texts = [(chunk.get("content") or "").lower() for chunk in chunks]
+    found = sum(1 for token in tokens if any(token in text for text in texts))
+    return {
+        "top_score": max(chunk.get("score") or 0 for chunk in chunks),
+        "token_coverage": round(found / len(tokens), 3) if tokens else 1.0,
+    }
+
+
+def load_thresholds() -> dict | None:
+    """Calibrated thresholds, re-read whenever the calibration file changes."""
+    path = Path(ABSTAIN_CALIBRATION_PATH)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if _loaded["mtime"] != mtime:
+            try:
+                calibration = json.loads(path.read_text(encoding="utf-8"))
+                _loaded["thresholds"] = {feature: calibration["thresholds"][feature] for feature in CONFIDENCE_FEATURES}
+            except (OSError, ValueError, KeyError):
+                _loaded["thresholds"] = None
+            _loaded["mtime"] = mtime
+        return _loaded["thresholds"]
+
+
+def refuses(features: dict, thresholds: dict) -> bool:
+    return any(features[feature] < thresholds[feature] for feature in CONFIDENCE_FEATURES)
+
+
+def early_abstain_thresholds(features: dict) -> dict | None:
+    """The thresholds ``features`` fall below, or None when the query should go to the LLM."""
+    if not EARLY_ABSTAIN:
+        return None
+    thresholds = load_thresholds()
+    if thresholds and refuses(features, thresholds):
+        return thresholds
+    return None
+
+
+def _candidates(values: list[float]) -> list[float]:
+    """0 (feature unused) plus midpoints between observed values, thinned to MAX_CANDIDATES."""
+    distinct = sorted(set(values))
+    midpoints = [round((low + high) / 2, 4) for low, high in zip(distinct, distinct[1:])]
+    if len(midpoints) > MAX_CANDIDATES:
+        step = len(midpoints) / MAX_CANDIDATES
+        midpoints = [midpoints[int(index * step)] for index in range(MAX_CANDIDATES)]
+    return [0] + midpoints
+
+
+def fit_thresholds(samples: list[dict], max_false_abstain_rate: float = 0.0) -> dict:
+    """Pick thresholds refusing as many should-abstain samples as possible.
+
+    ``samples`` are ``{"features": {...}, "abstain": bool}``. At most
+    ``max_false_abstain_rate`` of the answerable samples may be refused; ties
+    go to the lower thresholds.
+    """
+    answerable = sum(1 for sample in samples if not sample["abstain"])
+    allowed = math.floor(max_false_abstain_rate * answerable)
+    score_candidates = _candidates([sample["features"]["top_score"] for sample in samples])
+    coverage_candidates = _candidates([sample["features"]["token_coverage"] for sample in samples])
+    best_key, best = None, {"top_score": 0, "token_coverage": 0}
+    for score_threshold in score_candidates:
+        for coverage_threshold in coverage_candidates:
+            thresholds = {"top_score": score_threshold, "token_coverage": coverage_threshold}
+            true_refusals = false_refusals = 0
+            for sample in samples:
+                if refuses(sample["features"], thresholds):
+                    if sample["abstain"]:
+                        true_refusals += 1
+                    else:
+                        false_refusals += 1
+            if false_refusals > allowed:
+                continue
+            key = (true_refusals, -false_refusals, -score_threshold, -coverage_threshold)
+            if best_key is None or key > best_key:
+                best_key, best = key, thresholds
+    return best
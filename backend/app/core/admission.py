@@ -0,0 +1,149 @@
+import asyncio
+import math
+from collections import deque
+from time import perf_counter
+
+from fastapi import HTTPException, Request
+
+from app.config import ADMISSION_LIMITS
+from app.core.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT
+from app.core.rag_logger import log_trace_event
+
+
+# Weight of the newest request in the running average hold time used for Retry-After
+HOLD_TIME_SMOOTHING = 0.2
+MAX_RETRY_AFTER_SECONDS = 120
+
+
+class AdmissionLimiter:
+    """A concurrency limit with a bounded FIFO wait queue, on the event loop.
+
+    Up to ``concurrency`` requests hold a slot at once and ``queue_size``
+    more wait for one, at most ``timeout`` seconds each. Anything beyond that
+    is rejected with 503 and a ``Retry-After`` estimated from how long slots
+    have recently been held, so a burst fails fast instead of piling up.
+    """
+
+    def __init__(self, group: str, concurrency: int, queue_size: int, timeout: float):
+        self.group = group
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.hold_seconds = 1.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def queue_depth(self) -> int:
+        return sum(1 for future in self._waiters if not future.done())
+
+    def retry_after(self) -> int:
+        waves = (self.queue_depth() + 1) / max(self.concurrency, 1)
+        return min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(waves * self.hold_seconds)))
+
+    async def acquire(self) -> dict:
+        """Wait for a slot; returns what the request saw (depth on arrival, wait)."""
+        started = perf_counter()
+        depth = self.queue_depth()
+        if self.active < self.concurrency and not depth:
+            self.active += 1
+        else:
+            if depth >= self.queue_size:
+                self._reject("queue_full", depth)
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            ADMISSION_QUEUE_DEPTH.labels(self.group).set(self.queue_depth())
+            try:
+                await asyncio.wait_for(future, self.timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+                if future.done() and not future.cancelled():
+                    # the slot was handed over just as the wait ended
+                    self.release(None)
+                elif future in self._waiters:
+                    self._waiters.remove(future)
+                ADMISSION_QUEUE_DEPTH.labels(self.group).set(self.queue_depth())
+                if isinstance(exc, asyncio.CancelledError):
+                    raise
+                self._reject("timeout", depth)
+            ADMISSION_QUEUE_DEPTH.labels(self.group).set(self.queue_depth())
+        self.admitted += 1
+        wait_ms = round((perf_counter() - started) * 1000, 2)
+        ADMISSION_WAIT.labels(self.group).observe(wait_ms / 1000)
+        return {"group": self.group, "queue_depth": depth, "queue_wait_ms": wait_ms, "admitted_at": perf_counter()}
+
+    def release(self, ticket: dict | None) -> None:
+        if ticket is not None:
+            held = perf_counter() - ticket["admitted_at"]
+            self.hold_seconds += HOLD_TIME_SMOOTHING * (held - self.hold_seconds)
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                # hand the slot straight to the next waiter
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _reject(self, reason: str, depth: int):
+        self.rejected += 1
+        retry_after = self.retry_after()
+        ADMISSION_REJECTED.labels(self.group, reason).inc()
+        log_trace_event(
+            "admission.rejected",
+            {
+                "group": self.group,
+                "reason": reason,
+                "queue_depth": depth,
+                "active": self.active,
+                "retry_after_seconds": retry_after,
+            },
+            always=True,
+        )
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({self.group} {reason.replace('_', ' ')}), retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def status(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "timeout_seconds": self.timeout,
+            "active": self.active,
+            "queue_depth": self.queue_depth(),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "hold_seconds": round(self.hold_seconds, 3),
+        }
+
+
+limiters = {group: AdmissionLimiter(group, **limits) for group, limits in ADMISSION_LIMITS.items()}
+
+
+def admission(group: str):
+    """Route dependency holding one of ``group``'s slots for the length of the request.
+
+    What the request saw is left in ``request.state.admission`` for the
+    request log and trace events.
+    """
+    limiter = limiters[group]
+
+    async def admit(request: Request):
+        if limiter.concurrency <= 0:
+            yield
+            return
+        ticket = await limiter.acquire()
+        request.state.admission = {key: value for key, value in ticket.items() if key != "admitted_at"}
+        if ticket["queue_wait_ms"] >= 1:
+            log_trace_event(
+                "admission.queued",
+                {**request.state.admission, "path": request.url.path},
+                always=True,
+            )
+        try:
+            yield
+        finally:
+            limiter.release(ticket)
+
+    return admit
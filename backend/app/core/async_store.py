@@ -0,0 +1,91 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import STORE_READER_THREADS
+from app.core.document_store import DocumentStore, get_document_store, keep_thread_connections
+
+
+# Store methods that write; everything else public is a read
+WRITE_METHODS = frozenset(
+    {
+        "upsert_document",
+        "upsert_document_stream",
+        "upsert_documents",
+        "backfill_entities",
+        "recompress",
+        "vacuum",
+    }
+)
+
+
+class AsyncDocumentStore:
+    """Awaitable access to the active ``DocumentStore`` that never blocks the event loop.
+
+    Reads run on a small pool of reader threads and writes on one writer
+    thread, each keeping its own SQLite connection. Writes are therefore
+    serialized in-process instead of queueing on SQLite's write lock, and a
+    long scan or ingest only occupies its own thread. Store methods are
+    available as coroutines (``await async_store.page_documents(...)``);
+    ``read``/``write`` run any blocking callable on the matching thread.
+    """
+
+    def __init__(self, readers: int):
+        self.readers = max(readers, 1)
+        self._readers: ThreadPoolExecutor | None = None
+        self._writer: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _executor(self, kind: str) -> ThreadPoolExecutor:
+        with self._lock:
+            if kind == "read":
+                if self._readers is None:
+                    self._readers = ThreadPoolExecutor(
+                        max_workers=self.readers,
+                        thread_name_prefix="rag-store-read",
+                        initializer=keep_thread_connections,
+                    )
+                return self._readers
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="rag-store-write",
+                    initializer=keep_thread_connections,
+                )
+            return self._writer
+
+    async def read(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor("read"), functools.partial(fn, *args, **kwargs)
+        )
+
+    async def write(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor("write"), functools.partial(fn, *args, **kwargs)
+        )
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not callable(getattr(DocumentStore, name, None)):
+            raise AttributeError(name)
+        run = self.write if name in WRITE_METHODS else self.read
+
+        async def call(*args, **kwargs):
+            # resolved on the store thread so a generation swap is picked up
+            return await run(lambda: getattr(get_document_store(), name)(*args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+    def shutdown(self) -> None:
+        with self._lock:
+            readers, writer = self._readers, self._writer
+            self._readers = self._writer = None
+        if readers is not None:
+            readers.shutdown(wait=False, cancel_futures=True)
+        if writer is not None:
+            # let an in-flight ingest commit
+            writer.shutdown(wait=True)
+
+
+async_store = AsyncDocumentStore(STORE_READER_THREADS)
@@ -0,0 +1,110 @@
+"""Optional compression for stored chunk text.
+
+Compressed values are stored as BLOBs that start with a codec tag and the id
+of the dictionary they were compressed with, so plain TEXT rows, rows written
+with older dictionaries and freshly compressed rows can all be read side by
+side. Dictionaries are trained per corpus by ``scripts/compress_store.py``.
+"""
+import importlib
+import struct
+import zlib
+from collections import Counter
+
+
+CODECS = ("none", "zlib", "zstd")
+CODEC_TAGS = {"zlib": b"z", "zstd": b"s"}
+HEADER = struct.Struct(">cI")
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 12
+# zlib can only reference the last 32 KB of a preset dictionary
+DICTIONARY_SIZE = 32 * 1024
+TRAINING_SAMPLE_CHARS = 1024
+
+
+def _zstd():
+    try:
+        return importlib.import_module("zstandard")
+    except ImportError as exc:
+        raise RuntimeError("The zstd codec requires the optional zstandard package") from exc
+
+
+def training_samples(texts, sample_chars: int = TRAINING_SAMPLE_CHARS) -> list[str]:
+    """Cut texts into chunk-sized samples, the unit a dictionary has to help with."""
+    samples = []
+    for text in texts:
+        for start in range(0, len(text), sample_chars):
+            samples.append(text[start:start + sample_chars])
+    return samples
+
+
+def train_dictionary(codec: str, samples: list[str], size: int = DICTIONARY_SIZE) -> bytes:
+    """Build a preset dictionary from corpus samples; empty when there is too little data."""
+    if codec == "zstd":
+        zstd = _zstd()
+        try:
+            return zstd.train_dictionary(size, [sample.encode("utf-8") for sample in samples]).as_bytes()
+        except zstd.ZstdError:
+            return b""
+    if codec != "zlib" or not samples:
+        return b""
+
+    # Score recurring word trigrams by the bytes they could save and pack the
+    # best ones last, where zlib back-references are cheapest.
+    counts: Counter = Counter()
+    for sample in samples:
+        words = sample.split()
+        for index in range(len(words) - 2):
+            counts[" ".join(words[index:index + 3])] += 1
+    phrases = [phrase for phrase, count in counts.items() if count > 1]
+    phrases.sort(key=lambda phrase: counts[phrase] * len(phrase), reverse=True)
+
+    selected = []
+    used = 0
+    for phrase in phrases:
+        encoded = phrase.encode("utf-8") + b" "
+        if used + len(encoded) > size:
+            break
+        selected.append(encoded)
+        used += len(encoded)
+    return b"".join(reversed(selected))
+
+
+def compress_text(text: str, codec: str, dictionary_id: int = 0, dictionary: bytes = b"") -> str | bytes:
+    if codec == "none":
+        return text
+    data = text.encode("utf-8")
+    if codec == "zlib":
+        if dictionary:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(ZLIB_LEVEL)
+        payload = compressor.compress(data) + compressor.flush()
+    elif codec == "zstd":
+        zstd = _zstd()
+        dict_data = zstd.ZstdCompressionDict(dictionary) if dictionary else None
+        payload = zstd.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(data)
+    else:
+        raise ValueError(f"Unsupported compression codec: {codec}")
+    return HEADER.pack(CODEC_TAGS[codec], dictionary_id if dictionary else 0) + payload
+
+
+def decompress_text(value: str | bytes | None, get_dictionary) -> str | None:
+    """Return stored text as ``str``; ``get_dictionary`` resolves a dictionary id to bytes."""
+    if value is None or isinstance(value, str):
+        return value
+    tag, dictionary_id = HEADER.unpack_from(value)
+    payload = memoryview(value)[HEADER.size:]
+    dictionary = get_dictionary(dictionary_id) if dictionary_id else b""
+    if tag == CODEC_TAGS["zlib"]:
+        if dictionary:
+            decompressor = zlib.decompressobj(zdict=dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        data = decompressor.decompress(payload) + decompressor.flush()
+    elif tag == CODEC_TAGS["zstd"]:
+        zstd = _zstd()
+        dict_data = zstd.ZstdCompressionDict(dictionary) if dictionary else None
+        data = zstd.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+    else:
+        raise ValueError(f"Unknown compressed value tag: {tag!r}")
+    return data.decode("utf-8")
@@ -0,0 +1,96 @@
+from app.config import CONTEXT_TOKEN_BUDGET
+
+
+CHARS_PER_TOKEN = 4
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for llama-style tokenizers (~4 characters per token)."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _document_header(filename: str) -> str:
+    return f"Document: {filename}\n"
+
+
+def _strip_header(content: str, filename: str) -> str:
+    header = _document_header(filename)
+    if content.startswith(header):
+        return content[len(header):]
+    return content
+
+
+def _overlap_length(previous: str, current: str) -> int:
+    longest = min(len(previous), len(current), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(current[:size]):
+            return size
+    return 0
+
+
+def _render(chunks: list[dict], overlaps: dict) -> str:
+    """Render chunks grouped per document with one header each.
+
+    Documents keep the order in which they first appear in ``chunks`` (rank
+    order); inside a document chunks are laid out by ``chunk_index`` and runs of
+    adjacent chunks are merged with the splitter overlap removed. ``overlaps``
+    memoizes overlap lengths between chunk pairs across repeated renders.
+    """
+    grouped: dict[str, list[dict]] = {}
+    for chunk in chunks:
+        grouped.setdefault(chunk["document_id"], []).append(chunk)
+
+    sections = []
+    for document_chunks in grouped.values():
+        filename = document_chunks[0]["filename"]
+        segments: list[str] = []
+        previous = None
+        for chunk in sorted(document_chunks, key=lambda item: item["chunk_index"]):
+            body = _strip_header(chunk["content"], filename).strip()
+            if previous is not None and chunk["chunk_index"] == previous["chunk_index"] + 1:
+                pair = (previous["id"], chunk["id"])
+                if pair not in overlaps:
+                    previous_body = _strip_header(previous["content"], filename).strip()
+                    overlaps[pair] = _overlap_length(previous_body, body)
+                overlap = overlaps[pair]
+                segments[-1] = f"{segments[-1]}{body[overlap:]}" if overlap else f"{segments[-1]} {body}"
+            else:
+                segments.append(body)
+            previous = chunk
+        sections.append(_document_header(filename) + "\n\n".join(segments))
+    return "\n\n".join(sections)
+
+
+def build_context(chunks: list[dict], token_budget: int = CONTEXT_TOKEN_BUDGET):
+    """Pack ranked chunks into a deduplicated context within ``token_budget``.
+
+    Chunks are considered in rank order and kept while the rendered context
+    still fits; the best chunk is always kept. Returns the context, the packed
+    chunks in rank order and token accounting for logging.
+    """
+    packed: list[dict] = []
+    overlaps: dict = {}
+    context = ""
+    for chunk in chunks:
+        candidate = _render([*packed, chunk], overlaps)
+        if packed and estimate_tokens(candidate) > token_budget:
+            continue
+        packed.append(chunk)
+        context = candidate
+
+    naive_tokens = estimate_tokens("\n\n".join(chunk["content"] for chunk in packed))
+    context_tokens = estimate_tokens(context)
+    stats = {
+        "token_budget": token_budget,
+        "candidate_count": len(chunks),
+        "packed_count": len(packed),
+        "document_count": len({chunk["document_id"] for chunk in packed}),
+        "naive_tokens": naive_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": max(naive_tokens - context_tokens, 0),
+    }
+    return context, packed, stats
@@ -1,26 +1,172 @@
+import base64
+import binascii
 import json
+import os
 import sqlite3
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
 
-from app.config import STORE_DB_PATH
+from app.config import (
+    STORE_BUSY_TIMEOUT_SECONDS,
+    STORE_DB_PATH,
+    STORE_GENERATIONS_DIR,
+    STORE_KEEP_GENERATIONS,
+    STORE_POINTER_PATH,
+    STORE_REBUILD_MARKER_PATH,
+)
+from app.core.compression import CODECS, compress_text, decompress_text, train_dictionary, training_samples
+from app.core.entities import ENTITIES_VERSION, EntityCollector, entity_key
+from app.core.facts import FACTS_VERSION, org_key
 from app.core.rag_logger import preview_text, utcnow_iso
+from app.core.utils import document_header
+
+
+DOCUMENT_FIELDS = (
+    "id",
+    "filename",
+    "source_path",
+    "content_hash",
+    "file_size",
+    "chunk_count",
+    "file_ext",
+    "created_at",
+    "updated_at",
+)
+# Columns each chunk field needs, so projections only read what they return.
+CHUNK_FIELD_COLUMNS = {
+    "id": ("chunks.id",),
+    "document_id": ("chunks.document_id",),
+    "filename": ("documents.filename",),
+    "chunk_index": ("chunks.chunk_index",),
+    "content": ("chunks.content", "chunks.start_offset", "chunks.end_offset", "documents.filename"),
+    "preview": (
+        "chunks.content",
+        "chunks.preview",
+        "chunks.start_offset",
+        "chunks.end_offset",
+        "documents.filename",
+    ),
+    "char_count": ("chunks.char_count",),
+    "metadata": (
+        "chunks.metadata_json",
+        "chunks.metadata_template_id",
+        "chunks.page",
+        "documents.filename",
+    ),
+    "document_updated_at": ("documents.updated_at AS document_updated_at",),
+}
+CHUNK_FIELDS = tuple(CHUNK_FIELD_COLUMNS)
+CORPUS_CHUNK_FIELDS = tuple(field for field in CHUNK_FIELDS if field != "preview")
+PREVIEW_CHARS = 220
+# Metadata that differs from chunk to chunk; everything else is shared through
+# metadata_templates. source, chunk_index and page are rebuilt from their columns.
+PER_CHUNK_METADATA_KEYS = {"page_label", "start_index"}
+DERIVED_METADATA_KEYS = {"source", "chunk_index", "page"}
+TRAINING_SAMPLE_LIMIT = 4000
+_thread_state = threading.local()
+# Bumped whenever _ensure_schema changes, so opening an up-to-date store is read-only
+SCHEMA_VERSION = 4
+FACT_FIELDS = (
+    "document_id",
+    "kind",
+    "organization",
+    "role",
+    "degree",
+    "start_date",
+    "end_date",
+    "gpa",
+    "skill",
+    "category",
+    "org_key",
+    "chunk_index",
+    "page",
+)
 
 
 class DocumentStore:
     def __init__(self, db_path: str = STORE_DB_PATH):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._dictionaries: dict[int, bytes] = {}
+        self._templates: dict[int, dict] = {}
+        self._template_ids: dict[str, int] = {}
+        self._count_cache: tuple[int, int, int] | None = None
+        self._local = threading.local()
+        self._inherited: dict[str, dict] = {}
         self._ensure_schema()
 
     def _connect(self) -> sqlite3.Connection:
-        connection = sqlite3.connect(self.db_path)
+        if getattr(_thread_state, "keep_connections", False):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = self._open()
+            # a caller further up this thread's stack is mid-transaction on it
+            if not connection.in_transaction:
+                return connection
+        return self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=STORE_BUSY_TIMEOUT_SECONDS)
         connection.row_factory = sqlite3.Row
         connection.execute("PRAGMA foreign_keys = ON")
         return connection
 
+    def _release(self, connection: sqlite3.Connection) -> None:
+        """Close a connection from ``_connect`` unless it is the thread's kept one."""
+        if connection is not getattr(self._local, "connection", None):
+            connection.close()
+
+    @contextmanager
+    def _write_transaction(self):
+        """Connection for one write transaction, committed when the block exits cleanly.
+
+        Template and dictionary ids created inside it are cached only after the
+        commit: SQLite can hand the rowid of a rolled-back insert to another row
+        later, and a stale cached id would decode chunks with the wrong data.
+        """
+        connection = self._connect()
+        pending = self._local.pending = {"template_ids": {}, "templates": {}, "dictionaries": {}}
+        try:
+            with connection:
+                yield connection
+            self._template_ids.update(pending["template_ids"])
+            self._templates.update(pending["templates"])
+            self._dictionaries.update(pending["dictionaries"])
+        finally:
+            self._local.pending = None
+            self._release(connection)
+
+    def _pending(self, cache: str) -> dict:
+        pending = getattr(self._local, "pending", None)
+        return pending[cache] if pending else {}
+
+    @contextmanager
+    def _snapshot(self):
+        """Connection whose reads all see one committed state of the store.
+
+        In WAL mode the read transaction neither waits for nor blocks an
+        in-progress ingest, and chunk rows and the text they point into can
+        never come from different writes.
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN")
+            yield connection
+        finally:
+            connection.rollback()
+            self._release(connection)
+
     def _ensure_schema(self) -> None:
         with self._connect() as connection:
+            # An up-to-date store is opened without taking the write lock, so a
+            # worker starting during ingest does not wait for it.
+            if connection.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
+            # WAL lets queries keep reading the last committed corpus while ingest writes
+            connection.execute("PRAGMA journal_mode = WAL")
             connection.executescript(
                 """
                 CREATE TABLE IF NOT EXISTS documents (
@@ -31,7 +177,8 @@ class DocumentStore:
                     file_size INTEGER NOT NULL,
                     chunk_count INTEGER NOT NULL,
                     created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
+                    updated_at TEXT NOT NULL,
+                    file_ext TEXT
                 );
 
                 CREATE TABLE IF NOT EXISTS chunks (
@@ -43,13 +190,213 @@ class DocumentStore:
                     metadata_json TEXT NOT NULL,
                     char_count INTEGER NOT NULL,
                     created_at TEXT NOT NULL,
+                    start_offset INTEGER,
+                    end_offset INTEGER,
+                    metadata_template_id INTEGER,
+                    page INTEGER,
+                    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+                );
+
+                CREATE TABLE IF NOT EXISTS document_text (
+                    document_id TEXT NOT NULL,
+                    segment_index INTEGER NOT NULL,
+                    start_offset INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    char_count INTEGER,
+                    PRIMARY KEY (document_id, segment_index),
                     FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
                 );
 
                 CREATE INDEX IF NOT EXISTS idx_chunks_document_id
                 ON chunks(document_id, chunk_index);
+
+                CREATE INDEX IF NOT EXISTS idx_documents_updated_at
+                ON documents(updated_at, id);
+
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS metadata_templates (
+                    id INTEGER PRIMARY KEY,
+                    metadata_json TEXT NOT NULL UNIQUE
+                );
+
+                CREATE TABLE IF NOT EXISTS compression_dicts (
+                    id INTEGER PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    dictionary BLOB NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+
+                -- Structured resume facts extracted at ingest (see app.core.facts)
+                CREATE TABLE IF NOT EXISTS facts (
+                    id INTEGER PRIMARY KEY,
+                    document_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    organization TEXT,
+                    role TEXT,
+                    degree TEXT,
+                    start_date TEXT,
+                    end_date TEXT,
+                    gpa TEXT,
+                    skill TEXT,
+                    category TEXT,
+                    org_key TEXT,
+                    chunk_index INTEGER,
+                    page INTEGER,
+                    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_facts_kind ON facts(kind, org_key);
+                CREATE INDEX IF NOT EXISTS idx_facts_document_id ON facts(document_id, position);
+
+                -- Subject, heading and capitalized names per document (see app.core.entities)
+                CREATE TABLE IF NOT EXISTS entities (
+                    document_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    entity_key TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    mentions INTEGER NOT NULL,
+                    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_entities_key ON entities(entity_key, document_id);
+                CREATE INDEX IF NOT EXISTS idx_entities_document_id ON entities(document_id, kind);
+
+                INSERT OR IGNORE INTO store_meta (key, value) VALUES ('corpus_version', '0');
+                INSERT OR IGNORE INTO store_meta (key, value) VALUES ('compression_codec', 'none');
+                INSERT OR IGNORE INTO store_meta (key, value) VALUES ('compression_dict_id', '0');
+                """
+            )
+            self._ensure_columns(
+                connection,
+                "chunks",
+                {
+                    "start_offset": "INTEGER",
+                    "end_offset": "INTEGER",
+                    "metadata_template_id": "INTEGER",
+                    "page": "INTEGER",
+                },
+            )
+            if self._ensure_columns(connection, "document_text", {"char_count": "INTEGER"}):
+                connection.execute("UPDATE document_text SET char_count = length(content)")
+            # extractor version that produced the document's facts; NULL = never extracted
+            self._ensure_columns(connection, "documents", {"facts_version": "INTEGER"})
+            # same for entities; documents with a stale version are refilled by backfill_entities
+            self._ensure_columns(connection, "documents", {"entities_version": "INTEGER"})
+            if self._ensure_columns(connection, "documents", {"file_ext": "TEXT"}):
+                for row in connection.execute("SELECT id, filename FROM documents").fetchall():
+                    connection.execute(
+                        "UPDATE documents SET file_ext = ? WHERE id = ?",
+                        (Path(row["filename"]).suffix.lower(), row["id"]),
+                    )
+                connection.execute(
+                    "UPDATE chunks SET page = json_extract(metadata_json, '$.page') WHERE page IS NULL"
+                )
+            # Filter columns used by retrieval (see list_chunks)
+            connection.executescript(
+                """
+                CREATE INDEX IF NOT EXISTS idx_documents_file_ext ON documents(file_ext);
+                CREATE INDEX IF NOT EXISTS idx_chunks_page ON chunks(page, document_id);
                 """
             )
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _ensure_columns(self, connection: sqlite3.Connection, table: str, columns: dict) -> list[str]:
+        existing = {row["name"] for row in connection.execute(f"PRAGMA table_info({table})")}
+        added = []
+        for column, column_type in columns.items():
+            if column not in existing:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                added.append(column)
+        return added
+
+    def _meta_value(self, connection: sqlite3.Connection, key: str, default: str) -> str:
+        row = connection.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def _storage_format(self, connection: sqlite3.Connection) -> tuple[str, int, bytes]:
+        codec = self._meta_value(connection, "compression_codec", "none")
+        dictionary_id = int(self._meta_value(connection, "compression_dict_id", "0"))
+        dictionary = self._dictionary(connection, dictionary_id) if dictionary_id else b""
+        return codec, dictionary_id, dictionary
+
+    def _dictionary(self, connection: sqlite3.Connection, dictionary_id: int) -> bytes:
+        pending = self._pending("dictionaries")
+        if dictionary_id in pending:
+            return pending[dictionary_id]
+        if dictionary_id not in self._dictionaries:
+            row = connection.execute(
+                "SELECT dictionary FROM compression_dicts WHERE id = ?",
+                (dictionary_id,),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Missing compression dictionary {dictionary_id}")
+            self._dictionaries[dictionary_id] = bytes(row["dictionary"])
+        return self._dictionaries[dictionary_id]
+
+    def _decode(self, connection: sqlite3.Connection, value):
+        return decompress_text(value, lambda dictionary_id: self._dictionary(connection, dictionary_id))
+
+    def _encode_metadata(self, connection: sqlite3.Connection, metadata: dict) -> tuple[int, str]:
+        """Split metadata into an interned shared template and the per-chunk remainder."""
+        shared = {
+            key: value
+            for key, value in metadata.items()
+            if key not in PER_CHUNK_METADATA_KEYS and key not in DERIVED_METADATA_KEYS
+        }
+        own = {key: value for key, value in metadata.items() if key in PER_CHUNK_METADATA_KEYS}
+        template_json = json.dumps(shared, sort_keys=True)
+        pending = self._local.pending
+        template_id = self._template_ids.get(template_json) or pending["template_ids"].get(template_json)
+        if template_id is None:
+            connection.execute(
+                "INSERT OR IGNORE INTO metadata_templates (metadata_json) VALUES (?)",
+                (template_json,),
+            )
+            template_id = connection.execute(
+                "SELECT id FROM metadata_templates WHERE metadata_json = ?",
+                (template_json,),
+            ).fetchone()["id"]
+            pending["template_ids"][template_json] = template_id
+            pending["templates"][template_id] = shared
+        return template_id, json.dumps(own)
+
+    def _template(self, connection: sqlite3.Connection, template_id: int) -> dict:
+        pending = self._pending("templates")
+        if template_id in pending:
+            return pending[template_id]
+        if template_id not in self._templates:
+            row = connection.execute(
+                "SELECT metadata_json FROM metadata_templates WHERE id = ?",
+                (template_id,),
+            ).fetchone()
+            self._templates[template_id] = json.loads(row["metadata_json"]) if row else {}
+        return self._templates[template_id]
+
+    def _bump_corpus_version(self, connection: sqlite3.Connection) -> None:
+        connection.execute(
+            """
+            UPDATE store_meta
+            SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)
+            WHERE key = 'corpus_version'
+            """
+        )
+
+    def corpus_version(self) -> int:
+        """Counter bumped by every write, usable as a cache or coalescing key."""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT value FROM store_meta WHERE key = 'corpus_version'"
+            ).fetchone()
+            return int(row["value"]) if row else 0
+
+    def compression_codec(self) -> str:
+        with self._connect() as connection:
+            return self._meta_value(connection, "compression_codec", "none")
 
     def upsert_document(
         self,
@@ -58,109 +405,454 @@ class DocumentStore:
         content_hash: str,
         file_size: int,
         chunks,
+    ) -> dict:
+        return self.upsert_document_stream(
+            file_path=file_path,
+            content_hash=content_hash,
+            file_size=file_size,
+            chunk_batches=[chunks],
+        )
+
+    def upsert_document_stream(
+        self,
+        *,
+        file_path: str,
+        content_hash: str,
+        file_size: int,
+        chunk_batches,
+        facts=None,
+    ) -> dict:
+        """Index a document from an iterable of chunk batches in one transaction.
+
+        Batches are consumed lazily and written as they arrive, so only one batch
+        is held in memory. When the content hash is unchanged they are never
+        consumed, which skips parsing entirely for generator inputs.
+
+        Chunks carrying ``start``/``end`` offsets are stored as spans: the
+        document's normalized text is written once as ordered segments and the
+        chunk rows keep only offsets. Other chunks keep their own copy of the text.
+
+        ``facts`` is an optional lazy iterable of extracted facts (see
+        ``app.core.facts``). Like the batches it is only consumed when needed:
+        when the document changed, or when its facts predate ``FACTS_VERSION``.
+        """
+        with self._write_transaction() as connection:
+            result = self._upsert_document(connection, file_path, content_hash, file_size, chunk_batches, facts)
+            self._bump_corpus_version(connection)
+            return result
+
+    def upsert_documents(self, documents: list[dict]) -> list[dict]:
+        """Index several documents in one transaction with a single version bump.
+
+        Each item takes the keyword arguments of ``upsert_document_stream``.
+        Returns one result per item, in order.
+        """
+        with self._write_transaction() as connection:
+            results = [
+                self._upsert_document(
+                    connection,
+                    document["file_path"],
+                    document["content_hash"],
+                    document["file_size"],
+                    document["chunk_batches"],
+                    document.get("facts"),
+                )
+                for document in documents
+            ]
+            self._bump_corpus_version(connection)
+            return results
+
+    def unchanged_filenames(self, content_hashes: dict[str, str]) -> set[str]:
+        """Filenames whose stored content hash already matches ``content_hashes``."""
+        if not content_hashes:
+            return set()
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT filename, content_hash FROM documents
+                WHERE filename IN ({', '.join('?' for _ in content_hashes)})
+                """,
+                list(content_hashes),
+            ).fetchall()
+        return {row["filename"] for row in rows if content_hashes[row["filename"]] == row["content_hash"]}
+
+    def inherit_document_ids(self, source: "DocumentStore") -> None:
+        """Give documents indexed here the ids they have in ``source``.
+
+        Used when a rebuild fills a new generation, so document ids, logged
+        chunk references and listing cursors survive the swap. A document is
+        matched by filename, then by content hash (a renamed file).
+        """
+        with source._connect() as connection:
+            rows = connection.execute("SELECT id, filename, content_hash, created_at FROM documents").fetchall()
+        source._release(connection)
+        self._inherited = {}
+        for row in rows:
+            document = {"id": row["id"], "created_at": row["created_at"]}
+            self._inherited[f"filename:{row['filename']}"] = document
+            self._inherited.setdefault(f"hash:{row['content_hash']}", document)
+
+    def _inherited_document(self, connection: sqlite3.Connection, filename: str, content_hash: str) -> dict | None:
+        for key in (f"filename:{filename}", f"hash:{content_hash}"):
+            document = self._inherited.get(key)
+            # a copy of a file under another name gets the id only once
+            if document and not connection.execute("SELECT 1 FROM documents WHERE id = ?", (document["id"],)).fetchone():
+                return document
+        return None
+
+    def _upsert_document(
+        self,
+        connection: sqlite3.Connection,
+        file_path: str,
+        content_hash: str,
+        file_size: int,
+        chunk_batches,
+        facts=None,
     ) -> dict:
         filename = Path(file_path).name
         now = utcnow_iso()
-        normalized_chunks = []
-        for index, chunk in enumerate(chunks):
-            metadata = dict(chunk.metadata or {})
-            metadata.update(
-                {
-                    "source": filename,
-                    "chunk_index": index,
-                }
-            )
-            normalized_chunks.append(
-                {
-                    "chunk_index": index,
-                    "content": chunk.page_content,
-                    "preview": preview_text(chunk.page_content, 220),
-                    "metadata_json": json.dumps(metadata),
-                    "char_count": len(chunk.page_content),
-                }
-            )
+        existing = connection.execute(
+            "SELECT * FROM documents WHERE filename = ?",
+            (filename,),
+        ).fetchone()
 
-        with self._connect() as connection:
-            existing = connection.execute(
-                "SELECT * FROM documents WHERE filename = ?",
-                (filename,),
-            ).fetchone()
+        if existing and existing["content_hash"] == content_hash:
+            connection.execute(
+                """
+                UPDATE documents
+                SET source_path = ?, file_size = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (file_path, file_size, now, existing["id"]),
+            )
+            if facts is not None and existing["facts_version"] != FACTS_VERSION:
+                self._replace_facts(connection, existing["id"], facts)
+            if existing["entities_version"] != ENTITIES_VERSION:
+                self._refill_entities(connection, existing["id"], filename)
+            document = self.get_document(existing["id"], connection)
+            return {
+                "document": document,
+                "status": "unchanged",
+            }
 
-            if existing and existing["content_hash"] == content_hash:
-                connection.execute(
-                    """
-                    UPDATE documents
-                    SET source_path = ?, file_size = ?, updated_at = ?
-                    WHERE id = ?
-                    """,
-                    (file_path, file_size, now, existing["id"]),
-                )
-                document = self.get_document(existing["id"])
-                return {
-                    "document": document,
-                    "status": "unchanged",
-                }
+        inherited = None if existing else self._inherited_document(connection, filename, content_hash)
+        document_id = existing["id"] if existing else (inherited or {}).get("id") or uuid.uuid4().hex
 
-            document_id = existing["id"] if existing else uuid.uuid4().hex
+        if existing:
+            connection.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            connection.execute("DELETE FROM document_text WHERE document_id = ?", (document_id,))
+            connection.execute("DELETE FROM facts WHERE document_id = ?", (document_id,))
+            connection.execute("DELETE FROM entities WHERE document_id = ?", (document_id,))
+            connection.execute(
+                """
+                UPDATE documents
+                SET source_path = ?, content_hash = ?, file_size = ?, chunk_count = 0, updated_at = ?
+                WHERE id = ?
+                """,
+                (file_path, content_hash, file_size, now, document_id),
+            )
+            status = "reindexed"
+        else:
+            connection.execute(
+                """
+                INSERT INTO documents (
+                    id, filename, source_path, content_hash, file_size,
+                    chunk_count, created_at, updated_at, file_ext
+                ) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)
+                """,
+                (
+                    document_id,
+                    filename,
+                    file_path,
+                    content_hash,
+                    file_size,
+                    (inherited or {}).get("created_at") or now,
+                    now,
+                    Path(filename).suffix.lower(),
+                ),
+            )
+            status = "indexed"
 
-            if existing:
-                connection.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+        storage_format = self._storage_format(connection)
+        chunk_count = 0
+        text_length = 0
+        segment_index = 0
+        collector = EntityCollector()
+        for batch in chunk_batches:
+            batch = list(batch)
+            segment, segment_end = self._text_segment(batch, text_length)
+            collector.add(segment)
+            if segment:
                 connection.execute(
                     """
-                    UPDATE documents
-                    SET source_path = ?, content_hash = ?, file_size = ?, chunk_count = ?, updated_at = ?
-                    WHERE id = ?
-                    """,
-                    (file_path, content_hash, file_size, len(normalized_chunks), now, document_id),
-                )
-                status = "reindexed"
-            else:
-                connection.execute(
-                    """
-                    INSERT INTO documents (
-                        id, filename, source_path, content_hash, file_size,
-                        chunk_count, created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO document_text (document_id, segment_index, start_offset, content, char_count)
+                    VALUES (?, ?, ?, ?, ?)
                     """,
                     (
                         document_id,
-                        filename,
-                        file_path,
-                        content_hash,
-                        file_size,
-                        len(normalized_chunks),
-                        now,
-                        now,
+                        segment_index,
+                        text_length,
+                        compress_text(segment, *storage_format),
+                        len(segment),
                     ),
                 )
-                status = "indexed"
+                segment_index += 1
+                text_length = segment_end
 
-            for chunk in normalized_chunks:
-                chunk_id = f"{document_id}:{chunk['chunk_index']}"
-                connection.execute(
+            rows = []
+            for chunk in batch:
+                rows.append(
+                    self._chunk_row(connection, storage_format, document_id, chunk_count, chunk, now)
+                )
+                if getattr(chunk, "start", None) is None:
+                    collector.add(chunk.page_content)
+                chunk_count += 1
+            connection.executemany(
+                """
+                INSERT INTO chunks (
+                    id, document_id, chunk_index, content, preview,
+                    metadata_json, char_count, created_at, start_offset, end_offset,
+                    metadata_template_id, page
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+
+        connection.execute(
+            "UPDATE documents SET chunk_count = ?, facts_version = NULL WHERE id = ?",
+            (chunk_count, document_id),
+        )
+        if facts is not None:
+            self._replace_facts(connection, document_id, facts)
+        self._replace_entities(connection, document_id, filename, collector)
+        document = self.get_document(document_id, connection)
+        return {
+            "document": document,
+            "status": status,
+        }
+
+    def _replace_facts(self, connection: sqlite3.Connection, document_id: str, facts) -> None:
+        """Store a document's facts, pointing each one at the chunk holding its source line."""
+        connection.execute("DELETE FROM facts WHERE document_id = ?", (document_id,))
+        facts = list(facts)
+        text = ""
+        if facts:
+            segments = connection.execute(
+                "SELECT content FROM document_text WHERE document_id = ? ORDER BY segment_index ASC",
+                (document_id,),
+            ).fetchall()
+            text = "".join(self._decode(connection, segment["content"]) for segment in segments)
+        rows = []
+        for position, fact in enumerate(facts):
+            chunk_index = None
+            offset = text.find(fact["anchor"]) if fact.get("anchor") else -1
+            if offset != -1:
+                row = connection.execute(
                     """
-                    INSERT INTO chunks (
-                        id, document_id, chunk_index, content, preview,
-                        metadata_json, char_count, created_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    SELECT chunk_index FROM chunks
+                    WHERE document_id = ? AND start_offset <= ? AND end_offset > ?
+                    ORDER BY chunk_index ASC LIMIT 1
                     """,
-                    (
-                        chunk_id,
-                        document_id,
-                        chunk["chunk_index"],
-                        chunk["content"],
-                        chunk["preview"],
-                        chunk["metadata_json"],
-                        chunk["char_count"],
-                        now,
-                    ),
+                    (document_id, offset, offset),
+                ).fetchone()
+                chunk_index = row["chunk_index"] if row else None
+            organization = fact.get("organization")
+            rows.append(
+                (
+                    document_id,
+                    position,
+                    fact["kind"],
+                    organization,
+                    fact.get("role"),
+                    fact.get("degree"),
+                    fact.get("start_date"),
+                    fact.get("end_date"),
+                    fact.get("gpa"),
+                    fact.get("skill"),
+                    fact.get("category"),
+                    org_key(organization) if organization else None,
+                    chunk_index,
+                    fact.get("page"),
                 )
+            )
+        connection.executemany(
+            """
+            INSERT INTO facts (
+                document_id, position, kind, organization, role, degree, start_date,
+                end_date, gpa, skill, category, org_key, chunk_index, page
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        connection.execute(
+            "UPDATE documents SET facts_version = ? WHERE id = ?",
+            (FACTS_VERSION, document_id),
+        )
 
-            document = self.get_document(document_id, connection)
-            return {
-                "document": document,
-                "status": status,
-            }
+    def list_facts(self, document_ids: list[str] | None = None) -> list[dict]:
+        """Extracted facts, most recently updated document first, in document order."""
+        where = ""
+        params: list = []
+        if document_ids is not None:
+            if not document_ids:
+                return []
+            where = f"WHERE facts.document_id IN ({', '.join('?' for _ in document_ids)})"
+            params = list(document_ids)
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT {', '.join(f'facts.{field}' for field in FACT_FIELDS)}, documents.filename
+                FROM facts
+                JOIN documents ON documents.id = facts.document_id
+                {where}
+                ORDER BY documents.updated_at DESC, facts.document_id, facts.position
+                """,
+                params,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _replace_entities(
+        self,
+        connection: sqlite3.Connection,
+        document_id: str,
+        filename: str,
+        collector: EntityCollector,
+    ) -> None:
+        connection.execute("DELETE FROM entities WHERE document_id = ?", (document_id,))
+        connection.executemany(
+            "INSERT INTO entities (document_id, kind, entity_key, entity, mentions) VALUES (?, ?, ?, ?, ?)",
+            [(document_id, *row) for row in collector.rows(filename)],
+        )
+        connection.execute(
+            "UPDATE documents SET entities_version = ? WHERE id = ?",
+            (ENTITIES_VERSION, document_id),
+        )
+
+    def _refill_entities(self, connection: sqlite3.Connection, document_id: str, filename: str) -> None:
+        """Recompute a document's entities from its stored text, one segment or chunk at a time."""
+        collector = EntityCollector()
+        for segment in connection.execute(
+            "SELECT content FROM document_text WHERE document_id = ? ORDER BY segment_index ASC",
+            (document_id,),
+        ):
+            collector.add(self._decode(connection, segment["content"]))
+        for chunk in connection.execute(
+            """
+            SELECT content FROM chunks
+            WHERE document_id = ? AND start_offset IS NULL
+            ORDER BY chunk_index ASC
+            """,
+            (document_id,),
+        ):
+            collector.add(self._decode(connection, chunk["content"]))
+        self._replace_entities(connection, document_id, filename, collector)
+
+    def backfill_entities(self, limit: int | None = None) -> int:
+        """Extract entities for documents indexed before the entities table (or an older extractor).
+
+        Works from the stored text, so no source file is parsed. At most ``limit``
+        documents are filled per call, in one transaction. Returns how many were filled.
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, filename FROM documents WHERE entities_version IS NOT ? LIMIT ?",
+                (ENTITIES_VERSION, -1 if limit is None else limit),
+            ).fetchall()
+            for row in rows:
+                self._refill_entities(connection, row["id"], row["filename"])
+        return len(rows)
+
+    def documents_mentioning(self, entity: str) -> list[str] | None:
+        """IDs of documents that mention ``entity``, or None when that is every document.
+
+        Documents whose entities have not been extracted yet are included, since
+        they cannot be ruled out.
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT id FROM documents
+                WHERE entities_version IS NOT ?
+                   OR id IN (SELECT document_id FROM entities WHERE entity_key = ?)
+                """,
+                (ENTITIES_VERSION, entity_key(entity)),
+            ).fetchall()
+            total = connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        if len(rows) == total:
+            return None
+        return [row["id"] for row in rows]
+
+    def document_subjects(self, document_ids: list[str]) -> dict[str, dict[str, str]]:
+        """``{document_id: {"subject": ..., "heading": ...}}`` for the documents that have them."""
+        if not document_ids:
+            return {}
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT document_id, kind, entity FROM entities
+                WHERE document_id IN ({', '.join('?' for _ in document_ids)})
+                  AND kind IN ('subject', 'heading')
+                """,
+                list(document_ids),
+            ).fetchall()
+        subjects: dict[str, dict[str, str]] = {}
+        for row in rows:
+            subjects.setdefault(row["document_id"], {})[row["kind"]] = row["entity"]
+        return subjects
+
+    def _text_segment(self, batch: list, text_length: int) -> tuple[str, int]:
+        """Return the normalized text the batch's spans add past ``text_length``.
+
+        Consecutive spans overlap or are separated only by the single spaces the
+        chunker collapsed whitespace into, so gaps are filled with spaces.
+        """
+        pieces = []
+        for chunk in batch:
+            start = getattr(chunk, "start", None)
+            end = getattr(chunk, "end", None)
+            if start is None or end is None or end <= text_length:
+                continue
+            # page_content is the document header followed by the span's text
+            body = chunk.page_content[len(chunk.page_content) - (end - start):]
+            if start > text_length:
+                pieces.append(" " * (start - text_length))
+                text_length = start
+            pieces.append(body[text_length - start:])
+            text_length = end
+        return "".join(pieces), text_length
+
+    def _chunk_row(
+        self,
+        connection: sqlite3.Connection,
+        storage_format: tuple,
+        document_id: str,
+        index: int,
+        chunk,
+        now: str,
+    ) -> tuple:
+        metadata = chunk.metadata or {}
+        template_id, metadata_json = self._encode_metadata(connection, metadata)
+        start = getattr(chunk, "start", None)
+        end = getattr(chunk, "end", None)
+        if start is not None and end is not None:
+            content = preview = ""
+        else:
+            content = compress_text(chunk.page_content, *storage_format)
+            preview = "" if isinstance(content, bytes) else preview_text(chunk.page_content, PREVIEW_CHARS)
+        return (
+            f"{document_id}:{index}",
+            document_id,
+            index,
+            content,
+            preview,
+            metadata_json,
+            len(chunk.page_content),
+            now,
+            start,
+            end,
+            template_id,
+            metadata.get("page"),
+        )
 
     def get_document(self, document_id: str, connection: sqlite3.Connection | None = None) -> dict | None:
         should_close = connection is None
@@ -174,110 +866,537 @@ class DocumentStore:
             return self._row_to_document(row) if row else None
         finally:
             if should_close:
-                connection.close()
+                self._release(connection)
 
     def list_documents(self, limit: int = 100) -> list[dict]:
-        with self._connect() as connection:
-            rows = connection.execute(
-                """
-                SELECT * FROM documents
-                ORDER BY updated_at DESC
-                LIMIT ?
-                """,
-                (limit,),
-            ).fetchall()
-            return [self._row_to_document(row) for row in rows]
+        return self.page_documents(limit=limit)[0]
+
+    def page_documents(
+        self,
+        limit: int = 100,
+        cursor: str | None = None,
+        fields: list[str] | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """Return newest-first documents after ``cursor`` and the cursor for the next page.
+
+        Pages are keyed on ``(updated_at, id)`` so each page is an index range
+        scan, however deep the listing goes.
+        """
+        fields = self._validate_fields(fields, DOCUMENT_FIELDS)
+        columns = list(dict.fromkeys([*fields, "updated_at", "id"]))
+        query = f"SELECT {', '.join(columns)} FROM documents"
+        params: list = []
+        if cursor:
+            updated_at, document_id = self._decode_cursor(cursor, 2)
+            query += " WHERE (updated_at, id) < (?, ?)"
+            params.extend([updated_at, document_id])
+        query += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
 
-    def list_chunks(self, limit: int | None = None) -> list[dict]:
         with self._connect() as connection:
-            query = """
-                SELECT
-                    chunks.id,
-                    chunks.document_id,
-                    chunks.chunk_index,
-                    chunks.content,
-                    chunks.preview,
-                    chunks.metadata_json,
-                    chunks.char_count,
-                    documents.filename,
-                    documents.updated_at AS document_updated_at
+            rows = connection.execute(query, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor([rows[-1]["updated_at"], rows[-1]["id"]])
+        return [self._row_to_document(row, fields) for row in rows], next_cursor
+
+    def list_chunks(self, limit: int | None = None, filters: dict | None = None) -> list[dict]:
+        """Load corpus chunks, optionally restricted by ``filters`` before any scoring.
+
+        Supported filters: ``filename`` (glob), ``file_ext``, ``document_ids``,
+        ``updated_after``/``updated_before`` (ISO-8601 UTC) and ``pages``. They
+        are applied in SQL against indexed columns, so only matching rows are read.
+        """
+        where, params = self._filter_clause(filters or {})
+        with self._snapshot() as connection:
+            query = f"""
+                SELECT {self._chunk_columns(CORPUS_CHUNK_FIELDS)}
                 FROM chunks
                 JOIN documents ON documents.id = chunks.document_id
+                {where}
                 ORDER BY documents.updated_at DESC, chunks.chunk_index ASC
             """
-            params: tuple = ()
             if limit is not None:
                 query += " LIMIT ?"
-                params = (limit,)
+                params.append(limit)
             rows = connection.execute(query, params).fetchall()
-            return [self._row_to_chunk(row) for row in rows]
+            return self._rows_to_chunks(connection, rows, CORPUS_CHUNK_FIELDS)
 
-    def get_document_chunks(self, document_id: str, limit: int = 200) -> list[dict]:
+    def iter_corpus_chunks(self, batch_size: int = 256):
+        """Yield ``(corpus_version, chunks)`` batches of the corpus in retrieval order.
+
+        Everything comes from one snapshot, so the version describes exactly
+        the chunks yielded.
+        """
+        with self._snapshot() as connection:
+            version = int(self._meta_value(connection, "corpus_version", "0"))
+            cursor = connection.execute(
+                f"""
+                SELECT {self._chunk_columns(CORPUS_CHUNK_FIELDS)}
+                FROM chunks
+                JOIN documents ON documents.id = chunks.document_id
+                ORDER BY documents.updated_at DESC, chunks.chunk_index ASC
+                """
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield version, self._rows_to_chunks(connection, rows, CORPUS_CHUNK_FIELDS)
+
+    def list_chunk_keys(self, filters: dict | None = None) -> list[tuple[str, int]]:
+        """``(document_id, chunk_index)`` of the chunks matching ``filters`` (see ``list_chunks``)."""
+        where, params = self._filter_clause(filters or {})
         with self._connect() as connection:
             rows = connection.execute(
-                """
-                SELECT
-                    chunks.id,
-                    chunks.document_id,
-                    chunks.chunk_index,
-                    chunks.content,
-                    chunks.preview,
-                    chunks.metadata_json,
-                    chunks.char_count,
-                    documents.filename,
-                    documents.updated_at AS document_updated_at
+                f"""
+                SELECT chunks.document_id, chunks.chunk_index FROM chunks
+                JOIN documents ON documents.id = chunks.document_id
+                {where}
+                """,
+                params,
+            ).fetchall()
+        return [(row["document_id"], row["chunk_index"]) for row in rows]
+
+    def get_chunks(self, chunk_ids: list[str]) -> list[dict]:
+        """Load full chunks by ID, in the order given; unknown IDs are skipped."""
+        if not chunk_ids:
+            return []
+        with self._snapshot() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT {self._chunk_columns(CORPUS_CHUNK_FIELDS)}
                 FROM chunks
                 JOIN documents ON documents.id = chunks.document_id
-                WHERE chunks.document_id = ?
-                ORDER BY chunks.chunk_index ASC
-                LIMIT ?
+                WHERE chunks.id IN ({', '.join('?' for _ in chunk_ids)})
                 """,
-                (document_id, limit),
+                list(chunk_ids),
             ).fetchall()
-            return [self._row_to_chunk(row) for row in rows]
+            chunks = {chunk["id"]: chunk for chunk in self._rows_to_chunks(connection, rows, CORPUS_CHUNK_FIELDS)}
+        return [chunks[chunk_id] for chunk_id in chunk_ids if chunk_id in chunks]
+
+    def _filter_clause(self, filters: dict) -> tuple[str, list]:
+        clauses = []
+        params: list = []
+        if filters.get("filename"):
+            clauses.append("documents.filename GLOB ?")
+            params.append(filters["filename"])
+        if filters.get("file_ext"):
+            extensions = [f".{ext.lower().lstrip('.')}" for ext in filters["file_ext"]]
+            clauses.append(f"documents.file_ext IN ({', '.join('?' for _ in extensions)})")
+            params.extend(extensions)
+        if filters.get("document_ids"):
+            clauses.append(f"documents.id IN ({', '.join('?' for _ in filters['document_ids'])})")
+            params.extend(filters["document_ids"])
+        if filters.get("updated_after"):
+            clauses.append("documents.updated_at >= ?")
+            params.append(filters["updated_after"])
+        if filters.get("updated_before"):
+            clauses.append("documents.updated_at < ?")
+            params.append(filters["updated_before"])
+        if filters.get("pages"):
+            clauses.append(f"chunks.page IN ({', '.join('?' for _ in filters['pages'])})")
+            params.extend(filters["pages"])
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def get_document_chunks(self, document_id: str, limit: int = 200) -> list[dict]:
+        return self.page_document_chunks(document_id, limit=limit)[0]
+
+    def page_document_chunks(
+        self,
+        document_id: str,
+        limit: int = 200,
+        cursor: str | None = None,
+        fields: list[str] | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """Return a document's chunks in order after ``cursor``, projected to ``fields``."""
+        fields = self._validate_fields(fields, CHUNK_FIELDS)
+        query = f"""
+            SELECT {self._chunk_columns(fields)}
+            FROM chunks
+            JOIN documents ON documents.id = chunks.document_id
+            WHERE chunks.document_id = ?
+        """
+        params: list = [document_id]
+        if cursor:
+            (chunk_index,) = self._decode_cursor(cursor, 1)
+            query += " AND chunks.chunk_index > ?"
+            params.append(chunk_index)
+        query += " ORDER BY chunks.chunk_index ASC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._snapshot() as connection:
+            rows = connection.execute(query, params).fetchall()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = self._encode_cursor([rows[-1]["chunk_index"]])
+            return self._rows_to_chunks(connection, rows, fields), next_cursor
 
     def count_documents(self) -> int:
-        with self._connect() as connection:
-            row = connection.execute("SELECT COUNT(*) AS total FROM documents").fetchone()
-            return int(row["total"])
+        return self._counts()[0]
 
     def count_chunks(self) -> int:
-        with self._connect() as connection:
-            row = connection.execute("SELECT COUNT(*) AS total FROM chunks").fetchone()
-            return int(row["total"])
+        return self._counts()[1]
 
-    def _row_to_document(self, row: sqlite3.Row) -> dict:
-        return {
-            "id": row["id"],
-            "filename": row["filename"],
-            "source_path": row["source_path"],
-            "content_hash": row["content_hash"],
-            "file_size": row["file_size"],
-            "chunk_count": row["chunk_count"],
-            "created_at": row["created_at"],
-            "updated_at": row["updated_at"],
-        }
+    def _counts(self) -> tuple[int, int]:
+        """Document and chunk totals, recomputed only when the corpus version moves."""
+        with self._snapshot() as connection:
+            version = int(self._meta_value(connection, "corpus_version", "0"))
+            cached = self._count_cache
+            if cached is not None and cached[0] == version:
+                return cached[1], cached[2]
+            row = connection.execute(
+                "SELECT COUNT(*) AS documents, COALESCE(SUM(chunk_count), 0) AS chunks FROM documents"
+            ).fetchone()
+            self._count_cache = (version, int(row["documents"]), int(row["chunks"]))
+            return self._count_cache[1], self._count_cache[2]
+
+    def _validate_fields(self, fields: list[str] | None, allowed: tuple) -> tuple:
+        if not fields:
+            return allowed
+        unknown = [field for field in fields if field not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+        return tuple(dict.fromkeys(fields))
+
+    def _chunk_columns(self, fields: tuple) -> str:
+        # document_id and chunk_index are needed for text loading and cursors
+        columns = ["chunks.document_id", "chunks.chunk_index"]
+        for field in fields:
+            columns.extend(CHUNK_FIELD_COLUMNS[field])
+        return ", ".join(dict.fromkeys(columns))
+
+    def _encode_cursor(self, values: list) -> str:
+        return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+    def _decode_cursor(self, cursor: str, size: int) -> list:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except (binascii.Error, UnicodeError, ValueError) as exc:
+            raise ValueError("Invalid cursor") from exc
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("Invalid cursor")
+        return values
+
+    def recompress(self, codec: str) -> dict:
+        """Rewrite stored text with ``codec`` and a dictionary trained on this corpus.
+
+        Also moves metadata of older rows into shared templates and drops stored
+        previews of compressed rows. Subsequent writes use the same format.
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unsupported compression codec: {codec}")
+
+        with self._write_transaction() as connection:
+            segment_keys = connection.execute(
+                "SELECT document_id, segment_index FROM document_text"
+            ).fetchall()
+            chunk_ids = [row["id"] for row in connection.execute("SELECT id FROM chunks")]
+
+            samples: list[str] = []
+            for row in connection.execute("SELECT content FROM document_text"):
+                if len(samples) >= TRAINING_SAMPLE_LIMIT:
+                    break
+                samples.extend(training_samples([self._decode(connection, row["content"])]))
+            for row in connection.execute("SELECT content FROM chunks WHERE start_offset IS NULL"):
+                if len(samples) >= TRAINING_SAMPLE_LIMIT * 2:
+                    break
+                samples.append(self._decode(connection, row["content"]))
+            dictionary = train_dictionary(codec, samples)
+
+            dictionary_id = 0
+            if dictionary:
+                dictionary_id = connection.execute(
+                    "INSERT INTO compression_dicts (codec, dictionary, created_at) VALUES (?, ?, ?)",
+                    (codec, dictionary, utcnow_iso()),
+                ).lastrowid
+                self._local.pending["dictionaries"][dictionary_id] = dictionary
+            storage_format = (codec, dictionary_id, dictionary)
+
+            for key in segment_keys:
+                row = connection.execute(
+                    "SELECT content FROM document_text WHERE document_id = ? AND segment_index = ?",
+                    (key["document_id"], key["segment_index"]),
+                ).fetchone()
+                text = self._decode(connection, row["content"])
+                connection.execute(
+                    """
+                    UPDATE document_text SET content = ?, char_count = ?
+                    WHERE document_id = ? AND segment_index = ?
+                    """,
+                    (compress_text(text, *storage_format), len(text), key["document_id"], key["segment_index"]),
+                )
+
+            metadata_rewritten = 0
+            for chunk_id in chunk_ids:
+                row = connection.execute(
+                    """
+                    SELECT content, preview, metadata_json, metadata_template_id, start_offset
+                    FROM chunks WHERE id = ?
+                    """,
+                    (chunk_id,),
+                ).fetchone()
+                template_id = row["metadata_template_id"]
+                metadata_json = row["metadata_json"]
+                if template_id is None:
+                    template_id, metadata_json = self._encode_metadata(
+                        connection,
+                        json.loads(metadata_json) if metadata_json else {},
+                    )
+                    metadata_rewritten += 1
+                content = row["content"]
+                preview = row["preview"]
+                if row["start_offset"] is None:
+                    text = self._decode(connection, content)
+                    content = compress_text(text, *storage_format)
+                    preview = "" if isinstance(content, bytes) else preview_text(text, PREVIEW_CHARS)
+                connection.execute(
+                    """
+                    UPDATE chunks
+                    SET content = ?, preview = ?, metadata_json = ?, metadata_template_id = ?
+                    WHERE id = ?
+                    """,
+                    (content, preview, metadata_json, template_id, chunk_id),
+                )
+
+            connection.executemany(
+                "UPDATE store_meta SET value = ? WHERE key = ?",
+                [(codec, "compression_codec"), (str(dictionary_id), "compression_dict_id")],
+            )
+            self._bump_corpus_version(connection)
 
-    def _row_to_chunk(self, row: sqlite3.Row) -> dict:
-        metadata = json.loads(row["metadata_json"]) if row["metadata_json"] else {}
         return {
-            "id": row["id"],
-            "document_id": row["document_id"],
-            "filename": row["filename"],
-            "chunk_index": row["chunk_index"],
-            "content": row["content"],
-            "preview": row["preview"],
-            "char_count": row["char_count"],
-            "metadata": metadata,
-            "document_updated_at": row["document_updated_at"],
+            "codec": codec,
+            "dictionary_id": dictionary_id,
+            "dictionary_bytes": len(dictionary),
+            "training_samples": len(samples),
+            "segments_rewritten": len(segment_keys),
+            "chunks_rewritten": len(chunk_ids),
+            "metadata_rewritten": metadata_rewritten,
         }
 
+    def vacuum(self) -> None:
+        connection = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+    def _row_to_document(self, row: sqlite3.Row, fields: tuple = DOCUMENT_FIELDS) -> dict:
+        return {field: row[field] for field in fields}
+
+    def _span_end(self, row: sqlite3.Row, fields: tuple) -> int:
+        # a preview never needs more of the body than it can show
+        if "content" in fields:
+            return row["end_offset"]
+        return min(row["end_offset"], row["start_offset"] + PREVIEW_CHARS)
+
+    def _load_texts(self, connection: sqlite3.Connection, rows: list[sqlite3.Row], fields: tuple) -> dict:
+        """Load the normalized text covering the span rows, once per document.
+
+        Only segments overlapping the requested offsets are read. Returns
+        ``document_id -> (base_offset, text)``.
+        """
+        ranges: dict[str, list[int]] = {}
+        if "content" not in fields and "preview" not in fields:
+            return ranges
+        for row in rows:
+            if row["start_offset"] is None:
+                continue
+            end = self._span_end(row, fields)
+            bounds = ranges.setdefault(row["document_id"], [row["start_offset"], end])
+            bounds[0] = min(bounds[0], row["start_offset"])
+            bounds[1] = max(bounds[1], end)
+
+        texts = {}
+        for document_id, (low, high) in ranges.items():
+            segments = connection.execute(
+                """
+                SELECT start_offset, content FROM document_text
+                WHERE document_id = ? AND start_offset < ? AND start_offset + char_count > ?
+                ORDER BY segment_index ASC
+                """,
+                (document_id, high, low),
+            ).fetchall()
+            if segments:
+                texts[document_id] = (
+                    segments[0]["start_offset"],
+                    "".join(self._decode(connection, segment["content"]) for segment in segments),
+                )
+        return texts
+
+    def _rows_to_chunks(
+        self,
+        connection: sqlite3.Connection,
+        rows: list[sqlite3.Row],
+        fields: tuple = CHUNK_FIELDS,
+    ) -> list[dict]:
+        texts = self._load_texts(connection, rows, fields)
+        return [self._row_to_chunk(connection, row, texts, fields) for row in rows]
+
+    def _row_to_chunk(
+        self,
+        connection: sqlite3.Connection,
+        row: sqlite3.Row,
+        texts: dict,
+        fields: tuple = CHUNK_FIELDS,
+    ) -> dict:
+        chunk = {}
+        for field in fields:
+            if field == "document_updated_at":
+                chunk[field] = row["document_updated_at"]
+            elif field not in ("content", "preview", "metadata"):
+                chunk[field] = row[field]
+
+        if "content" in fields or "preview" in fields:
+            content = self._decode(connection, row["content"])
+            if row["start_offset"] is not None:
+                base, text = texts.get(row["document_id"], (0, ""))
+                body = text[row["start_offset"] - base:self._span_end(row, fields) - base]
+                content = f"{document_header(row['filename'])}{body}"
+            if "content" in fields:
+                chunk["content"] = content
+            if "preview" in fields:
+                chunk["preview"] = row["preview"] or preview_text(content, PREVIEW_CHARS)
+
+        if "metadata" in fields:
+            metadata = json.loads(row["metadata_json"]) if row["metadata_json"] else {}
+            if row["metadata_template_id"] is not None:
+                metadata = {
+                    **self._template(connection, row["metadata_template_id"]),
+                    **metadata,
+                    "source": row["filename"],
+                    "chunk_index": row["chunk_index"],
+                }
+                if row["page"] is not None:
+                    metadata["page"] = row["page"]
+            chunk["metadata"] = metadata
+        return chunk
+
+
+def keep_thread_connections() -> None:
+    """Make the calling thread reuse one connection per store instead of opening one per call.
+
+    Used as the initializer of the long-lived store threads (see ``app.core.async_store``).
+    """
+    _thread_state.keep_connections = True
+
+
+def active_store_path() -> str:
+    """Path of the generation currently in service.
+
+    Rebuilds publish a generation by rewriting the pointer file; without one
+    the store lives at ``STORE_DB_PATH``.
+    """
+    try:
+        generation = Path(STORE_POINTER_PATH).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return STORE_DB_PATH
+    return str(Path(STORE_GENERATIONS_DIR) / generation) if generation else STORE_DB_PATH
+
+
+def rebuild_in_progress() -> dict | None:
+    """The running rebuild (pid, generation, started_at), or None.
+
+    A marker left behind by a rebuild process that no longer exists is ignored.
+    """
+    try:
+        marker = json.loads(Path(STORE_REBUILD_MARKER_PATH).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        os.kill(int(marker["pid"]), 0)
+    except ProcessLookupError:
+        return None
+    except (PermissionError, KeyError, TypeError, ValueError):
+        pass
+    return marker
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "w", encoding="utf-8") as handle:
+        handle.write(text)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporary, path)
+
+
+def _set_corpus_version(store: DocumentStore, version: int) -> None:
+    with store._connect() as connection:
+        connection.execute(
+            "UPDATE store_meta SET value = ? WHERE key = 'corpus_version'",
+            (str(version),),
+        )
+    store._release(connection)
+
+
+def create_generation() -> DocumentStore:
+    """Create an empty store in a side file, ready to be filled and activated.
+
+    Documents indexed into it keep the ids they have in the live store.
+
+    Writes the rebuild marker, so uploads to the live store are refused until
+    ``activate_generation`` or ``abandon_generation``; anything written there
+    meanwhile would be dropped at the swap.
+    """
+    running = rebuild_in_progress()
+    if running:
+        raise RuntimeError(f"Another rebuild (pid {running.get('pid')}) is already running")
+    generations_dir = Path(STORE_GENERATIONS_DIR)
+    generations_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    store = DocumentStore(str(generations_dir / f"rag_store.{stamp}.{uuid.uuid4().hex[:8]}.sqlite3"))
+    _write_atomic(
+        Path(STORE_REBUILD_MARKER_PATH),
+        json.dumps({"pid": os.getpid(), "generation": store.db_path.name, "started_at": utcnow_iso()}),
+    )
+
+    live = DocumentStore(active_store_path())
+    store.inherit_document_ids(live)
+    # Continue the live corpus version; activation bumps it again past anything written since
+    _set_corpus_version(store, live.corpus_version() + 1)
+    return store
+
+
+def activate_generation(store: DocumentStore) -> None:
+    """Atomically point every worker at ``store`` and prune old generations."""
+    # Version-keyed caches must never see a repeat, even if the live store moved on meanwhile
+    live_version = DocumentStore(active_store_path()).corpus_version()
+    _set_corpus_version(store, max(live_version, store.corpus_version()) + 1)
+    with store._connect() as connection:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    store._release(connection)
+
+    _write_atomic(Path(STORE_POINTER_PATH), store.db_path.name)
+    Path(STORE_REBUILD_MARKER_PATH).unlink(missing_ok=True)
+
+    # Keep the newest generations for rollback; readers holding an older file
+    # open keep their snapshot until they close it.
+    generations = sorted(Path(STORE_GENERATIONS_DIR).glob("rag_store.*.sqlite3"), reverse=True)
+    for stale in generations[max(STORE_KEEP_GENERATIONS, 1):]:
+        if stale == store.db_path:
+            continue
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{stale}{suffix}").unlink(missing_ok=True)
+
+
+def abandon_generation(store: DocumentStore) -> None:
+    """Delete an unfinished generation and lift the rebuild marker."""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{store.db_path}{suffix}").unlink(missing_ok=True)
+    Path(STORE_REBUILD_MARKER_PATH).unlink(missing_ok=True)
+
 
 _STORE: DocumentStore | None = None
 
 
 def get_document_store() -> DocumentStore:
+    """Return the store for the active generation, switching after a swap."""
     global _STORE
-    if _STORE is None:
-        _STORE = DocumentStore()
+    path = Path(active_store_path())
+    if _STORE is None or _STORE.db_path != path:
+        _STORE = DocumentStore(str(path))
     return _STORE
@@ -1,4 +1,5 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+from app.core.loaders import get_embedding_model
+
 
 def get_embeddings():
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    return get_embedding_model()
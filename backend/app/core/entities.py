@@ -0,0 +1,78 @@
+import re
+from collections import Counter
+from pathlib import Path
+
+
+# Bump when extraction changes so stored entities are recomputed (see DocumentStore.backfill_entities)
+ENTITIES_VERSION = 1
+# Longest capitalized run stored, in words; longer runs are stored as their sub-runs
+MAX_ENTITY_WORDS = 4
+# Most frequent names kept per document
+MAX_ENTITIES_PER_DOCUMENT = 5000
+# The document heading is looked for in this many non-empty lines
+HEADING_LINES = 10
+
+# Title Case or ALL CAPS words on one line, at least two in a row
+NAME_RUN_RE = re.compile(r"\b[A-Z][A-Za-z]+(?:[ \t]+[A-Z][A-Za-z]+)+\b")
+HEADING_RE = re.compile(r"^[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+$")
+
+
+def entity_key(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def subject_from_filename(filename: str) -> str | None:
+    cleaned = re.sub(r"[_-]+", " ", Path(filename).stem).strip()
+    cleaned = re.sub(r"\bresume\b", "", cleaned, flags=re.IGNORECASE).strip()
+    return cleaned or None
+
+
+class EntityCollector:
+    """Counts capitalized names across a document fed to it piece by piece.
+
+    Every run of two to ``MAX_ENTITY_WORDS`` consecutive capitalized words is
+    counted under its lowercased key, so a query naming "Jane Doe" matches a
+    document that says "JANE DOE SMITH". The first name-like line is kept as
+    the document's heading.
+    """
+
+    def __init__(self):
+        self.mentions: Counter = Counter()
+        self.surface: dict[str, str] = {}
+        self.heading: str | None = None
+        self._lines_seen = 0
+
+    def add(self, text: str) -> None:
+        if not text:
+            return
+        if self._lines_seen < HEADING_LINES:
+            for line in text.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                self._lines_seen += 1
+                if self.heading is None and HEADING_RE.match(line):
+                    self.heading = line
+                if self._lines_seen >= HEADING_LINES:
+                    break
+        for match in NAME_RUN_RE.finditer(text):
+            words = match.group(0).split()
+            for size in range(2, min(len(words), MAX_ENTITY_WORDS) + 1):
+                for start in range(len(words) - size + 1):
+                    name = " ".join(words[start : start + size])
+                    key = name.lower()
+                    self.mentions[key] += 1
+                    self.surface.setdefault(key, name)
+
+    def rows(self, filename: str) -> list[tuple[str, str, str, int]]:
+        """``(kind, entity_key, entity, mentions)`` rows for the entities table."""
+        rows = []
+        subject = subject_from_filename(filename)
+        if subject:
+            rows.append(("subject", entity_key(subject), subject, 0))
+        if self.heading:
+            key = entity_key(self.heading)
+            rows.append(("heading", key, self.heading, self.mentions.get(key, 0)))
+        for key, count in self.mentions.most_common(MAX_ENTITIES_PER_DOCUMENT):
+            rows.append(("name", key, self.surface[key], count))
+        return rows
@@ -0,0 +1,406 @@
+import os
+import re
+from pathlib import Path
+
+from app.core.loaders import get_loader_class, load_object
+
+
+# Bump when extraction changes so unchanged documents are re-extracted on re-index
+FACTS_VERSION = 1
+# Resumes are short; longer documents are never scanned for facts
+FACTS_MAX_PAGES = 5
+
+MONTH = (
+    r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?"
+    r"|Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\.?"
+)
+DATE = rf"(?:{MONTH}\s+)?(?:19|20)\d{{2}}"
+DATE_RANGE_RE = re.compile(
+    rf"\b({DATE})\s*(?:-|–|—|to)\s*({DATE}|Present|Current|Now|Ongoing)\b",
+    re.IGNORECASE,
+)
+GPA_RE = re.compile(r"\b(?:C?GPA|CPI)\s*[:\-]?\s*(\d+(?:\.\d+)?(?:\s*/\s*\d+(?:\.\d+)?)?)", re.IGNORECASE)
+HEADER_RE = re.compile(r"^[A-Z][A-Z &/]{2,40}$")
+BULLET_RE = re.compile(r"^[●•▪◦\-*–]\s*")
+ORG_SEPARATORS = re.compile(r"\s*(?:,|\||–|—|\s-\s|\bat\b)\s*")
+SECTION_KINDS = (
+    ("education", ("EDUCATION", "ACADEMIC")),
+    ("experience", ("EXPERIENCE", "EMPLOYMENT", "WORK HISTORY")),
+    ("skills", ("SKILL", "TECHNOLOGIES", "TECHNICAL")),
+)
+ROLE_WORDS = {
+    "analyst",
+    "architect",
+    "assistant",
+    "associate",
+    "consultant",
+    "designer",
+    "developer",
+    "director",
+    "engineer",
+    "fellow",
+    "intern",
+    "lead",
+    "manager",
+    "officer",
+    "researcher",
+    "scientist",
+    "specialist",
+    "teacher",
+}
+GENERIC_ORG_WORDS = {
+    "and",
+    "co",
+    "college",
+    "company",
+    "corp",
+    "east",
+    "group",
+    "inc",
+    "institute",
+    "labs",
+    "llc",
+    "ltd",
+    "north",
+    "of",
+    "school",
+    "solutions",
+    "south",
+    "state",
+    "technologies",
+    "technology",
+    "the",
+    "university",
+    "west",
+}
+CURRENT_END_DATES = {"present", "current", "now", "ongoing"}
+MONTH_NUMBERS = {
+    name: number
+    for number, names in enumerate(
+        (
+            ("jan", "january"),
+            ("feb", "february"),
+            ("mar", "march"),
+            ("apr", "april"),
+            ("may",),
+            ("jun", "june"),
+            ("jul", "july"),
+            ("aug", "august"),
+            ("sep", "sept", "september"),
+            ("oct", "october"),
+            ("nov", "november"),
+            ("dec", "december"),
+        ),
+        start=1,
+    )
+    for name in names
+}
+
+GPA_TERMS = {"gpa", "cgpa", "grades"}
+ROLE_TERMS = {"role", "position", "title", "job", "designation"}
+WORK_TERMS = ROLE_TERMS | {"work", "works", "worked", "working", "employed", "employer", "company", "companies"}
+CURRENT_TERMS = {"now", "current", "currently", "present", "presently", "today", "latest", "recent", "recently"}
+EDUCATION_TERMS = {
+    "degree",
+    "degrees",
+    "study",
+    "studied",
+    "studying",
+    "major",
+    "education",
+    "graduate",
+    "graduated",
+    "university",
+    "college",
+    "school",
+}
+SKILL_TERMS = {"skill", "skills", "languages", "technologies", "tools", "stack", "proficient", "know", "knows"}
+MASTER_TERMS = {"master", "masters", "ms", "msc", "graduate", "postgraduate", "mtech"}
+# capitalized question openers the entity regex picks up ("Does Anish ...")
+QUESTION_WORDS = {"does", "did", "do", "is", "was", "has", "have", "what", "where", "when", "who", "how", "which"}
+BACHELOR_TERMS = {"bachelor", "bachelors", "bs", "bsc", "btech", "undergrad", "undergraduate"}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def org_key(organization: str) -> str:
+    """Lookup key for an organization: lowercase words of the name before any location."""
+    return " ".join(re.findall(r"[a-z0-9]+", organization.lower()))
+
+
+def _date_sort_key(value: str | None) -> tuple[int, int]:
+    if not value:
+        return (0, 0)
+    if value.lower() in CURRENT_END_DATES:
+        return (9999, 12)
+    year = re.search(r"(?:19|20)\d{2}", value)
+    month = re.match(r"[A-Za-z]+", value)
+    return (
+        int(year.group()) if year else 0,
+        MONTH_NUMBERS.get(month.group().lower(), 0) if month else 0,
+    )
+
+
+def _layout_lines(file_path: str, ext: str):
+    """Yield ``(page, line)`` keeping the visual line breaks facts depend on."""
+    if ext == ".pdf":
+        with open(file_path, "rb") as handle:
+            reader = load_object("pypdf:PdfReader")(handle)
+            if len(reader.pages) > FACTS_MAX_PAGES:
+                return
+            for page_number, page in enumerate(reader.pages):
+                try:
+                    text = page.extract_text(extraction_mode="layout") or ""
+                except TypeError:
+                    # pypdf before 3.17 has no layout mode
+                    text = page.extract_text() or ""
+                for line in text.splitlines():
+                    yield page_number, line
+        return
+    documents = get_loader_class(ext)(file_path).load()
+    if len(documents) > FACTS_MAX_PAGES:
+        return
+    for page_number, document in enumerate(documents):
+        for line in document.page_content.splitlines():
+            yield page_number, line
+
+
+def _section_kind(line: str) -> str | None:
+    if not HEADER_RE.match(line):
+        return None
+    for kind, markers in SECTION_KINDS:
+        if any(marker in line for marker in markers):
+            return kind
+    return "other"
+
+
+def _split_role_org(header: str) -> tuple[str | None, str]:
+    parts = ORG_SEPARATORS.split(header, maxsplit=1)
+    if len(parts) == 1:
+        return None, header
+    first, second = parts[0].strip(), parts[1].strip()
+    first_is_role = bool(set(re.findall(r"[a-z]+", first.lower())) & ROLE_WORDS)
+    second_is_role = bool(set(re.findall(r"[a-z]+", second.lower())) & ROLE_WORDS)
+    if second_is_role and not first_is_role:
+        return second, first
+    return first, second
+
+
+def extract_facts(file_path: str) -> list[dict]:
+    """Pull organization/role/dates, degree/GPA and skills out of a resume-like document.
+
+    Works on visual lines (PDFs use pypdf's layout mode): an entry is a line
+    ending in a date range, a skill line is ``Category: a, b, c``. Documents
+    that show fewer than two of the education/experience/skills sections, and
+    are not named like a resume, yield nothing.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    lines = [(page, _normalize(line)) for page, line in _layout_lines(file_path, ext)]
+    lines = [(page, line) for page, line in lines if line]
+    kinds = {_section_kind(line) for _, line in lines} - {None, "other"}
+    if len(kinds) < 2 and not re.search(r"resume|\bcv\b", Path(file_path).stem, re.IGNORECASE):
+        return []
+
+    facts = []
+    if lines and _section_kind(lines[0][1]) is None and not DATE_RANGE_RE.search(lines[0][1]):
+        name = lines[0][1]
+        if re.fullmatch(r"[A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3}", name):
+            facts.append({"kind": "subject", "organization": name, "anchor": name, "page": lines[0][0]})
+
+    section = None
+    for index, (page, line) in enumerate(lines):
+        kind = _section_kind(line)
+        if kind:
+            section = kind
+            continue
+        if BULLET_RE.match(line):
+            continue
+
+        if section == "skills":
+            category, separator, values = line.partition(":")
+            if not separator:
+                category, values = "", line
+            for skill in re.split(r"\s*[,|•]\s*", values):
+                skill = skill.strip(" .;")
+                if skill and len(skill) <= 40:
+                    facts.append(
+                        {
+                            "kind": "skill",
+                            "skill": skill,
+                            "category": category.strip() or None,
+                            "anchor": line,
+                            "page": page,
+                        }
+                    )
+            continue
+
+        dates = DATE_RANGE_RE.search(line)
+        if not dates or section not in ("education", "experience"):
+            continue
+        header = line[: dates.start()].strip(" |,–—-")
+        if not header:
+            continue
+        following = ""
+        if index + 1 < len(lines) and not _section_kind(lines[index + 1][1]):
+            following = lines[index + 1][1]
+        fact = {
+            "start_date": dates.group(1),
+            "end_date": dates.group(2).title() if dates.group(2).lower() in CURRENT_END_DATES else dates.group(2),
+            "anchor": header,
+            "page": page,
+        }
+
+        if section == "experience":
+            role, organization = _split_role_org(header)
+            if role is None and following and not BULLET_RE.match(following) and not DATE_RANGE_RE.search(following):
+                role = following
+            fact.update(kind="experience", organization=organization, role=role)
+        else:
+            gpa = GPA_RE.search(line) or GPA_RE.search(following)
+            degree = GPA_RE.sub("", following).strip(" |,") if following and not BULLET_RE.match(following) else None
+            fact.update(
+                kind="education",
+                # "University, City, Country": the name is the part before the location
+                organization=header.split(",")[0].strip(),
+                degree=degree or None,
+                gpa=re.sub(r"\s+", "", gpa.group(1)) if gpa else None,
+            )
+        facts.append(fact)
+    return facts
+
+
+def iter_facts(file_path: str):
+    """Lazy form of ``extract_facts`` for the store, which only consumes it when it needs facts."""
+    yield from extract_facts(file_path)
+
+
+def _mentioned_orgs(query_tokens: set[str], query_lower: str, facts: list[dict]) -> set[str]:
+    mentioned = set()
+    for fact in facts:
+        key = fact.get("org_key")
+        if not key or fact["kind"] == "subject":
+            continue
+        words = set(key.split())
+        distinctive = words - GENERIC_ORG_WORDS
+        if key in " ".join(re.findall(r"[a-z0-9]+", query_lower)) or (distinctive & query_tokens):
+            mentioned.add(key)
+    return mentioned
+
+
+def _role_at(fact: dict) -> str:
+    return f"{fact['role']}, {fact['organization']}" if fact.get("role") else fact["organization"]
+
+
+def _dates(fact: dict) -> str:
+    return f"{fact['start_date']} - {fact['end_date']}"
+
+
+def answer_from_facts(query: str, facts: list[dict], entity: str | None = None) -> tuple[str, str, list[dict]] | None:
+    """Answer ``query`` from extracted facts, or None when it is not a question they settle.
+
+    Returns ``(answer, intent, facts_used)``. Only narrow, unambiguous question
+    shapes are handled; anything else goes to retrieval and the LLM.
+    """
+    if not facts:
+        return None
+    query_lower = query.lower()
+    tokens = set(re.findall(r"[a-z0-9]+", query_lower))
+    subjects = {fact["org_key"] for fact in facts if fact["kind"] == "subject"}
+    orgs = _mentioned_orgs(tokens, query_lower, facts)
+
+    # a named entity that is neither the document's subject nor one of its
+    # organizations means the question is about something the facts do not cover
+    if entity:
+        entity_words = set(org_key(entity).split()) - QUESTION_WORDS
+        known = subjects | {fact["org_key"] for fact in facts if fact.get("org_key")}
+        if entity_words and not any(entity_words <= set(key.split()) for key in known if key):
+            return None
+
+    experience = [fact for fact in facts if fact["kind"] == "experience"]
+    education = [fact for fact in facts if fact["kind"] == "education"]
+    skills = [fact for fact in facts if fact["kind"] == "skill"]
+
+    if tokens & GPA_TERMS:
+        candidates = [fact for fact in education if fact.get("gpa")]
+        if orgs:
+            candidates = [fact for fact in candidates if fact["org_key"] in orgs]
+        if tokens & MASTER_TERMS:
+            candidates = [fact for fact in candidates if (fact.get("degree") or "").lower().startswith("master")]
+        elif tokens & BACHELOR_TERMS:
+            candidates = [fact for fact in candidates if (fact.get("degree") or "").lower().startswith("bachelor")]
+        if not candidates:
+            return None
+        latest = max(candidates, key=lambda fact: _date_sort_key(fact.get("end_date")))
+        return latest["gpa"], "gpa", [latest]
+
+    if tokens & WORK_TERMS and experience:
+        at_orgs = [fact for fact in experience if fact["org_key"] in orgs]
+        if at_orgs:
+            if "when" in tokens or {"long", "dates"} & tokens:
+                return "; ".join(_dates(fact) for fact in at_orgs), "dates_at_org", at_orgs
+            if tokens & ROLE_TERMS or "what" in tokens:
+                return "; ".join(_role_at(fact) for fact in at_orgs), "role_at_org", at_orgs
+            return None
+        if tokens & CURRENT_TERMS:
+            current = [fact for fact in experience if (fact.get("end_date") or "").lower() in CURRENT_END_DATES]
+            if not current:
+                current = [max(experience, key=lambda fact: _date_sort_key(fact.get("start_date")))]
+            if "where" in tokens or {"company", "employer"} & tokens:
+                return "; ".join(fact["organization"] for fact in current), "current_employer", current
+            return "; ".join(_role_at(fact) for fact in current), "current_role", current
+        if "where" in tokens or "companies" in tokens:
+            ordered = sorted(experience, key=lambda fact: _date_sort_key(fact.get("start_date")), reverse=True)
+            names = list(dict.fromkeys(fact["organization"] for fact in ordered))
+            return "; ".join(names), "employers", ordered
+        return None
+
+    if tokens & EDUCATION_TERMS and education:
+        candidates = [fact for fact in education if fact["org_key"] in orgs] or education
+        if tokens & MASTER_TERMS:
+            candidates = [fact for fact in candidates if (fact.get("degree") or "").lower().startswith("master")]
+        elif tokens & BACHELOR_TERMS:
+            candidates = [fact for fact in candidates if (fact.get("degree") or "").lower().startswith("bachelor")]
+        if not candidates:
+            return None
+        candidates = sorted(candidates, key=lambda fact: _date_sort_key(fact.get("end_date")), reverse=True)
+        if "where" in tokens:
+            return "; ".join(fact["organization"] for fact in candidates), "institutions", candidates
+        if "when" in tokens:
+            return "; ".join(_dates(fact) for fact in candidates), "education_dates", candidates
+        answers = [
+            f"{fact['degree']}, {fact['organization']}" if fact.get("degree") else fact["organization"]
+            for fact in candidates
+        ]
+        return "; ".join(answers), "degrees", candidates
+
+    category_words = {
+        word for fact in skills for word in re.findall(r"[a-z]+", (fact.get("category") or "").lower())
+    }
+    if skills and tokens & (SKILL_TERMS | category_words):
+        named = [
+            fact
+            for fact in skills
+            if re.search(rf"(?<![a-z0-9+#]){re.escape(fact['skill'].lower())}(?![a-z0-9+#])", query_lower)
+        ]
+        if named:
+            listed = ", ".join(dict.fromkeys(fact["skill"] for fact in named))
+            return f"Yes: {listed}", "has_skill", named
+        # "what do you know about ..." is not a skills question
+        if not tokens & (SKILL_TERMS - {"know", "knows"} | category_words):
+            return None
+        categories: dict[str, list[str]] = {}
+        for fact in skills:
+            categories.setdefault(fact.get("category") or "Skills", []).append(fact["skill"])
+        asked = {
+            category: values
+            for category, values in categories.items()
+            if set(re.findall(r"[a-z]+", category.lower())) & tokens
+        }
+        return (
+            "; ".join(f"{category}: {', '.join(values)}" for category, values in (asked or categories).items()),
+            "skills",
+            [fact for fact in skills if (fact.get("category") or "Skills") in (asked or categories)],
+        )
+    return None
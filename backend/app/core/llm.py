@@ -1,5 +1,5 @@
-from langchain.llms import Ollama
 from app.config import OLLAMA_MODEL
+from app.core.loaders import load_object
 
 def get_llm():
     """
@@ -7,4 +7,4 @@ def get_llm():
     Make sure Ollama is installed and running: https://ollama.ai
     Example: ollama run llama3
     """
-    return Ollama(model=OLLAMA_MODEL)
+    return load_object("langchain.llms:Ollama")(model=OLLAMA_MODEL)
@@ -1,13 +1,142 @@
 import json
-from time import perf_counter
+import math
+import random
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic, perf_counter, sleep
 
 import requests
 from fastapi import HTTPException
 
-from app.config import LLM_API_KEY, LLM_BASE_URL, LLM_MODEL, LLM_PROVIDER, LLM_TIMEOUT_SECONDS
+from app.config import (
+    GROQ_COMPLETION_TOKEN_RESERVE,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_SECONDS,
+    LLM_FALLBACK_PROVIDER,
+    LLM_HEDGE_DEFAULT_DELAY_MS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_DELAY_MS,
+    LLM_MAX_RETRIES,
+    LLM_PROVIDER,
+    LLM_PROVIDER_SETTINGS,
+    LLM_RETRY_BASE_SECONDS,
+    LLM_RETRY_MAX_WAIT_SECONDS,
+)
+from app.core.context_builder import estimate_tokens
+from app.core.llm_scheduler import SchedulerTimeout, groq_scheduler
+from app.core.metrics import record_provider_call
+from app.core.ollama_lifecycle import COMPLETION_TOKEN_RESERVE, ollama_lifecycle
+from app.core.rag_logger import get_app_logger, log_trace_event
 
 
-def _http_error(response: requests.Response, fallback: str) -> HTTPException:
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+logger = get_app_logger("personal_rag.llm")
+
+
+class ProviderError(HTTPException):
+    """HTTPException raised by a provider call, annotated for the router."""
+
+    def __init__(
+        self,
+        detail: str,
+        *,
+        provider: str,
+        retryable: bool = False,
+        retry_after: float | None = None,
+        upstream_status: int | None = None,
+    ):
+        super().__init__(status_code=500, detail=detail)
+        self.provider = provider
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.upstream_status = upstream_status
+
+
+class CircuitOpenError(ProviderError):
+    """The provider's circuit breaker is refusing calls until its cool-down ends."""
+
+
+class ProviderBusy(ProviderError):
+    """Our own rate-limit queue timed out; the provider was never called.
+
+    Not a provider failure, so it is not counted by the circuit breaker.
+    """
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: open after N failures, probe once after a cool-down."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(self.reset_seconds - (monotonic() - self.opened_at), 0.0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = monotonic()
+
+
+_breakers = {
+    name: CircuitBreaker(LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS)
+    for name in LLM_PROVIDER_SETTINGS
+}
+_latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_latency_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-llm")
+
+
+def _parse_retry_after(response: requests.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _http_error(response: requests.Response, fallback: str, provider: str) -> ProviderError:
     detail = fallback
     try:
         payload = response.json()
@@ -23,7 +152,30 @@ def _http_error(response: requests.Response, fallback: str) -> HTTPException:
         elif isinstance(error, str):
             detail = f"{fallback}: {error}"
 
-    return HTTPException(status_code=500, detail=detail)
+    return ProviderError(
+        detail,
+        provider=provider,
+        retryable=response.status_code in RETRYABLE_STATUS_CODES,
+        retry_after=_parse_retry_after(response),
+        upstream_status=response.status_code,
+    )
+
+
+def _post(provider: str, url: str, timeout: float, **kwargs) -> requests.Response:
+    try:
+        return requests.post(url, timeout=timeout, **kwargs)
+    except requests.Timeout as exc:
+        raise ProviderError(
+            f"{provider} timed out after {timeout}s",
+            provider=provider,
+            retryable=True,
+        ) from exc
+    except requests.ConnectionError as exc:
+        raise ProviderError(
+            f"Could not reach {provider}: {exc}",
+            provider=provider,
+            retryable=True,
+        ) from exc
 
 
 def _parse_openai_compatible_content(payload: dict) -> str:
@@ -44,25 +196,39 @@ def _parse_openai_compatible_content(payload: dict) -> str:
     return ""
 
 
-def _generate_with_ollama(prompt: str) -> tuple[str, float]:
+def _generate_with_ollama(prompt: str, settings: dict, priority: str) -> tuple[str, float]:
+    if estimate_tokens(prompt) + COMPLETION_TOKEN_RESERVE > ollama_lifecycle.num_ctx:
+        logger.warning(
+            "Prompt of ~%s tokens may not fit num_ctx=%s; Ollama will truncate it",
+            estimate_tokens(prompt),
+            ollama_lifecycle.num_ctx,
+        )
     started = perf_counter()
-    response = requests.post(
-        f"{LLM_BASE_URL.rstrip('/')}/api/generate",
-        json={"model": LLM_MODEL, "prompt": prompt, "stream": False},
-        timeout=LLM_TIMEOUT_SECONDS,
+    response = _post(
+        "ollama",
+        f"{settings['base_url'].rstrip('/')}/api/generate",
+        settings["timeout"],
+        json={
+            "model": settings["model"],
+            "prompt": prompt,
+            "stream": False,
+            **ollama_lifecycle.request_fields(),
+        },
     )
 
     if response.status_code != 200:
-        raise _http_error(response, f"Ollama returned status {response.status_code}")
+        raise _http_error(response, f"Ollama returned status {response.status_code}", "ollama")
 
     try:
         payload = response.json()
         output = payload.get("response", "")
+        load_duration = payload.get("load_duration")
     except ValueError:
         lines = [line for line in response.text.splitlines() if line.strip()]
         if not lines:
             raise HTTPException(status_code=500, detail="Empty response from Ollama API")
         output_parts = []
+        load_duration = None
         for line in lines:
             try:
                 chunk_payload = json.loads(line)
@@ -70,56 +236,281 @@ def _generate_with_ollama(prompt: str) -> tuple[str, float]:
                 continue
             if "response" in chunk_payload:
                 output_parts.append(chunk_payload["response"])
+            load_duration = chunk_payload.get("load_duration", load_duration)
         if not output_parts:
             raise HTTPException(status_code=500, detail="Invalid JSON from Ollama API")
         output = "".join(output_parts)
 
     duration_ms = round((perf_counter() - started) * 1000, 2)
+    ollama_lifecycle.record_call(duration_ms, load_duration)
     return output, duration_ms
 
 
-def _generate_with_groq(prompt: str) -> tuple[str, float]:
-    if not LLM_API_KEY:
-        raise HTTPException(
-            status_code=500,
-            detail="GROQ_API_KEY is not configured. Set it in backend/.env or your shell.",
+def _generate_with_groq(prompt: str, settings: dict, priority: str) -> tuple[str, float]:
+    if not settings["api_key"]:
+        raise ProviderError(
+            "GROQ_API_KEY is not configured. Set it in backend/.env or your shell.",
+            provider="groq",
         )
 
+    estimated_tokens = estimate_tokens(prompt) + GROQ_COMPLETION_TOKEN_RESERVE
+    try:
+        groq_scheduler.acquire(estimated_tokens, priority=priority)
+    except SchedulerTimeout as exc:
+        raise ProviderBusy(str(exc), provider="groq", retry_after=exc.retry_after) from exc
+
     started = perf_counter()
-    response = requests.post(
-        f"{LLM_BASE_URL.rstrip('/')}/chat/completions",
+    response = _post(
+        "groq",
+        f"{settings['base_url'].rstrip('/')}/chat/completions",
+        settings["timeout"],
         headers={
-            "Authorization": f"Bearer {LLM_API_KEY}",
+            "Authorization": f"Bearer {settings['api_key']}",
             "Content-Type": "application/json",
         },
         json={
-            "model": LLM_MODEL,
+            "model": settings["model"],
             "messages": [{"role": "user", "content": prompt}],
             "stream": False,
         },
-        timeout=LLM_TIMEOUT_SECONDS,
     )
 
+    groq_scheduler.observe_headers(response.headers)
     if response.status_code != 200:
-        raise _http_error(response, f"Groq returned status {response.status_code}")
+        raise _http_error(response, f"Groq returned status {response.status_code}", "groq")
 
     try:
         payload = response.json()
     except ValueError as exc:
         raise HTTPException(status_code=500, detail="Invalid JSON from Groq API") from exc
 
+    groq_scheduler.settle(estimated_tokens, (payload.get("usage") or {}).get("total_tokens"))
     output = _parse_openai_compatible_content(payload)
     duration_ms = round((perf_counter() - started) * 1000, 2)
     return output, duration_ms
 
 
-def generate_text(prompt: str) -> tuple[str, float]:
-    if LLM_PROVIDER == "ollama":
-        return _generate_with_ollama(prompt)
-    if LLM_PROVIDER == "groq":
-        return _generate_with_groq(prompt)
+_GENERATORS = {
+    "ollama": _generate_with_ollama,
+    "groq": _generate_with_groq,
+}
+
+
+def _record_latency(provider: str, duration_ms: float) -> None:
+    with _latency_lock:
+        _latencies[provider].append(duration_ms)
+
+
+def _latency_p95_ms(provider: str) -> float | None:
+    with _latency_lock:
+        samples = sorted(_latencies[provider])
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return None
+    return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+
+def _hedge_delay_seconds(provider: str) -> float:
+    p95_ms = _latency_p95_ms(provider)
+    delay_ms = LLM_HEDGE_DEFAULT_DELAY_MS if p95_ms is None else p95_ms
+    return max(delay_ms, LLM_HEDGE_MIN_DELAY_MS) / 1000
+
+
+def _retry_delay(attempt: int, retry_after: float | None) -> float | None:
+    """Seconds to wait before the next attempt, or None to give up on this provider.
+
+    A server-provided Retry-After wins over exponential backoff; if it is longer
+    than we are willing to wait, failing over is the faster option.
+    """
+    if retry_after is not None:
+        return retry_after if retry_after <= LLM_RETRY_MAX_WAIT_SECONDS else None
+    backoff = LLM_RETRY_BASE_SECONDS * (2 ** attempt)
+    return min(backoff + random.uniform(0, backoff / 2), LLM_RETRY_MAX_WAIT_SECONDS)
+
+
+def _call_provider(
+    provider: str,
+    prompt: str,
+    trace_id: str | None,
+    priority: str,
+) -> tuple[str, float]:
+    breaker = _breakers[provider]
+    generate = _GENERATORS[provider]
+    settings = LLM_PROVIDER_SETTINGS[provider]
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(
+                f"{provider} circuit is open",
+                provider=provider,
+                retry_after=breaker.retry_after(),
+            )
+        try:
+            output, duration_ms = generate(prompt, settings, priority)
+        except ProviderBusy:
+            raise
+        except HTTPException as exc:
+            breaker.record_failure()
+            record_provider_call(provider, ok=False)
+            retryable = getattr(exc, "retryable", False)
+            if not retryable or attempt >= LLM_MAX_RETRIES:
+                raise
+            delay = _retry_delay(attempt, exc.retry_after)
+            if delay is None:
+                raise
+            log_trace_event(
+                "llm.retry",
+                {
+                    "provider": provider,
+                    "attempt": attempt + 1,
+                    "delay_seconds": round(delay, 3),
+                    "upstream_status": exc.upstream_status,
+                    "reason": exc.detail,
+                },
+                trace_id=trace_id,
+            )
+            sleep(delay)
+            attempt += 1
+            continue
+        except Exception:
+            breaker.record_failure()
+            record_provider_call(provider, ok=False)
+            raise
+
+        breaker.record_success()
+        record_provider_call(provider, ok=True)
+        _record_latency(provider, duration_ms)
+        return output, duration_ms
+
+
+def _provider_chain() -> list[str]:
+    if LLM_PROVIDER not in _GENERATORS:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unsupported LLM_PROVIDER '{LLM_PROVIDER}'. Expected 'groq' or 'ollama'.",
+        )
+    chain = [LLM_PROVIDER]
+    if LLM_FALLBACK_PROVIDER in _GENERATORS and LLM_FALLBACK_PROVIDER != LLM_PROVIDER:
+        chain.append(LLM_FALLBACK_PROVIDER)
+    return chain
+
+
+def _actionable(error: HTTPException) -> bool:
+    """Whether the client can simply retry later: rate limited or a circuit cooling down."""
+    return isinstance(error, (ProviderBusy, CircuitOpenError)) or (
+        isinstance(error, ProviderError) and error.upstream_status == 429
+    )
+
+
+def _final_error(errors: list[HTTPException]) -> HTTPException:
+    """The error to show the client once every provider in the chain failed.
 
-    raise HTTPException(
-        status_code=500,
-        detail=f"Unsupported LLM_PROVIDER '{LLM_PROVIDER}'. Expected 'groq' or 'ollama'.",
+    ``errors`` are in chain order. A rate limit or open circuit becomes 503
+    with ``Retry-After`` (the primary's first); otherwise the primary's own
+    error wins, so a fallback that was never going to work cannot hide it.
+    """
+    if not errors:
+        return HTTPException(status_code=503, detail="No LLM provider is available")
+    for error in errors:
+        if _actionable(error):
+            retry_after = error.retry_after or LLM_CIRCUIT_RESET_SECONDS
+            return HTTPException(
+                status_code=503,
+                detail=error.detail,
+                headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+            )
+    return errors[0]
+
+
+def _log_failover(source: str, target: str, error: BaseException, trace_id: str | None) -> None:
+    log_trace_event(
+        "llm.failover",
+        {
+            "from_provider": source,
+            "to_provider": target,
+            "upstream_status": getattr(error, "upstream_status", None),
+            "reason": getattr(error, "detail", str(error)),
+        },
+        trace_id=trace_id,
     )
+
+
+def _generate_sequential(
+    chain: list[str],
+    prompt: str,
+    trace_id: str | None,
+    priority: str,
+) -> tuple[str, float]:
+    errors = []
+    for index, provider in enumerate(chain):
+        try:
+            return _call_provider(provider, prompt, trace_id, priority)
+        except HTTPException as exc:
+            errors.append(exc)
+            if index + 1 < len(chain):
+                _log_failover(provider, chain[index + 1], exc, trace_id)
+    raise _final_error(errors)
+
+
+def _generate_hedged(
+    primary: str,
+    secondary: str,
+    prompt: str,
+    trace_id: str | None,
+    priority: str,
+) -> tuple[str, float]:
+    delay = _hedge_delay_seconds(primary)
+    primary_future = _hedge_executor.submit(_call_provider, primary, prompt, trace_id, priority)
+    done, _ = wait([primary_future], timeout=delay)
+    if done and primary_future.exception() is None:
+        return primary_future.result()
+
+    if done:
+        _log_failover(primary, secondary, primary_future.exception(), trace_id)
+        pending = set()
+    else:
+        log_trace_event(
+            "llm.hedge",
+            {
+                "primary": primary,
+                "secondary": secondary,
+                "delay_ms": round(delay * 1000, 2),
+                "primary_p95_ms": _latency_p95_ms(primary),
+            },
+            trace_id=trace_id,
+        )
+        pending = {primary_future}
+
+    futures = {primary_future: primary}
+    secondary_future = _hedge_executor.submit(_call_provider, secondary, prompt, trace_id, priority)
+    futures[secondary_future] = secondary
+    pending.add(secondary_future)
+
+    errors = {primary: primary_future.exception()} if done else {}
+    while pending:
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            error = future.exception()
+            if error is None:
+                log_trace_event(
+                    "llm.hedge_result",
+                    {
+                        "winner": futures[future],
+                        "hedged": not done,
+                    },
+                    trace_id=trace_id,
+                )
+                return future.result()
+            errors[futures[future]] = error
+    raise _final_error([errors[provider] for provider in (primary, secondary) if provider in errors])
+
+
+def generate_text(
+    prompt: str,
+    trace_id: str | None = None,
+    priority: str = "interactive",
+) -> tuple[str, float]:
+    """Generate a completion; ``priority`` is "interactive" or "batch" for rate-limit queueing."""
+    chain = _provider_chain()
+    if LLM_HEDGE_ENABLED and len(chain) > 1 and _breakers[chain[0]].state == "closed":
+        return _generate_hedged(chain[0], chain[1], prompt, trace_id, priority)
+    return _generate_sequential(chain, prompt, trace_id, priority)
@@ -0,0 +1,180 @@
+import heapq
+import itertools
+import re
+import threading
+from time import monotonic
+
+from app.config import GROQ_RPM_LIMIT, GROQ_TPM_LIMIT, LLM_QUEUE_TIMEOUT_SECONDS
+from app.core.metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_RATE_LIMIT_REMAINING
+
+
+PRIORITIES = {
+    "interactive": 0,
+    "batch": 1,
+}
+DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class SchedulerTimeout(Exception):
+    def __init__(self, waited: float, retry_after: float):
+        super().__init__(f"Timed out after {waited:.1f}s waiting for LLM rate-limit budget")
+        self.waited = waited
+        self.retry_after = retry_after
+
+
+def parse_reset_duration(value: str | None) -> float | None:
+    """Parse rate-limit reset values such as ``"7.66s"``, ``"2m59.56s"`` or ``"250ms"``."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = DURATION_PART_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Continuously refilling bucket; not thread-safe, guarded by the scheduler lock."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = refill_per_second
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(now - self.updated, 0.0)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated = now
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def observe(self, remaining: float, now: float) -> None:
+        """Never believe we have more budget than the provider says is left."""
+        self._refill(now)
+        self.tokens = min(self.tokens, remaining)
+
+
+class LLMScheduler:
+    """Priority queue in front of a rate-limited provider.
+
+    Callers are released strictly in (priority, arrival) order once both the
+    requests-per-minute and tokens-per-minute buckets can cover them, so batch
+    work never jumps ahead of an interactive query waiting for budget.
+    """
+
+    def __init__(self, provider: str, requests_per_minute: int, tokens_per_minute: int):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.paused_until = 0.0
+        self._queue: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _wait_seconds(self, estimated_tokens: int, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.seconds_until(1, now),
+            self.tokens.seconds_until(estimated_tokens, now),
+            0.0,
+        )
+
+    def acquire(
+        self,
+        estimated_tokens: int,
+        priority: str = "interactive",
+        timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+    ) -> float:
+        """Block until the call may be sent; return the seconds spent queued."""
+        ticket = (PRIORITIES.get(priority, PRIORITIES["batch"]), next(self._sequence))
+        started = monotonic()
+        deadline = started + timeout
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+            LLM_QUEUE_DEPTH.labels(self.provider).set(len(self._queue))
+            try:
+                while True:
+                    now = monotonic()
+                    wait_for = None
+                    if self._queue[0] == ticket:
+                        wait_for = self._wait_seconds(estimated_tokens, now)
+                        if wait_for <= 0:
+                            self.requests.consume(1, now)
+                            self.tokens.consume(estimated_tokens, now)
+                            break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        retry_after = self._wait_seconds(estimated_tokens, now)
+                        raise SchedulerTimeout(now - started, retry_after)
+                    self._condition.wait(remaining if wait_for is None else min(wait_for, remaining))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                LLM_QUEUE_DEPTH.labels(self.provider).set(len(self._queue))
+                self._condition.notify_all()
+
+        waited = monotonic() - started
+        LLM_QUEUE_WAIT.labels(self.provider, priority).observe(waited)
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int | None) -> None:
+        """Return over-reserved tokens once the provider reports real usage."""
+        if actual_tokens is None or actual_tokens >= estimated_tokens:
+            return
+        with self._condition:
+            self.tokens.refund(estimated_tokens - actual_tokens, monotonic())
+            self._condition.notify_all()
+
+    def observe_headers(self, headers) -> None:
+        """Adapt to OpenAI-style ``x-ratelimit-*`` and ``retry-after`` response headers."""
+        now = monotonic()
+        with self._condition:
+            for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining_value = float(remaining)
+                except ValueError:
+                    continue
+                LLM_RATE_LIMIT_REMAINING.labels(self.provider, kind).set(remaining_value)
+                bucket.observe(remaining_value, now)
+                reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if remaining_value < 1 and reset:
+                    self.paused_until = max(self.paused_until, now + reset)
+
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens:
+                try:
+                    capacity = float(limit_tokens)
+                except ValueError:
+                    capacity = None
+                if capacity and capacity != self.tokens.capacity:
+                    self.tokens.capacity = capacity
+                    self.tokens.refill_per_second = capacity / 60
+
+            retry_after = parse_reset_duration(headers.get("retry-after"))
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            self._condition.notify_all()
+
+
+groq_scheduler = LLMScheduler("groq", GROQ_RPM_LIMIT, GROQ_TPM_LIMIT)
@@ -0,0 +1,40 @@
+"""Registry of heavy optional components that are imported on first use.
+
+Parsers and embedding models pull in langchain, pypdf and friends,
+which dominate worker cold start even though the query path never needs them.
+Entries are ``"module:attribute"`` strings resolved with importlib and cached.
+"""
+import importlib
+from functools import lru_cache
+
+
+LOADER_REGISTRY = {
+    ".pdf": "langchain_community.document_loaders:PyPDFLoader",
+    ".txt": "langchain_community.document_loaders:TextLoader",
+    ".doc": "langchain_community.document_loaders:Docx2txtLoader",
+    ".docx": "langchain_community.document_loaders:Docx2txtLoader",
+}
+EMBEDDINGS_PATH = "langchain_huggingface:HuggingFaceEmbeddings"
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+@lru_cache(maxsize=None)
+def load_object(path: str):
+    module_name, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def supported_extensions() -> set[str]:
+    return set(LOADER_REGISTRY)
+
+
+def get_loader_class(ext: str):
+    path = LOADER_REGISTRY.get(ext)
+    if path is None:
+        raise ValueError(f"Unsupported file type: {ext}")
+    return load_object(path)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL):
+    return load_object(EMBEDDINGS_PATH)(model_name=model_name)
@@ -0,0 +1,246 @@
+import math
+import random
+import statistics
+import threading
+import tracemalloc
+from collections import defaultdict, deque
+from pathlib import Path
+
+from app.config import (
+    MEMORY_GROWTH_MIN_CORPUS_RATIO,
+    MEMORY_GROWTH_WARN_ELASTICITY,
+    MEMORY_TRACE_FRAMES,
+    MEMORY_TRACE_INTERVAL_MS,
+    MEMORY_TRACE_MAX_RECORDS,
+    MEMORY_TRACE_SAMPLE_RATE,
+    MEMORY_TRACE_TOP_SITES,
+)
+from app.core.rag_logger import get_app_logger, log_trace_event, utcnow_iso
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+APP_DIR = str(BACKEND_DIR / "app")
+TRACER_FILES = frozenset({__file__, tracemalloc.__file__})
+# A new peak snapshot is only taken when traced memory grew by this much
+PEAK_SNAPSHOT_GROWTH = 1.1
+# Per route, peaks kept per corpus size and corpus sizes kept
+SAMPLES_PER_CORPUS_SIZE = 20
+MAX_CORPUS_SIZES = 50
+
+logger = get_app_logger("personal_rag.memory")
+# tracemalloc is process-wide, so only one request is traced at a time;
+# allocations by requests running alongside it are still counted.
+_trace_lock = threading.Lock()
+_records_lock = threading.Lock()
+_records: deque = deque(maxlen=MEMORY_TRACE_MAX_RECORDS)
+_route_peaks: dict[str, dict[int, deque]] = defaultdict(dict)
+_route_growth: dict[str, dict] = {}
+
+
+def should_trace_memory(header_value: str | None) -> bool:
+    if header_value and header_value.strip().lower() in {"1", "true", "yes", "on"}:
+        return True
+    return MEMORY_TRACE_SAMPLE_RATE > 0 and random.random() < MEMORY_TRACE_SAMPLE_RATE
+
+
+class _PeakSampler(threading.Thread):
+    """Snapshots traced memory whenever it reaches a new high while the request runs."""
+
+    def __init__(self, interval_seconds: float):
+        super().__init__(name="rag-memory-sampler", daemon=True)
+        self.interval_seconds = interval_seconds
+        self.snapshot: tracemalloc.Snapshot | None = None
+        self.snapshot_bytes = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval_seconds):
+            current = tracemalloc.get_traced_memory()[0]
+            if current > self.snapshot_bytes * PEAK_SNAPSHOT_GROWTH:
+                self.snapshot = tracemalloc.take_snapshot()
+                self.snapshot_bytes = current
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+class RequestMemoryTrace:
+    """tracemalloc accounting for one request: peak, retained bytes and allocation sites."""
+
+    def __init__(self):
+        self._started_tracing = False
+        self._baseline_bytes = 0
+        self._baseline: tracemalloc.Snapshot | None = None
+        self._sampler: _PeakSampler | None = None
+
+    @classmethod
+    def begin(cls) -> "RequestMemoryTrace | None":
+        """Start tracing, or return None when another request is already being traced."""
+        if not _trace_lock.acquire(blocking=False):
+            return None
+        trace = cls()
+        if tracemalloc.is_tracing():
+            # started elsewhere (PYTHONTRACEMALLOC); diff against what is already traced
+            trace._baseline = tracemalloc.take_snapshot()
+        else:
+            tracemalloc.start(max(MEMORY_TRACE_FRAMES, 1))
+            trace._started_tracing = True
+        tracemalloc.reset_peak()
+        trace._baseline_bytes = tracemalloc.get_traced_memory()[0]
+        trace._sampler = _PeakSampler(MEMORY_TRACE_INTERVAL_MS / 1000)
+        trace._sampler.start()
+        return trace
+
+    def finish(self) -> dict:
+        try:
+            self._sampler.stop()
+            current, peak = tracemalloc.get_traced_memory()
+            retained = self._allocations(tracemalloc.take_snapshot())
+            at_peak = self._allocations(self._sampler.snapshot) if self._sampler.snapshot else retained
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+            _trace_lock.release()
+        return {
+            "peak_bytes": max(peak - self._baseline_bytes, 0),
+            "retained_bytes": max(current - self._baseline_bytes, 0),
+            "peak_sites": _top_sites(at_peak),
+            "retained_sites": _top_sites(retained),
+        }
+
+    def _allocations(self, snapshot: tracemalloc.Snapshot) -> list[tuple[tracemalloc.Traceback, int]]:
+        # filter after grouping identical tracebacks; Snapshot.filter_traces runs fnmatch per trace
+        if self._baseline is None:
+            grouped = [(stat.traceback, stat.size) for stat in snapshot.statistics("traceback")]
+        else:
+            grouped = [
+                (stat.traceback, stat.size_diff)
+                for stat in snapshot.compare_to(self._baseline, "traceback")
+                if stat.size_diff > 0
+            ]
+        # leave out the tracer's own bookkeeping (snapshots, the sampler thread)
+        return [
+            (traceback, size)
+            for traceback, size in grouped
+            if not any(frame.filename in TRACER_FILES for frame in traceback)
+        ]
+
+
+def _site(traceback: tracemalloc.Traceback) -> str:
+    """The innermost app frame of an allocation, or its innermost frame outside app code."""
+    frame = next((frame for frame in reversed(traceback) if frame.filename.startswith(APP_DIR)), traceback[-1])
+    path = Path(frame.filename)
+    label = path.relative_to(BACKEND_DIR).as_posix() if frame.filename.startswith(APP_DIR) else path.name
+    return f"{label}:{frame.lineno}"
+
+
+def _top_sites(allocations: list[tuple[tracemalloc.Traceback, int]]) -> list[dict]:
+    sizes: dict[str, int] = defaultdict(int)
+    for traceback, size in allocations:
+        sizes[_site(traceback)] += size
+    top = sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:MEMORY_TRACE_TOP_SITES]
+    return [{"site": site, "bytes": size} for site, size in top]
+
+
+def _growth(route: str, corpus_chunks: int, peak_bytes: int) -> dict | None:
+    """Fit how a route's median peak scales between the smallest and largest corpus seen.
+
+    ``elasticity`` is the exponent k in peak ~ corpus_size**k: 0 means flat,
+    1 means the request allocates in proportion to the corpus.
+    """
+    peaks = _route_peaks[route]
+    peaks.setdefault(corpus_chunks, deque(maxlen=SAMPLES_PER_CORPUS_SIZE)).append(peak_bytes)
+    if len(peaks) > MAX_CORPUS_SIZES:
+        smallest, largest = min(peaks), max(peaks)
+        del peaks[min((size for size in peaks if size not in (smallest, largest)), key=lambda size: len(peaks[size]))]
+    smallest, largest = min(peaks), max(peaks)
+    if smallest <= 0 or largest / smallest < MEMORY_GROWTH_MIN_CORPUS_RATIO:
+        return None
+    small_peak = statistics.median(peaks[smallest])
+    large_peak = statistics.median(peaks[largest])
+    if small_peak <= 0 or large_peak <= 0:
+        return None
+    elasticity = math.log(large_peak / small_peak) / math.log(largest / smallest)
+    return {
+        "corpus_chunks": [smallest, largest],
+        "median_peak_bytes": [int(small_peak), int(large_peak)],
+        "elasticity": round(elasticity, 3),
+        "growing": elasticity >= MEMORY_GROWTH_WARN_ELASTICITY,
+    }
+
+
+def record_request_memory(
+    usage: dict,
+    *,
+    trace_id: str,
+    route: str,
+    method: str,
+    status: int,
+    corpus_chunks: int,
+    duration_ms: float,
+) -> dict:
+    record = {
+        "timestamp": utcnow_iso(),
+        "trace_id": trace_id,
+        "route": route,
+        "method": method,
+        "status": status,
+        "corpus_chunks": corpus_chunks,
+        "duration_ms": duration_ms,
+        **usage,
+    }
+    with _records_lock:
+        _records.append(record)
+        growth = _growth(f"{method} {route}", corpus_chunks, usage["peak_bytes"])
+        previous = _route_growth.get(f"{method} {route}")
+        if growth:
+            _route_growth[f"{method} {route}"] = growth
+    log_trace_event("memory.request", record, trace_id=trace_id, always=True)
+    if growth and growth["growing"] and (
+        not previous or not previous["growing"] or previous["corpus_chunks"] != growth["corpus_chunks"]
+    ):
+        logger.warning(
+            "Peak allocations of %s %s grow with corpus size: %s -> %s bytes for %s -> %s chunks (elasticity %s)",
+            method,
+            route,
+            *growth["median_peak_bytes"],
+            *growth["corpus_chunks"],
+            growth["elasticity"],
+        )
+        log_trace_event(
+            "memory.growth",
+            {"route": route, "method": method, **growth, "peak_sites": usage["peak_sites"][:3]},
+            trace_id=trace_id,
+            always=True,
+        )
+    return record
+
+
+def memory_report(limit: int = 50, route: str | None = None, trace_id: str | None = None) -> dict:
+    with _records_lock:
+        records = list(_records)
+        growth = dict(_route_growth)
+    routes: dict[str, dict] = {}
+    for record in records:
+        key = f"{record['method']} {record['route']}"
+        summary = routes.setdefault(key, {"requests": 0, "peak_bytes": [], "retained_bytes_max": 0})
+        summary["requests"] += 1
+        summary["peak_bytes"].append(record["peak_bytes"])
+        summary["retained_bytes_max"] = max(summary["retained_bytes_max"], record["retained_bytes"])
+    for key, summary in routes.items():
+        peaks = summary.pop("peak_bytes")
+        summary["peak_bytes_p50"] = int(statistics.median(peaks))
+        summary["peak_bytes_max"] = max(peaks)
+        summary["growth"] = growth.get(key)
+
+    if route:
+        records = [record for record in records if record["route"] == route]
+    if trace_id:
+        records = [record for record in records if record["trace_id"] == trace_id]
+    return {
+        "sample_rate": MEMORY_TRACE_SAMPLE_RATE,
+        "tracing": tracemalloc.is_tracing(),
+        "routes": routes,
+        "recent": records[-limit:][::-1],
+    }
@@ -0,0 +1,162 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+STAGE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+PROVIDER_ERROR_WINDOW = 100
+
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    ["route", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    "rag_http_request_duration_seconds",
+    "Total HTTP request wall time.",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "rag_http_requests_in_flight",
+    "HTTP requests currently being served.",
+)
+CORPUS_DOCUMENTS = Gauge("rag_corpus_documents", "Documents in the corpus store.")
+CORPUS_CHUNKS = Gauge("rag_corpus_chunks", "Chunks in the corpus store.")
+CONTEXT_TOKENS_SAVED = Counter(
+    "rag_context_tokens_saved_total",
+    "Estimated prompt tokens removed by context packing.",
+)
+QUERIES_COALESCED = Counter(
+    "rag_queries_coalesced_total",
+    "Queries answered by waiting on an identical in-flight query.",
+)
+EARLY_ABSTENTIONS = Counter(
+    "rag_early_abstentions_total",
+    "Queries refused on calibrated retrieval confidence without calling the LLM.",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "rag_admission_queue_depth",
+    "Requests waiting for an admission slot.",
+    ["group"],
+)
+ADMISSION_WAIT = Histogram(
+    "rag_admission_wait_seconds",
+    "Time admitted requests waited for a slot.",
+    ["group"],
+    buckets=STAGE_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "rag_admission_rejected_total",
+    "Requests turned away with 503 because the queue was full or the wait timed out.",
+    ["group", "reason"],
+)
+PROVIDER_CALLS = Counter(
+    "rag_llm_provider_calls_total",
+    "LLM provider calls by outcome.",
+    ["provider", "outcome"],
+)
+LLM_CALL_DURATION = Histogram(
+    "rag_llm_call_seconds",
+    "LLM call latency, split by whether the model had to be loaded first.",
+    ["provider", "start"],
+    buckets=STAGE_BUCKETS,
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "rag_llm_queue_depth",
+    "Calls waiting for rate-limit budget.",
+    ["provider"],
+)
+LLM_QUEUE_WAIT = Histogram(
+    "rag_llm_queue_wait_seconds",
+    "Time calls spent waiting for rate-limit budget.",
+    ["provider", "priority"],
+    buckets=STAGE_BUCKETS,
+)
+LLM_RATE_LIMIT_REMAINING = Gauge(
+    "rag_llm_rate_limit_remaining",
+    "Remaining provider budget reported by rate-limit response headers.",
+    ["provider", "kind"],
+)
+PROVIDER_ERROR_RATE = Gauge(
+    "rag_llm_provider_error_rate",
+    f"Share of failed calls over the last {PROVIDER_ERROR_WINDOW} calls per provider.",
+    ["provider"],
+)
+
+_provider_outcomes: dict[str, deque] = defaultdict(lambda: deque(maxlen=PROVIDER_ERROR_WINDOW))
+_provider_lock = Lock()
+
+
+class StageTimer:
+    """Accumulates per-stage durations for one request.
+
+    Durations are kept in milliseconds for logs and the Server-Timing header and
+    are only pushed to the Prometheus histograms once, in ``observe()``, so a
+    stage that runs several times per request counts as a single sample.
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self.durations_ms: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (perf_counter() - started) * 1000)
+
+    def add(self, name: str, duration_ms: float) -> None:
+        self.durations_ms[name] = round(self.durations_ms.get(name, 0.0) + duration_ms, 3)
+
+    def as_dict(self) -> dict[str, float]:
+        return dict(self.durations_ms)
+
+    def observe(self) -> None:
+        for name, duration_ms in self.durations_ms.items():
+            STAGE_DURATION.labels(self.route, name).observe(duration_ms / 1000)
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={duration_ms}" for name, duration_ms in self.durations_ms.items())
+
+
+def record_provider_call(provider: str, ok: bool) -> None:
+    PROVIDER_CALLS.labels(provider, "success" if ok else "error").inc()
+    with _provider_lock:
+        outcomes = _provider_outcomes[provider]
+        outcomes.append(0 if ok else 1)
+        error_rate = sum(outcomes) / len(outcomes)
+    PROVIDER_ERROR_RATE.labels(provider).set(error_rate)
+
+
+def set_corpus_size(documents: int, chunks: int) -> None:
+    CORPUS_DOCUMENTS.set(documents)
+    CORPUS_CHUNKS.set(chunks)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,221 @@
+import statistics
+import threading
+from collections import deque
+from time import monotonic, perf_counter
+
+import requests
+
+from app.config import (
+    CONTEXT_TOKEN_BUDGET,
+    LLM_FALLBACK_PROVIDER,
+    LLM_PROVIDER,
+    LLM_PROVIDER_SETTINGS,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_KEEP_WARM_SECONDS,
+    OLLAMA_NUM_CTX,
+    OLLAMA_PRELOAD,
+)
+from app.core.metrics import LLM_CALL_DURATION
+from app.core.rag_logger import get_app_logger, log_trace_event
+
+
+# a call whose reported load_duration exceeds this had to load the model first
+COLD_LOAD_MS = 500
+# prompt template + question on top of the packed context, and room for the answer
+PROMPT_OVERHEAD_TOKENS = 256
+COMPLETION_TOKEN_RESERVE = 512
+LATENCY_WINDOW = 200
+
+logger = get_app_logger("personal_rag.llm")
+
+
+def keep_alive_value(value: str) -> int | str:
+    """Ollama takes seconds as a number or a duration string such as ``"30m"``."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def context_window() -> int:
+    """Fixed ``num_ctx`` for every call; changing it between calls makes Ollama reload the model."""
+    if OLLAMA_NUM_CTX > 0:
+        return OLLAMA_NUM_CTX
+    needed = CONTEXT_TOKEN_BUDGET + PROMPT_OVERHEAD_TOKENS + COMPLETION_TOKEN_RESERVE
+    return -(-needed // 1024) * 1024
+
+
+def _latency_summary(samples: deque, count: int) -> dict:
+    values = sorted(samples)
+    if not values:
+        return {"count": count}
+    return {
+        "count": count,
+        "p50_ms": round(statistics.median(values), 2),
+        "p95_ms": round(values[min(int(len(values) * 0.95), len(values) - 1)], 2),
+        "max_ms": round(values[-1], 2),
+    }
+
+
+class OllamaLifecycle:
+    """Keeps the configured Ollama model resident between queries.
+
+    The model is loaded once at startup, every call asks Ollama to keep it for
+    ``keep_alive``, and a background thread sends an empty load request whenever
+    the model has been idle for ``OLLAMA_KEEP_WARM_SECONDS``. Calls are split
+    into cold (the model had to be loaded) and warm by Ollama's ``load_duration``.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self.keep_alive = keep_alive_value(OLLAMA_KEEP_ALIVE)
+        self.num_ctx = context_window()
+        self.loaded = False
+        self.preload_ms: float | None = None
+        self.pings = 0
+        self.reloads = 0
+        self.failures = 0
+        self._last_used = 0.0
+        self._last_attempt = 0.0
+        self._samples = {"cold": deque(maxlen=LATENCY_WINDOW), "warm": deque(maxlen=LATENCY_WINDOW)}
+        self._counts = {"cold": 0, "warm": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def request_fields(self) -> dict:
+        """Fields added to every /api/generate payload so calls reuse the loaded model."""
+        return {"keep_alive": self.keep_alive, "options": {"num_ctx": self.num_ctx}}
+
+    def idle_seconds(self) -> float:
+        with self._lock:
+            return monotonic() - self._last_used if self._last_used else float("inf")
+
+    def record_call(self, duration_ms: float, load_duration_ns: int | None) -> str:
+        start = "cold" if (load_duration_ns or 0) / 1e6 >= COLD_LOAD_MS else "warm"
+        LLM_CALL_DURATION.labels("ollama", start).observe(duration_ms / 1000)
+        with self._lock:
+            self._samples[start].append(duration_ms)
+            self._counts[start] += 1
+            self._last_used = monotonic()
+            self.loaded = True
+        return start
+
+    def load(self) -> tuple[float, float]:
+        """Load or refresh the model without generating; returns (total_ms, load_ms)."""
+        with self._lock:
+            self._last_attempt = monotonic()
+        started = perf_counter()
+        response = requests.post(
+            f"{self.settings['base_url'].rstrip('/')}/api/generate",
+            json={"model": self.settings["model"], **self.request_fields()},
+            timeout=self.settings["timeout"],
+        )
+        response.raise_for_status()
+        load_ms = (response.json().get("load_duration") or 0) / 1e6
+        with self._lock:
+            self._last_used = monotonic()
+            self.loaded = True
+        return round((perf_counter() - started) * 1000, 2), round(load_ms, 2)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rag-ollama-keepwarm", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=1)
+
+    def _run(self) -> None:
+        with self._lock:
+            # the keep-warm interval counts from startup, so a skipped or failed
+            # preload does not turn into an immediate ping
+            self._last_attempt = monotonic()
+        if OLLAMA_PRELOAD:
+            try:
+                self.preload_ms, load_ms = self.load()
+            except (requests.RequestException, ValueError) as exc:
+                self.failures += 1
+                logger.warning("Ollama preload of %s failed: %s", self.settings["model"], exc)
+            else:
+                logger.info(
+                    "Preloaded Ollama model=%s in %sms (load %sms) num_ctx=%s keep_alive=%s",
+                    self.settings["model"],
+                    self.preload_ms,
+                    load_ms,
+                    self.num_ctx,
+                    self.keep_alive,
+                )
+                log_trace_event(
+                    "llm.preload",
+                    {
+                        "model": self.settings["model"],
+                        "duration_ms": self.preload_ms,
+                        "load_ms": load_ms,
+                        "num_ctx": self.num_ctx,
+                        "keep_alive": self.keep_alive,
+                    },
+                    always=True,
+                )
+
+        interval = OLLAMA_KEEP_WARM_SECONDS
+        # a negative keep_alive already keeps the model loaded indefinitely
+        if interval <= 0 or (isinstance(self.keep_alive, int) and self.keep_alive < 0):
+            return
+        while True:
+            # failed pings count as contact too, so an unreachable server is retried once per interval
+            with self._lock:
+                delay = interval - (monotonic() - max(self._last_used, self._last_attempt))
+            if delay > 0:
+                if self._stop.wait(delay):
+                    return
+                continue
+            self._ping()
+
+    def _ping(self) -> None:
+        try:
+            duration_ms, load_ms = self.load()
+        except (requests.RequestException, ValueError) as exc:
+            self.failures += 1
+            self.loaded = False
+            logger.warning("Ollama keep-warm ping failed: %s", exc)
+            return
+        self.pings += 1
+        if load_ms >= COLD_LOAD_MS:
+            # something evicted the model (Ollama restart, another client's keep_alive)
+            self.reloads += 1
+            logger.info("Keep-warm ping reloaded Ollama model=%s in %sms", self.settings["model"], duration_ms)
+
+    def status(self) -> dict:
+        with self._lock:
+            cold = _latency_summary(self._samples["cold"], self._counts["cold"])
+            warm = _latency_summary(self._samples["warm"], self._counts["warm"])
+        idle = self.idle_seconds()
+        return {
+            "enabled": ollama_in_use(),
+            "model": self.settings["model"],
+            "keep_alive": self.keep_alive,
+            "keep_warm_seconds": OLLAMA_KEEP_WARM_SECONDS,
+            "num_ctx": self.num_ctx,
+            "loaded": self.loaded,
+            "preload_ms": self.preload_ms,
+            "idle_seconds": None if idle == float("inf") else round(idle, 1),
+            "pings": self.pings,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "cold": cold,
+            "warm": warm,
+        }
+
+
+def ollama_in_use() -> bool:
+    """Ollama is the provider, or a fallback that was configured explicitly."""
+    return "ollama" in (LLM_PROVIDER, LLM_FALLBACK_PROVIDER)
+
+
+ollama_lifecycle = OllamaLifecycle(LLM_PROVIDER_SETTINGS["ollama"])
@@ -0,0 +1,161 @@
+import cProfile
+import io
+import json
+import pstats
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+
+from app.config import (
+    PROFILE_DIR,
+    PROFILE_MAX_CAPTURES,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_SAMPLE_RATE,
+)
+from app.core.rag_logger import get_app_logger, log_trace_event, utcnow_iso
+
+
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{6,32}$")
+PROFILE_FORMATS = {
+    "pstats": ".pstats",
+    "collapsed": ".collapsed.txt",
+}
+
+logger = get_app_logger("personal_rag.profiling")
+# cProfile can only have one active profiler per interpreter on recent Pythons,
+# so concurrent profiled requests are skipped rather than queued.
+_profiler_lock = threading.Lock()
+
+
+def should_profile(header_value: str | None) -> bool:
+    if header_value and header_value.strip().lower() in {"1", "true", "yes", "on"}:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval_seconds: float):
+        super().__init__(name="rag-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def _profile_path(trace_id: str, suffix: str) -> Path:
+    return Path(PROFILE_DIR) / f"{trace_id}{suffix}"
+
+
+def _prune_profiles() -> None:
+    metas = sorted(Path(PROFILE_DIR).glob("*.json"), key=lambda path: path.stat().st_mtime)
+    for meta_path in metas[: max(len(metas) - PROFILE_MAX_CAPTURES, 0)]:
+        trace_id = meta_path.name[: -len(".json")]
+        for suffix in [*PROFILE_FORMATS.values(), ".json"]:
+            _profile_path(trace_id, suffix).unlink(missing_ok=True)
+
+
+def _save_profile(
+    trace_id: str,
+    kind: str,
+    profiler: cProfile.Profile,
+    sampler: _StackSampler,
+    duration_ms: float,
+) -> dict:
+    Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(_profile_path(trace_id, PROFILE_FORMATS["pstats"]))
+    with open(_profile_path(trace_id, PROFILE_FORMATS["collapsed"]), "w", encoding="utf-8") as handle:
+        for stack, count in sampler.stacks.most_common():
+            handle.write(f"{stack} {count}\n")
+
+    meta = {
+        "trace_id": trace_id,
+        "kind": kind,
+        "created_at": utcnow_iso(),
+        "duration_ms": duration_ms,
+        "sample_count": sum(sampler.stacks.values()),
+        "sample_interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+    }
+    _profile_path(trace_id, ".json").write_text(json.dumps(meta), encoding="utf-8")
+    _prune_profiles()
+    return meta
+
+
+@contextmanager
+def profile_request(trace_id: str, kind: str, enabled: bool):
+    """Run the enclosed block under cProfile plus a stack sampler when enabled.
+
+    Only the calling thread is profiled, so the block must do its work
+    synchronously on that thread.
+    """
+    if not enabled or not _profiler_lock.acquire(blocking=False):
+        if enabled:
+            logger.info("Skipping profile trace_id=%s: another profile is running", trace_id)
+        yield
+        return
+
+    sampler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL_MS / 1000)
+    profiler = cProfile.Profile()
+    started = perf_counter()
+    try:
+        sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            sampler.stop()
+        duration_ms = round((perf_counter() - started) * 1000, 2)
+        meta = _save_profile(trace_id, kind, profiler, sampler, duration_ms)
+        log_trace_event("profile.captured", meta, trace_id=trace_id)
+    finally:
+        _profiler_lock.release()
+
+
+def list_profiles(limit: int = 50) -> list[dict]:
+    profile_dir = Path(PROFILE_DIR)
+    if not profile_dir.exists():
+        return []
+    metas = sorted(profile_dir.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    output = []
+    for meta_path in metas[:limit]:
+        try:
+            output.append(json.loads(meta_path.read_text(encoding="utf-8")))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return output
+
+
+def get_profile_path(trace_id: str, fmt: str) -> Path | None:
+    if not PROFILE_ID_RE.match(trace_id) or fmt not in PROFILE_FORMATS:
+        return None
+    path = _profile_path(trace_id, PROFILE_FORMATS[fmt])
+    return path if path.exists() else None
+
+
+def summarize_profile(path: Path, limit: int = 40) -> str:
+    output = io.StringIO()
+    stats = pstats.Stats(str(path), stream=output)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import logging
 from datetime import datetime, timezone
@@ -13,10 +14,14 @@ from app.config import (
     MONGO_URI,
     TRACE_LOG_PATH,
     TRACE_PREVIEW_CHARS,
+    TRACE_SAMPLE_RATE,
 )
+from app.core.context_builder import build_context
 
 
 LOGGER_NAME = "personal_rag"
+# Block size for reading log files backwards from the end
+TAIL_READ_BYTES = 64 * 1024
 
 
 def utcnow_iso() -> str:
@@ -49,6 +54,7 @@ def get_app_logger(name: str = LOGGER_NAME) -> logging.Logger:
     stream_handler.setFormatter(formatter)
     logger.addHandler(stream_handler)
 
+    Path(APP_LOG_PATH).parent.mkdir(parents=True, exist_ok=True)
     file_handler = logging.FileHandler(APP_LOG_PATH, encoding="utf-8")
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
@@ -66,13 +72,33 @@ def _append_jsonl(path: str, payload: dict) -> None:
         handle.write(json.dumps(payload, default=_json_default) + "\n")
 
 
-def log_trace_event(event_type: str, payload: dict, trace_id: str | None = None) -> dict:
+def content_hash(text: str | None) -> str:
+    """Short digest that tells whether logged chunk text still matches the store."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def trace_sampled(trace_id: str | None) -> bool:
+    """Keep or drop a whole trace; every event of one trace_id gets the same answer."""
+    if trace_id is None or TRACE_SAMPLE_RATE >= 1:
+        return True
+    digest = hashlib.sha256(trace_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32 < TRACE_SAMPLE_RATE
+
+
+def log_trace_event(
+    event_type: str,
+    payload: dict,
+    trace_id: str | None = None,
+    always: bool = False,
+) -> dict:
     event = {
         "timestamp": utcnow_iso(),
         "event_type": event_type,
         "trace_id": trace_id,
         **payload,
     }
+    if not always and not trace_sampled(trace_id):
+        return event
     _append_jsonl(TRACE_LOG_PATH, event)
     logger = get_app_logger()
     logger.info(
@@ -107,14 +133,27 @@ def log_query_event(payload: dict) -> None:
     _append_jsonl(LOG_PATH, payload)
 
 
+def _tail_lines(file_path: Path, limit: int) -> list[str]:
+    """The last ``limit`` lines of a file, read backwards so long logs are never loaded whole."""
+    with file_path.open("rb") as handle:
+        position = handle.seek(0, 2)
+        data = b""
+        while position > 0 and data.count(b"\n") <= limit:
+            step = min(TAIL_READ_BYTES, position)
+            position -= step
+            handle.seek(position)
+            data = handle.read(step) + data
+    # more than ``limit`` newlines were read, so a cut-off first line is never among the last ``limit``
+    return data.decode("utf-8", errors="replace").splitlines()[-limit:]
+
+
 def read_recent_jsonl(path: str, limit: int = 20) -> list[dict]:
     file_path = Path(path)
     if not file_path.exists():
         return []
 
-    lines = file_path.read_text(encoding="utf-8").splitlines()
     output = []
-    for line in lines[-limit:]:
+    for line in _tail_lines(file_path, limit):
         if not line.strip():
             continue
         try:
@@ -122,3 +161,44 @@ def read_recent_jsonl(path: str, limit: int = 20) -> list[dict]:
         except json.JSONDecodeError:
             continue
     return output
+
+
+def resolve_log_entry(entry: dict, store) -> dict:
+    """Return ``entry`` with chunk references filled in from ``store``.
+
+    Chunks logged as references get their current ``content``, ``metadata``
+    and ``preview`` back; ``stale`` marks chunks whose text changed since the
+    entry was logged and ``missing`` chunks that no longer exist. A query log
+    entry without its context gets it rebuilt from the resolved chunks.
+    """
+    entry = dict(entry)
+    for key in ("retrieved", "top_chunks"):
+        refs = entry.get(key)
+        if not refs or all("content" in ref for ref in refs):
+            continue
+        current = {chunk["id"]: chunk for chunk in store.get_chunks([ref["id"] for ref in refs if "id" in ref])}
+        resolved = []
+        for ref in refs:
+            chunk = current.get(ref.get("id"))
+            if "content" in ref:
+                resolved.append(ref)
+            elif chunk is None:
+                resolved.append({**ref, "missing": True})
+            else:
+                resolved.append(
+                    {
+                        **ref,
+                        "content": chunk["content"],
+                        "metadata": chunk["metadata"],
+                        "preview": ref.get("preview") or preview_text(chunk["content"], 220),
+                        "stale": ref.get("content_hash") not in (None, content_hash(chunk["content"])),
+                    }
+                )
+        entry[key] = resolved
+
+    if "context_hash" in entry and "context" not in entry:
+        chunks = [chunk for chunk in entry.get("retrieved") or [] if "content" in chunk]
+        context = build_context(chunks)[0] if chunks else ""
+        entry["context"] = context
+        entry["context_stale"] = content_hash(context) != entry["context_hash"]
+    return entry
@@ -0,0 +1,405 @@
+"""Read-only retrieval index shared by every worker through the page cache.
+
+The structures lexical retrieval needs (lowercased chunk text, a vocabulary
+with postings, and per-chunk offsets) are written once per corpus version to
+a single binary file. Workers memory-map it read-only instead of each loading
+the corpus into Python objects, so N uvicorn workers share one copy and a
+worker that starts late finds the index already warm.
+
+Layout: a fixed header, then 8-byte aligned sections listed in ``SECTIONS``.
+Integer columns are little-endian ``uint32`` except ``text_offsets``
+(``uint64``). ``documents`` is a small JSON list; ``vocab`` holds the sorted
+terms, each prefixed with a newline.
+"""
+import array
+import bisect
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from app.config import RETRIEVAL_INDEX_DIR
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+MAGIC = b"RAGRIDX1"
+FORMAT_VERSION = 1
+SECTIONS = (
+    "documents",
+    "chunk_documents",
+    "chunk_indexes",
+    "text_offsets",
+    "id_offsets",
+    "ids",
+    "term_offsets",
+    "vocab",
+    "posting_offsets",
+    "postings",
+    "text",
+)
+HEADER = struct.Struct("<8sIQI" + "QQ" * len(SECTIONS))
+TERM_RE = re.compile(rb"[a-z0-9]+")
+ALNUM_RE = re.compile(r"[a-z0-9]+")
+MAX_TOKEN_HITS = 6
+
+
+def _align(handle) -> None:
+    padding = -handle.tell() % 8
+    if padding:
+        handle.write(b"\0" * padding)
+
+
+def _little_endian(values: array.array) -> bytes:
+    if sys.byteorder != "little":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def index_path(store, version: int) -> Path:
+    return Path(RETRIEVAL_INDEX_DIR) / f"{store.db_path.stem}.{version}.ridx"
+
+
+def build_retrieval_index(store) -> Path:
+    """Write the index for the store's current corpus version and prune older ones."""
+    directory = Path(RETRIEVAL_INDEX_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    documents: list[dict] = []
+    chunk_documents = array.array("I")
+    chunk_indexes = array.array("I")
+    text_offsets = array.array("Q", [0])
+    id_offsets = array.array("I", [0])
+    ids = bytearray()
+    postings: dict[bytes, array.array] = {}
+    version = None
+
+    with tempfile.TemporaryFile(dir=directory) as text_file:
+        for version, chunks in store.iter_corpus_chunks():
+            for chunk in chunks:
+                if not documents or documents[-1]["id"] != chunk["document_id"]:
+                    documents.append(
+                        {
+                            "id": chunk["document_id"],
+                            "filename": (chunk["filename"] or "").lower(),
+                            "first": len(chunk_documents),
+                            "count": 0,
+                        }
+                    )
+                documents[-1]["count"] += 1
+                position = len(chunk_documents)
+                text = chunk["content"].lower().encode("utf-8")
+                text_file.write(text)
+                chunk_documents.append(len(documents) - 1)
+                chunk_indexes.append(chunk["chunk_index"])
+                text_offsets.append(text_offsets[-1] + len(text))
+                ids.extend(chunk["id"].encode("utf-8"))
+                id_offsets.append(len(ids))
+                for term in set(TERM_RE.findall(text)):
+                    postings.setdefault(term, array.array("I")).append(position)
+        if version is None:
+            version = store.corpus_version()
+
+        terms = sorted(postings)
+        vocab = b"".join(b"\n" + term for term in terms)
+        term_offsets = array.array("I", [0])
+        posting_offsets = array.array("I", [0])
+        for term in terms:
+            term_offsets.append(term_offsets[-1] + len(term) + 1)
+            posting_offsets.append(posting_offsets[-1] + len(postings[term]))
+
+        path = index_path(store, version)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        sections = {}
+        with open(temporary, "wb") as handle:
+            handle.write(b"\0" * HEADER.size)
+            parts = {
+                "documents": json.dumps(documents).encode("utf-8"),
+                "chunk_documents": _little_endian(chunk_documents),
+                "chunk_indexes": _little_endian(chunk_indexes),
+                "text_offsets": _little_endian(text_offsets),
+                "id_offsets": _little_endian(id_offsets),
+                "ids": bytes(ids),
+                "term_offsets": _little_endian(term_offsets),
+                "vocab": vocab,
+                "posting_offsets": _little_endian(posting_offsets),
+            }
+            for name in SECTIONS[:-2]:
+                _align(handle)
+                sections[name] = (handle.tell(), len(parts[name]))
+                handle.write(parts[name])
+            _align(handle)
+            start = handle.tell()
+            for term in terms:
+                handle.write(_little_endian(postings[term]))
+            sections["postings"] = (start, handle.tell() - start)
+            _align(handle)
+            start = handle.tell()
+            text_file.seek(0)
+            shutil.copyfileobj(text_file, handle)
+            sections["text"] = (start, handle.tell() - start)
+
+            handle.seek(0)
+            table = [value for name in SECTIONS for value in sections[name]]
+            handle.write(HEADER.pack(MAGIC, FORMAT_VERSION, version, len(chunk_documents), *table))
+            handle.flush()
+            os.fsync(handle.fileno())
+    os.replace(temporary, path)
+
+    # Older versions and retired generations; workers still mapping one keep
+    # reading it until they switch
+    for stale in directory.glob("*.ridx"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return path
+
+
+class RetrievalIndex:
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, version, chunk_count, *table = HEADER.unpack_from(self._map)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported retrieval index: {path}")
+        self.version = version
+        self.chunk_count = chunk_count
+        self._sections = {
+            name: (table[index * 2], table[index * 2 + 1]) for index, name in enumerate(SECTIONS)
+        }
+        view = memoryview(self._map)
+        columns = {}
+        for name, typecode in (
+            ("chunk_documents", "I"),
+            ("chunk_indexes", "I"),
+            ("text_offsets", "Q"),
+            ("id_offsets", "I"),
+            ("term_offsets", "I"),
+            ("posting_offsets", "I"),
+            ("postings", "I"),
+        ):
+            offset, length = self._sections[name]
+            columns[name] = view[offset:offset + length].cast(typecode)
+        self.chunk_documents = columns["chunk_documents"]
+        self.chunk_indexes = columns["chunk_indexes"]
+        self.text_offsets = columns["text_offsets"]
+        self._id_offsets = columns["id_offsets"]
+        self._term_offsets = columns["term_offsets"]
+        self._posting_offsets = columns["posting_offsets"]
+        self._postings = columns["postings"]
+        # NumPy views over the same mapped pages, for whole-corpus arithmetic
+        self.chunk_documents_array = np.frombuffer(self.chunk_documents, dtype="<u4")
+        self.text_offsets_array = np.frombuffer(self.text_offsets, dtype="<u8")
+        self.postings_array = np.frombuffer(self._postings, dtype="<u4")
+        self._text_start = self._sections["text"][0]
+        self._vocab_start, self._vocab_length = self._sections["vocab"]
+        offset, length = self._sections["documents"]
+        self.documents = json.loads(self._map[offset:offset + length])
+
+    def chunk_id(self, position: int) -> str:
+        offset = self._sections["ids"][0]
+        return self._map[
+            offset + self._id_offsets[position]:offset + self._id_offsets[position + 1]
+        ].decode("utf-8")
+
+    def _containing_terms(self, piece: bytes) -> np.ndarray:
+        """Sorted positions of chunks with a vocabulary term containing ``piece``."""
+        slices = []
+        start = self._vocab_start
+        end = self._vocab_start + self._vocab_length
+        while True:
+            hit = self._map.find(piece, start, end)
+            if hit < 0:
+                break
+            term = bisect.bisect_right(self._term_offsets, hit - self._vocab_start) - 1
+            slices.append(self.postings_array[self._posting_offsets[term]:self._posting_offsets[term + 1]])
+            # continue after this term; one hit per term is enough
+            start = self._vocab_start + self._term_offsets[term + 1]
+        if not slices:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(slices)).astype(np.int64)
+
+    def _matches(self, piece: str, within: np.ndarray | None) -> np.ndarray:
+        """Sorted positions of chunks that can contain ``piece`` at all.
+
+        Any match of an alphanumeric run lies inside one vocabulary term, so
+        the postings of the terms containing the longest run cover every chunk
+        the piece occurs in. Pieces without one fall back to every chunk.
+        """
+        runs = ALNUM_RE.findall(piece)
+        if not runs:
+            return np.arange(self.chunk_count) if within is None else within
+        positions = self._containing_terms(max(runs, key=len).encode("utf-8"))
+        if within is not None:
+            positions = np.intersect1d(positions, within, assume_unique=True)
+        return positions
+
+    def positions(self, keys) -> np.ndarray:
+        """Sorted positions of ``(document_id, chunk_index)`` keys present in the index."""
+        documents = {document["id"]: document for document in self.documents}
+        found = []
+        for document_id, chunk_index in keys:
+            document = documents.get(document_id)
+            if document is None:
+                continue
+            first = document["first"]
+            indexes = self.chunk_indexes[first:first + document["count"]]
+            offset = bisect.bisect_left(indexes, chunk_index)
+            if offset < len(indexes) and indexes[offset] == chunk_index:
+                found.append(first + offset)
+        return np.unique(np.array(found, dtype=np.int64))
+
+    def _contains(self, piece: str, positions: np.ndarray) -> np.ndarray:
+        needle = piece.encode("utf-8")
+        find = self._map.find
+        starts = self._text_start + self.text_offsets_array[positions]
+        ends = self._text_start + self.text_offsets_array[positions + 1]
+        hits = [find(needle, start, end) >= 0 for start, end in zip(starts.tolist(), ends.tolist())]
+        return positions[np.array(hits, dtype=bool)] if hits else positions
+
+    def _counts(self, token: str, positions: np.ndarray) -> np.ndarray:
+        """Non-overlapping occurrences of ``token`` per chunk, capped at ``MAX_TOKEN_HITS``."""
+        needle = token.encode("utf-8")
+        step = len(needle)
+        find = self._map.find
+        starts = self._text_start + self.text_offsets_array[positions]
+        ends = self._text_start + self.text_offsets_array[positions + 1]
+        counts = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            hits = 0
+            cursor = find(needle, start, end)
+            while cursor >= 0 and hits < MAX_TOKEN_HITS:
+                hits += 1
+                cursor = find(needle, cursor + step, end)
+            counts.append(hits)
+        return np.array(counts, dtype=np.int32)
+
+    def _filename_bonuses(self, tokens: set[str], phrase_queries: list[str]) -> np.ndarray:
+        bonuses = np.zeros(len(self.documents), dtype=np.int32)
+        for number, document in enumerate(self.documents):
+            filename = document["filename"]
+            for phrase in phrase_queries:
+                if phrase.lower() in filename:
+                    bonuses[number] += 5
+            for token in tokens:
+                if len(token) > 1 and token in filename:
+                    bonuses[number] += 2
+        return bonuses
+
+    def score(
+        self,
+        query: str,
+        tokens: set[str],
+        phrase_queries: list[str],
+        within: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """Score the corpus into one array, leaving chunks outside ``within`` at zero.
+
+        Each query piece is only matched against the chunks its postings allow.
+        """
+        scores = np.zeros(self.chunk_count, dtype=np.int32)
+        normalized_query = query.lower()
+        if normalized_query:
+            scores[self._contains(normalized_query, self._matches(normalized_query, within))] += 30
+        for phrase in phrase_queries:
+            phrase_lower = phrase.lower()
+            scores[self._contains(phrase_lower, self._matches(phrase_lower, within))] += 20
+        for token in tokens:
+            if len(token) <= 1:
+                continue
+            positions = self._matches(token, within)
+            scores[positions] += np.minimum(self._counts(token, positions), MAX_TOKEN_HITS) * 3
+        bonuses = self._filename_bonuses(tokens, phrase_queries)
+        if within is None:
+            scores += bonuses[self.chunk_documents_array]
+        else:
+            scores[within] += bonuses[self.chunk_documents_array[within]]
+        return scores
+
+    def top(self, scores: np.ndarray, top_k: int) -> tuple[list["ScoredChunk"], int]:
+        """Best ``top_k`` chunks and how many scored above zero.
+
+        Ties rank the newest document first, then chunk order, which is index
+        order. Only the winners become ``ScoredChunk`` records.
+        """
+        scored = np.flatnonzero(scores > 0)
+        if len(scored) > top_k:
+            # only chunks at or above the k-th best score can rank
+            threshold = np.partition(scores[scored], len(scored) - top_k)[len(scored) - top_k]
+            pool = scored[scores[scored] >= threshold]
+        else:
+            pool = scored
+        best = pool[np.lexsort((pool, -scores[pool]))[:top_k]]
+        return [ScoredChunk(self, position, int(scores[position])) for position in best.tolist()], len(scored)
+
+
+class ScoredChunk:
+    """A ranked chunk of the index, resolved to a store chunk only for the final top-k."""
+
+    __slots__ = ("position", "score", "chunk_id", "document_index", "chunk_index")
+
+    def __init__(self, index: RetrievalIndex, position: int, score: int):
+        self.position = position
+        self.score = score
+        self.chunk_id = index.chunk_id(position)
+        self.document_index = index.chunk_documents[position]
+        self.chunk_index = index.chunk_indexes[position]
+
+
+_INDEX: RetrievalIndex | None = None
+_INDEX_LOCK = threading.Lock()
+
+
+def ensure_retrieval_index(store) -> Path:
+    """Path of the index for the current corpus version, building it if missing.
+
+    Called after ingest so queries find the new file ready; the lock keeps
+    concurrent workers from building the same version twice.
+    """
+    path = index_path(store, store.corpus_version())
+    lock_path = Path(RETRIEVAL_INDEX_DIR) / f"{store.db_path.stem}.lock"
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if path.exists():
+                return path
+            return build_retrieval_index(store)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_retrieval_index(store) -> RetrievalIndex:
+    """Return the mapped index for the store's current corpus version.
+
+    A worker that sees a newer version maps the file written after ingest, or
+    builds it if ingest did not; the previous mapping is released once no
+    query holds it.
+    """
+    global _INDEX
+    path = index_path(store, store.corpus_version())
+    index = _INDEX
+    if index is not None and index.path == path:
+        return index
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.path != path:
+            try:
+                _INDEX = RetrievalIndex(path)
+            except FileNotFoundError:
+                # a write can land mid-build; serve what was built, the next query catches up
+                _INDEX = RetrievalIndex(ensure_retrieval_index(store))
+        return _INDEX
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) starts ``fn``; callers arriving while
+    it is in flight await the same result or exception instead of running
+    their own. The work runs as its own task and every caller awaits it through
+    ``asyncio.shield``, so a caller that is cancelled (client hung up) stops
+    waiting without cancelling the work the others are waiting on. Nothing is
+    cached once the work finishes.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        existing = self._calls.get(key)
+        if existing is not None:
+            return await asyncio.shield(existing), False
+
+        async def run():
+            try:
+                return await fn()
+            finally:
+                if self._calls.get(key) is task:
+                    del self._calls[key]
+
+        task = asyncio.ensure_future(run())
+        # Mark a failure as retrieved so it is not logged as "never retrieved"
+        # when every caller has stopped waiting.
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = task
+        return await asyncio.shield(task), True
@@ -1,23 +1,60 @@
 import os
-import re
 import hashlib
+import shutil
+from dataclasses import dataclass, field
 from pathlib import Path
-from fastapi import UploadFile
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
+from typing import TYPE_CHECKING
+
 from app.config import UPLOAD_DIR
+from app.core.loaders import get_loader_class, load_object
+
+if TYPE_CHECKING:
+    from fastapi import UploadFile
 
 
 BASE_UPLOAD_DIR = Path(UPLOAD_DIR)
-BASE_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+PDF_CHUNK_SIZE = 1200
+PDF_CHUNK_OVERLAP = 200
+TEXT_CHUNK_SIZE = 900
+TEXT_CHUNK_OVERLAP = 150
+INGEST_BATCH_SIZE = 64
+COPY_BLOCK_BYTES = 1024 * 1024
+
 
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"larger than {limit} bytes")
+        self.limit = limit
 
-def save_upload(file: UploadFile) -> str:
+
+def save_upload(file: "UploadFile") -> str:
     """Save uploaded file to disk and return the saved path."""
-    filename = Path(file.filename or "upload.bin").name
-    file_path = BASE_UPLOAD_DIR / filename
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
+    return save_stream(file.filename or "upload.bin", file.file)
+
+
+def save_stream(name: str, stream, max_bytes: int | None = None) -> str:
+    """Copy a readable binary stream into the upload folder in 1 MB pieces.
+
+    With ``max_bytes``, a stream that turns out longer is deleted again and
+    ``UploadTooLarge`` raised; the declared size of a compressed member can lie.
+    """
+    BASE_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    file_path = BASE_UPLOAD_DIR / Path(name).name
+    if max_bytes is None:
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(stream, f, COPY_BLOCK_BYTES)
+        return str(file_path)
+    written = 0
+    try:
+        with open(file_path, "wb") as f:
+            while block := stream.read(min(COPY_BLOCK_BYTES, max_bytes - written + 1)):
+                written += len(block)
+                if written > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                f.write(block)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
     return str(file_path)
 
 
@@ -29,35 +66,185 @@ def compute_file_hash(file_path: str) -> str:
     return digest.hexdigest()
 
 
-def load_and_split(file_path: str):
-    """Load and chunk a file into text segments."""
-    ext = os.path.splitext(file_path)[1].lower()
+def document_header(filename: str) -> str:
+    return f"Document: {filename}\n"
+
+
+@dataclass
+class TextChunk:
+    """Minimal stand-in for a langchain Document produced by the streaming path.
+
+    ``start``/``end`` are character offsets of the chunk body (``page_content``
+    without the document header) in the document's normalized text.
+    """
+
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+    start: int | None = None
+    end: int | None = None
+
+
+class StreamingChunker:
+    """Cut a stream of page texts into overlapping chunks.
+
+    Only the unemitted tail of the text is buffered (at most one chunk plus the
+    page being fed), so memory does not grow with the document. Whitespace is
+    collapsed as text arrives and pages are joined with a single space; the
+    result is the document's normalized text, and every chunk is reported with
+    its ``(start, end)`` offsets into it. Cuts prefer sentence ends, then word
+    boundaries. The overlap carried into the next chunk starts on a word
+    boundary and may span page breaks.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._buffer = ""
+        self._base = 0
+        self._pages: list[tuple[int, int | None]] = []
+        self._fresh_from = 0
+
+    def feed(self, text: str, page: int | None):
+        cleaned = " ".join(text.split())
+        if not cleaned:
+            return
+        if self._buffer:
+            self._buffer += " "
+        self._pages.append((len(self._buffer), page))
+        self._buffer += cleaned
+        while len(self._buffer) > self.chunk_size:
+            yield self._cut()
+
+    def finish(self):
+        if len(self._buffer) > self._fresh_from:
+            yield self._span(len(self._buffer))
+        self._buffer = ""
+        self._pages = []
+        self._fresh_from = 0
+
+    def _page_at(self, offset: int) -> int | None:
+        page = self._pages[0][1] if self._pages else None
+        for start, number in self._pages:
+            if start > offset:
+                break
+            page = number
+        return page
+
+    def _span(self, cut: int) -> tuple[str, int | None, int, int]:
+        raw = self._buffer[:cut]
+        text = raw.strip()
+        start = self._base + len(raw) - len(raw.lstrip())
+        return text, self._page_at(0), start, start + len(text)
+
+    def _cut(self) -> tuple[str, int | None, int, int]:
+        floor = self.chunk_size // 2
+        window = self._buffer[: self.chunk_size]
+        cut = window.rfind(". ", floor)
+        if cut != -1:
+            cut += 1
+        else:
+            cut = window.rfind(" ", floor)
+            if cut == -1:
+                cut = self.chunk_size
+        chunk = self._span(cut)
 
+        space = self._buffer.find(" ", max(cut - self.chunk_overlap, 1), cut)
+        start = space + 1 if space != -1 else cut
+        self._pages = [
+            (max(offset - start, 0), number)
+            for index, (offset, number) in enumerate(self._pages)
+            if offset >= start or index + 1 == len(self._pages) or self._pages[index + 1][0] > start
+        ]
+        self._buffer = self._buffer[start:]
+        self._base += start
+        self._fresh_from = cut - start
+        return chunk
+
+
+def _release_page_contents(reader, page) -> None:
+    """Drop a page's decoded content streams from the reader's object cache.
+
+    pypdf keeps every resolved object for the lifetime of the reader, which
+    would otherwise make memory grow with the page count.
+    """
+    contents = page.get("/Contents")
+    references = contents if isinstance(contents, list) else [contents]
+    for reference in references:
+        if hasattr(reference, "idnum"):
+            reader.resolved_objects.pop((reference.generation, reference.idnum), None)
+
+
+def iter_pdf_pages(file_path: str):
+    """Yield ``(page_number, total_pages, text)`` one page at a time."""
+    # An open handle lets pypdf seek the file instead of reading it all into memory.
+    with open(file_path, "rb") as handle:
+        reader = load_object("pypdf:PdfReader")(handle)
+        total_pages = len(reader.pages)
+        for page_number in range(total_pages):
+            page = reader.pages[page_number]
+            text = page.extract_text() or ""
+            _release_page_contents(reader, page)
+            yield page_number, total_pages, text
+
+
+def _iter_page_texts(file_path: str, ext: str):
     if ext == ".pdf":
-        loader = PyPDFLoader(file_path)
-    elif ext == ".txt":
-        loader = TextLoader(file_path)
-    elif ext in [".doc", ".docx"]:
-        loader = Docx2txtLoader(file_path)
-    else:
-        raise ValueError(f"Unsupported file type: {ext}")
+        yield from iter_pdf_pages(file_path)
+        return
+    documents = get_loader_class(ext)(file_path).load()
+    for page_number, document in enumerate(documents):
+        yield page_number, len(documents), document.page_content
 
-    documents = loader.load()
-    filename = Path(file_path).name
-    header = f"Document: {filename}\n"
 
+def iter_chunks(file_path: str):
+    """Yield chunks for a file; PDFs are parsed and chunked page by page."""
+    ext = os.path.splitext(file_path)[1].lower()
+    filename = Path(file_path).name
+    header = document_header(filename)
     if ext == ".pdf":
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1200, chunk_overlap=200)
+        chunker = StreamingChunker(PDF_CHUNK_SIZE, PDF_CHUNK_OVERLAP)
     else:
-        splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
-
-    chunks = splitter.split_documents(documents)
-    for index, chunk in enumerate(chunks):
-        cleaned = re.sub(r"\s+", " ", chunk.page_content).strip()
-        chunk.page_content = f"{header}{cleaned}".strip()
-        metadata = dict(chunk.metadata or {})
-        metadata["source"] = filename
-        metadata["chunk_index"] = index
-        metadata["file_ext"] = ext
-        chunk.metadata = metadata
-    return chunks
+        chunker = StreamingChunker(TEXT_CHUNK_SIZE, TEXT_CHUNK_OVERLAP)
+    chunk_index = 0
+    total_pages = 0
+
+    def make_chunk(text: str, page: int | None, start: int, end: int) -> TextChunk:
+        metadata = {
+            "source": filename,
+            "chunk_index": chunk_index,
+            "file_ext": ext,
+        }
+        if ext == ".pdf":
+            metadata["page"] = page
+            metadata["total_pages"] = total_pages
+        return TextChunk(page_content=f"{header}{text}", metadata=metadata, start=start, end=end)
+
+    for page_number, total_pages, text in _iter_page_texts(file_path, ext):
+        for span in chunker.feed(text, page_number):
+            yield make_chunk(*span)
+            chunk_index += 1
+    for span in chunker.finish():
+        yield make_chunk(*span)
+
+
+def iter_chunk_batches(file_path: str, batch_size: int = INGEST_BATCH_SIZE):
+    batch = []
+    for chunk in iter_chunks(file_path):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_document(file_path: str) -> tuple[list[list[TextChunk]], list[dict]]:
+    """Parse a whole file into chunk batches and facts; picklable entry point for worker processes."""
+    from app.core.facts import extract_facts
+
+    return list(iter_chunk_batches(file_path)), extract_facts(file_path)
+
+
+def load_and_split(file_path: str):
+    """Load and chunk a file into text segments."""
+    return list(iter_chunks(file_path))
@@ -1,9 +1,17 @@
+import asyncio
+
 from fastapi import FastAPI
-from fastapi import Request
+from fastapi import Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from time import perf_counter
+from uuid import uuid4
 
-from app.config import LLM_MODEL, LLM_PROVIDER
+from app.config import LLM_MODEL, LLM_PROVIDER, ensure_data_dirs
+from app.core.async_store import async_store
+from app.core.document_store import get_document_store
+from app.core.memory import RequestMemoryTrace, record_request_memory, should_trace_memory
+from app.core.metrics import REQUEST_DURATION, REQUESTS_IN_FLIGHT, render_metrics, set_corpus_size
+from app.core.ollama_lifecycle import ollama_in_use, ollama_lifecycle
 from app.core.rag_logger import get_app_logger
 from app.routes import documents, query, upload
 
@@ -23,31 +31,110 @@ app.include_router(query.router, prefix="/api")
 app.include_router(documents.router, prefix="/api")
 
 
+# Documents per entity backfill transaction; uploads queue on the writer thread between batches
+ENTITY_BACKFILL_BATCH = 50
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def backfill_entities():
+    filled = 0
+    try:
+        while True:
+            batch = await async_store.backfill_entities(limit=ENTITY_BACKFILL_BATCH)
+            filled += batch
+            if batch < ENTITY_BACKFILL_BATCH:
+                break
+    except Exception:
+        logger.exception("Entity backfill stopped after %s documents", filled)
+        return
+    if filled:
+        logger.info("Extracted entities for %s previously indexed documents", filled)
+
+
 @app.on_event("startup")
-def log_runtime_configuration():
+async def log_runtime_configuration():
+    ensure_data_dirs()
     logger.info("LLM provider=%s model=%s", LLM_PROVIDER, LLM_MODEL)
+    # queries treat documents without entities as possible matches, so nothing waits for this
+    task = asyncio.create_task(backfill_entities())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    if ollama_in_use():
+        # loads the model in the background so startup is not held up by it
+        ollama_lifecycle.start()
+
+
+@app.on_event("shutdown")
+def stop_background_work():
+    for task in _background_tasks:
+        task.cancel()
+    upload.shutdown_parse_pool()
+    ollama_lifecycle.stop()
+    async_store.shutdown()
 
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     started = perf_counter()
+    memory_trace = (
+        RequestMemoryTrace.begin() if should_trace_memory(request.headers.get("x-memory-trace")) else None
+    )
+    REQUESTS_IN_FLIGHT.inc()
     try:
         response = await call_next(request)
     except Exception:
         logger.exception("Unhandled error %s %s", request.method, request.url.path)
         raise
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        memory_usage = memory_trace.finish() if memory_trace else None
 
     duration_ms = round((perf_counter() - started) * 1000, 2)
+    admitted = getattr(request.state, "admission", None)
+    route = request.scope.get("route")
+    if memory_usage:
+        memory = record_request_memory(
+            memory_usage,
+            trace_id=getattr(request.state, "trace_id", None) or uuid4().hex[:12],
+            route=getattr(route, "path", "unmatched"),
+            method=request.method,
+            status=response.status_code,
+            corpus_chunks=await async_store.count_chunks(),
+            duration_ms=duration_ms,
+        )
+        response.headers["X-Memory-Peak-Bytes"] = str(memory["peak_bytes"])
+        response.headers["X-Trace-Id"] = memory["trace_id"]
+    REQUEST_DURATION.labels(
+        request.method,
+        getattr(route, "path", "unmatched"),
+        str(response.status_code),
+    ).observe(duration_ms / 1000)
     logger.info(
-        "%s %s -> %s in %sms",
+        "%s %s -> %s in %sms%s",
         request.method,
         request.url.path,
         response.status_code,
         duration_ms,
+        f" (queued {admitted['queue_wait_ms']}ms behind {admitted['queue_depth']})" if admitted else "",
     )
     response.headers["X-Response-Time-Ms"] = str(duration_ms)
+    server_timing = response.headers.get("Server-Timing")
+    total_timing = f"total;dur={duration_ms}"
+    if admitted:
+        total_timing = f"admission;dur={admitted['queue_wait_ms']}, {total_timing}"
+    response.headers["Server-Timing"] = (
+        f"{server_timing}, {total_timing}" if server_timing else total_timing
+    )
     return response
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    store = get_document_store()
+    set_corpus_size(store.count_documents(), store.count_chunks())
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/")
 def root():
     return {
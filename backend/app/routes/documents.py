@@ -1,41 +1,130 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
 
 from app.config import LOG_PATH, TRACE_LOG_PATH
+from app.core.admission import admission, limiters
+from app.core.async_store import async_store
 from app.core.document_store import get_document_store
-from app.core.rag_logger import read_recent_jsonl
+from app.core.memory import memory_report
+from app.core.ollama_lifecycle import ollama_lifecycle
+from app.core.profiling import get_profile_path, list_profiles, summarize_profile
+from app.core.rag_logger import read_recent_jsonl, resolve_log_entry
 
 
 router = APIRouter()
+DEBUG_ADMISSION = [Depends(admission("debug"))]
+
+
+def _parse_fields(fields: str | None) -> list[str] | None:
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
 
 
 @router.get("/documents")
-def list_documents(limit: int = Query(default=100, ge=1, le=500)):
-    store = get_document_store()
-    documents = store.list_documents(limit=limit)
+async def list_documents(
+    limit: int = Query(default=100, ge=1, le=500),
+    cursor: str | None = Query(default=None, description="next_cursor from the previous page."),
+    fields: str | None = Query(default=None, description="Comma-separated document fields to return."),
+):
+    try:
+        documents, next_cursor = await async_store.page_documents(
+            limit=limit,
+            cursor=cursor,
+            fields=_parse_fields(fields),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     return {
         "documents": documents,
         "count": len(documents),
-        "total_chunks": store.count_chunks(),
+        "total_documents": await async_store.count_documents(),
+        "total_chunks": await async_store.count_chunks(),
+        "next_cursor": next_cursor,
     }
 
 
 @router.get("/documents/{document_id}/chunks")
-def get_document_chunks(document_id: str, limit: int = Query(default=200, ge=1, le=500)):
-    store = get_document_store()
-    document = store.get_document(document_id)
-    chunks = store.get_document_chunks(document_id, limit=limit)
+async def get_document_chunks(
+    document_id: str,
+    limit: int = Query(default=200, ge=1, le=500),
+    cursor: str | None = Query(default=None, description="next_cursor from the previous page."),
+    fields: str | None = Query(
+        default=None,
+        description="Comma-separated chunk fields to return, e.g. id,chunk_index,preview.",
+    ),
+):
+    document = await async_store.get_document(document_id)
+    try:
+        chunks, next_cursor = await async_store.page_document_chunks(
+            document_id,
+            limit=limit,
+            cursor=cursor,
+            fields=_parse_fields(fields),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     return {
         "document": document,
         "count": len(chunks),
         "chunks": chunks,
+        "next_cursor": next_cursor,
     }
 
 
-@router.get("/debug/query-logs")
-def recent_query_logs(limit: int = Query(default=20, ge=1, le=200)):
-    return {"entries": read_recent_jsonl(LOG_PATH, limit=limit)}
+def _recent_entries(path: str, limit: int, resolve: bool) -> list[dict]:
+    entries = read_recent_jsonl(path, limit=limit)
+    if not resolve:
+        return entries
+    store = get_document_store()
+    return [resolve_log_entry(entry, store) for entry in entries]
+
+
+@router.get("/debug/query-logs", dependencies=DEBUG_ADMISSION)
+async def recent_query_logs(
+    limit: int = Query(default=20, ge=1, le=200),
+    resolve: bool = Query(default=True),
+):
+    return {"entries": await async_store.read(_recent_entries, LOG_PATH, limit, resolve)}
+
+
+@router.get("/debug/traces", dependencies=DEBUG_ADMISSION)
+async def recent_trace_logs(
+    limit: int = Query(default=50, ge=1, le=500),
+    resolve: bool = Query(default=True),
+):
+    return {"entries": await async_store.read(_recent_entries, TRACE_LOG_PATH, limit, resolve)}
+
+
+@router.get("/debug/llm", dependencies=DEBUG_ADMISSION)
+def llm_status():
+    return {"ollama": ollama_lifecycle.status()}
+
+
+@router.get("/debug/admission", dependencies=DEBUG_ADMISSION)
+def admission_status():
+    return {group: limiter.status() for group, limiter in limiters.items()}
+
+
+@router.get("/debug/memory", dependencies=DEBUG_ADMISSION)
+def memory_usage(
+    limit: int = Query(default=50, ge=1, le=500),
+    route: str | None = None,
+    trace_id: str | None = None,
+):
+    return memory_report(limit=limit, route=route, trace_id=trace_id)
+
+
+@router.get("/debug/profiles", dependencies=DEBUG_ADMISSION)
+def recent_profiles(limit: int = Query(default=50, ge=1, le=500)):
+    return {"profiles": list_profiles(limit=limit)}
 
 
-@router.get("/debug/traces")
-def recent_trace_logs(limit: int = Query(default=50, ge=1, le=500)):
-    return {"entries": read_recent_jsonl(TRACE_LOG_PATH, limit=limit)}
+@router.get("/debug/profiles/{trace_id}", dependencies=DEBUG_ADMISSION)
+def get_profile(trace_id: str, format: str = Query(default="summary", pattern="^(summary|pstats|collapsed)$")):
+    path = get_profile_path(trace_id, "pstats" if format == "summary" else format)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No profile captured for trace_id '{trace_id}'")
+    if format == "summary":
+        return PlainTextResponse(summarize_profile(path))
+    return FileResponse(path, filename=path.name)
@@ -1,27 +1,40 @@
+import json
 import re
 import uuid
-from pathlib import Path
+from datetime import datetime, timezone
 from time import perf_counter
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
-from app.config import LLM_MODEL, LLM_PROVIDER
-from app.core.document_store import get_document_store
+from app.config import LLM_MODEL, LLM_PROVIDER, LOG_DETAIL
+from app.core.abstention import confidence_features, early_abstain_thresholds
+from app.core.admission import admission
+from app.core.async_store import async_store
+from app.core.context_builder import build_context
+from app.core.document_store import DocumentStore, get_document_store
+from app.core.entities import entity_key
+from app.core.facts import answer_from_facts
 from app.core.llm_provider import generate_text
+from app.core.metrics import CONTEXT_TOKENS_SAVED, EARLY_ABSTENTIONS, QUERIES_COALESCED, StageTimer
+from app.core.profiling import profile_request, should_profile
 from app.core.rag_logger import (
+    content_hash,
     get_app_logger,
     log_query_event,
     log_trace_event,
     preview_text,
 )
+from app.core.retrieval_index import get_retrieval_index
+from app.core.singleflight import SingleFlight
 
 
 router = APIRouter()
 logger = get_app_logger("personal_rag.query")
+_query_flights = SingleFlight()
 
 TOP_K = 8
-MAX_CONTEXT_CHUNKS = 4
 WORK_INTENT_TERMS = {
     "role",
     "work",
@@ -72,8 +85,31 @@ STOPWORDS = {
 }
 
 
+class QueryFilters(BaseModel):
+    """Restrict retrieval to part of the corpus; applied in SQL before scoring."""
+
+    filename: str | None = None
+    file_ext: list[str] | None = None
+    document_ids: list[str] | None = None
+    updated_after: datetime | None = None
+    updated_before: datetime | None = None
+    # 0-based, as stored in chunk metadata
+    pages: list[int] | None = None
+
+    def to_store_filters(self) -> dict:
+        filters = {key: value for key, value in self.model_dump().items() if value not in (None, [], "")}
+        for key in ("updated_after", "updated_before"):
+            if key in filters:
+                value = filters[key]
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=timezone.utc)
+                filters[key] = value.astimezone(timezone.utc).isoformat()
+        return filters
+
+
 class QueryRequest(BaseModel):
     query: str
+    filters: QueryFilters | None = None
 
 
 def _extract_entity(query: str):
@@ -85,23 +121,52 @@ def _extract_entity(query: str):
     return None, False
 
 
-def _infer_subject_from_sources(chunks):
-    filenames = {Path(chunk["filename"]).stem for chunk in chunks if chunk.get("filename")}
-    if len(filenames) != 1:
-        return None
-    name = next(iter(filenames))
-    cleaned = re.sub(r"[_-]+", " ", name).strip()
-    cleaned = re.sub(r"\bresume\b", "", cleaned, flags=re.IGNORECASE).strip()
-    return cleaned or None
-
-
-def _infer_subject_from_context(context: str):
-    lines = [line.strip() for line in context.splitlines() if line.strip()]
-    name_re = re.compile(r"^[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+$")
-    for line in lines[:10]:
-        if name_re.match(line) and not any(char.isdigit() for char in line):
-            return line
-    return None
+def _subject_hint(store: DocumentStore, chunks: list[dict]) -> str | None:
+    """Who the retrieved documents are about, from the subjects stored at ingest.
+
+    A single document is described by its filename subject, falling back to
+    its heading; with several, the top-ranked document's heading is used.
+    """
+    document_ids = list(dict.fromkeys(chunk["document_id"] for chunk in chunks))
+    subjects = store.document_subjects(document_ids)
+    top = subjects.get(document_ids[0], {})
+    if len(document_ids) == 1:
+        return top.get("subject") or top.get("heading")
+    return top.get("heading")
+
+
+def _entity_scope(
+    store: DocumentStore,
+    entity: str,
+    trace_id: str,
+    timer: StageTimer,
+    filters: dict | None,
+) -> tuple[bool, dict | None]:
+    """Check the entities table before retrieval.
+
+    Returns ``(found, filters)``: ``found`` is False when no document in scope
+    names ``entity``; otherwise ``filters`` is narrowed to the documents that do.
+    """
+    with timer.stage("entities"):
+        document_ids = store.documents_mentioning(entity)
+    if document_ids is None:
+        return True, filters
+    requested = (filters or {}).get("document_ids")
+    if requested:
+        requested = set(requested)
+        document_ids = [document_id for document_id in document_ids if document_id in requested]
+    with timer.stage("log"):
+        log_trace_event(
+            "query.entity_scope",
+            {
+                "entity": entity,
+                "document_count": len(document_ids),
+            },
+            trace_id=trace_id,
+        )
+    if not document_ids:
+        return False, filters
+    return True, {**(filters or {}), "document_ids": document_ids}
 
 
 def _extract_phrases(query: str):
@@ -138,73 +203,58 @@ def _meaningful_tokens(query: str) -> set[str]:
     }
 
 
-def _score_chunk(chunk: dict, query: str, tokens: set[str], phrase_queries: list[str]) -> int:
-    text = chunk["content"].lower()
-    filename = (chunk.get("filename") or "").lower()
-    normalized_query = query.lower()
-    score = 0
-
-    if normalized_query and normalized_query in text:
-        score += 30
-
-    for phrase in phrase_queries:
-        phrase_lower = phrase.lower()
-        if phrase_lower in text:
-            score += 20
-        if phrase_lower in filename:
-            score += 5
-
-    for token in tokens:
-        if len(token) <= 1:
-            continue
-        score += min(text.count(token), 6) * 3
-        if token in filename:
-            score += 2
+def _retrieve_chunks(
+    query: str,
+    top_k: int = TOP_K,
+    timer: StageTimer | None = None,
+    filters: dict | None = None,
+    store: DocumentStore | None = None,
+):
+    """Score the corpus through the shared retrieval index.
 
-    return score
-
-
-def _retrieve_chunks(query: str, top_k: int = TOP_K):
+    Returns the ``top_k`` chunks (full dicts with a ``score``), the number of
+    chunks that scored above zero, and the query tokens and phrase queries.
+    """
+    timer = timer or StageTimer("query")
     tokens = _meaningful_tokens(query)
     phrase_queries = _expand_phrase_queries(_extract_phrases(query), tokens)
-    store = get_document_store()
-    chunks = store.list_chunks()
-    scored = []
-    for chunk in chunks:
-        score = _score_chunk(chunk, query, tokens, phrase_queries)
-        if score > 0:
-            scored.append(
-                {
-                    **chunk,
-                    "score": score,
-                }
-            )
+    store = store or get_document_store()
+    with timer.stage("corpus_load"):
+        index = get_retrieval_index(store)
+        within = index.positions(store.list_chunk_keys(filters)) if filters else None
 
-    scored.sort(
-        key=lambda chunk: (
-            chunk["score"],
-            chunk["document_updated_at"],
-            -chunk["chunk_index"],
-        ),
-        reverse=True,
-    )
-    return scored[:top_k], scored, tokens, phrase_queries
+    with timer.stage("score"):
+        scores = index.score(query, tokens, phrase_queries, within)
+
+    with timer.stage("sort"):
+        top, scored_count = index.top(scores, top_k)
+
+    with timer.stage("corpus_load"):
+        chunks = store.get_chunks([chunk.chunk_id for chunk in top])
+    scores = {chunk.chunk_id: chunk.score for chunk in top}
+    top_chunks = [{**chunk, "score": scores[chunk["id"]]} for chunk in chunks]
+    return top_chunks, scored_count, tokens, phrase_queries
 
 
 def _serialize_retrieved_chunks(chunks: list[dict]) -> list[dict]:
-    return [
-        {
+    """Chunks as logged: references plus a content hash, with text only at LOG_DETAIL=full."""
+    serialized = []
+    for chunk in chunks:
+        entry = {
             "id": chunk["id"],
             "document_id": chunk["document_id"],
             "filename": chunk["filename"],
             "chunk_index": chunk["chunk_index"],
             "score": chunk["score"],
-            "preview": preview_text(chunk["content"], 220),
-            "content": chunk["content"],
-            "metadata": chunk["metadata"],
+            "content_hash": content_hash(chunk["content"]),
         }
-        for chunk in chunks
-    ]
+        if LOG_DETAIL in ("preview", "full"):
+            entry["preview"] = preview_text(chunk["content"], 220)
+        if LOG_DETAIL == "full":
+            entry["content"] = chunk["content"]
+            entry["metadata"] = chunk["metadata"]
+        serialized.append(entry)
+    return serialized
 
 
 def _normalize_answer(output: str) -> str:
@@ -219,111 +269,232 @@ def _normalize_answer(output: str) -> str:
     return cleaned
 
 
-@router.post("/query")
-async def query_docs(request: QueryRequest):
-    trace_id = uuid.uuid4().hex[:12]
-    start = perf_counter()
+def _sources_from_chunks(chunks: list[dict]) -> list[dict]:
+    return [
+        {
+            "document_id": chunk["document_id"],
+            "filename": chunk["filename"],
+            "chunk_index": chunk["chunk_index"],
+            "score": chunk["score"],
+            "preview": preview_text(chunk["content"], 220),
+        }
+        for chunk in chunks
+    ]
 
-    try:
-        query = request.query.strip()
-        if not query:
-            return {"answer": "I don't know.", "sources": [], "trace_id": trace_id}
 
+def _single_document_facts(store: DocumentStore, facts: list[dict], entity: str | None) -> list[dict] | None:
+    """The facts of the one document the query can be about, or None when that is ambiguous."""
+    by_document: dict[str, list[dict]] = {}
+    for fact in facts:
+        by_document.setdefault(fact["document_id"], []).append(fact)
+    if entity and len(by_document) > 1:
+        # documents that merely mention the entity do not count, only the one about it
+        words = set(entity_key(entity).split())
+        subjects = store.document_subjects(list(by_document))
+        by_document = {
+            document_id: document_facts
+            for document_id, document_facts in by_document.items()
+            if any(words <= set(entity_key(name).split()) for name in subjects.get(document_id, {}).values())
+        }
+    if len(by_document) != 1:
+        return None
+    return next(iter(by_document.values()))
+
+
+def _answer_from_facts(
+    store: DocumentStore,
+    query: str,
+    entity: str | None,
+    trace_id: str,
+    timer: StageTimer,
+    filters: dict | None,
+) -> dict | None:
+    """Answer from the ingest-time facts table, skipping retrieval and the LLM.
+
+    Facts are only used when they all come from one document: the one in
+    ``filters``, or the one whose subject is ``entity``. Otherwise facts of
+    different people would be merged, so the query goes to retrieval instead.
+    """
+    with timer.stage("facts"):
+        document_ids = None
+        if filters:
+            document_ids = list({document_id for document_id, _ in store.list_chunk_keys(filters)})
+        facts = _single_document_facts(store, store.list_facts(document_ids), entity)
+        hit = answer_from_facts(query, facts, entity) if facts else None
+        if not hit:
+            return None
+        answer, intent, used = hit
+        chunk_ids = list(
+            dict.fromkeys(
+                f"{fact['document_id']}:{fact['chunk_index']}" for fact in used if fact["chunk_index"] is not None
+            )
+        )
+        chunks = [{**chunk, "score": None} for chunk in store.get_chunks(chunk_ids)]
+
+    with timer.stage("log"):
+        retrieved = _serialize_retrieved_chunks(chunks)
         log_trace_event(
-            "query.received",
+            "query.fact_hit",
             {
                 "query": query,
-                "provider": LLM_PROVIDER,
-                "model": LLM_MODEL,
+                "intent": intent,
+                "answer": answer,
+                "fact_count": len(used),
+                "top_chunks": retrieved,
             },
             trace_id=trace_id,
         )
+    return {
+        "trace_id": trace_id,
+        "answer": answer,
+        "sources": _sources_from_chunks(chunks),
+        "log": {
+            "filters": filters or {},
+            "entity": entity,
+            "retrieved": retrieved,
+            "abstained": False,
+            "rule_hit": f"facts:{intent}",
+        },
+    }
 
-        entity, enforce_entity = _extract_entity(query)
-        top_chunks, all_scored_chunks, tokens, phrase_queries = _retrieve_chunks(query, top_k=TOP_K)
 
+def _run_pipeline(
+    query: str,
+    trace_id: str,
+    timer: StageTimer,
+    filters: dict | None = None,
+    priority: str = "interactive",
+    store: DocumentStore | None = None,
+) -> dict:
+    """Retrieve and generate an answer for ``query``.
+
+    ``priority`` orders the LLM call in the rate-limit queue; offline runners
+    pass "batch" so they never hold up interactive queries. Every read goes to
+    ``store`` (by default the active generation, resolved once), so a query
+    never mixes two generations across a rebuild swap.
+
+    The outcome is shared by every request coalesced onto this run, so it only
+    carries what the caller needs to respond and log; per-request bookkeeping
+    (query log entry, timings, trace_id) stays in ``query_docs``.
+    """
+    store = store or get_document_store()
+    entity, enforce_entity = _extract_entity(query)
+    scoped_filters = filters
+    if enforce_entity:
+        entity_found, scoped_filters = _entity_scope(store, entity, trace_id, timer, filters)
+        if not entity_found:
+            with timer.stage("log"):
+                log_trace_event(
+                    "query.entity_miss",
+                    {
+                        "query": query,
+                        "entity": entity,
+                        "stage": "index",
+                    },
+                    trace_id=trace_id,
+                )
+            return {
+                "trace_id": trace_id,
+                "answer": "I don't know.",
+                "sources": [],
+                "log": {
+                    "filters": filters or {},
+                    "entity": entity,
+                    "entity_enforced": True,
+                    "entity_in_context": False,
+                    "entity_indexed": False,
+                    "retrieved": [],
+                    "abstained": True,
+                },
+            }
+    fact_outcome = _answer_from_facts(
+        store, query, entity if enforce_entity else None, trace_id, timer, scoped_filters
+    )
+    if fact_outcome:
+        return fact_outcome
+    top_chunks, scored_count, tokens, phrase_queries = _retrieve_chunks(
+        query,
+        top_k=TOP_K,
+        timer=timer,
+        filters=scoped_filters,
+        store=store,
+    )
+
+    with timer.stage("log"):
+        retrieved = _serialize_retrieved_chunks(top_chunks)
         log_trace_event(
             "query.retrieved",
             {
                 "query": query,
-                "candidate_count": len(all_scored_chunks),
+                "filters": filters or {},
+                "candidate_count": scored_count,
                 "selected_count": len(top_chunks),
-                "top_chunks": _serialize_retrieved_chunks(top_chunks),
+                "top_chunks": retrieved,
             },
             trace_id=trace_id,
         )
 
-        if not top_chunks:
-            answer = "I don't know."
-            log_query_event(
-                {
-                    "trace_id": trace_id,
-                    "query": query,
-                    "phrase_queries": phrase_queries,
-                    "top_k": TOP_K,
-                    "entity": entity,
-                    "entity_in_context": False,
-                    "context": "",
-                    "retrieved": [],
-                    "answer": answer,
-                    "abstained": True,
-                    "provider": LLM_PROVIDER,
-                    "model": LLM_MODEL,
-                    "duration_ms": round((perf_counter() - start) * 1000, 2),
-                }
-            )
-            return {"answer": answer, "sources": [], "trace_id": trace_id}
-
-        context_chunks = top_chunks[:MAX_CONTEXT_CHUNKS]
-        context = "\n\n".join(chunk["content"] for chunk in context_chunks)
-        entity_in_context = True
-        if entity and enforce_entity:
-            entity_in_context = entity.lower() in context.lower()
-            if not entity_in_context:
-                answer = "I don't know."
+    outcome = {
+        "trace_id": trace_id,
+        "answer": "I don't know.",
+        "sources": [],
+        "log": {
+            "filters": filters or {},
+            "phrase_queries": phrase_queries,
+            "top_k": TOP_K,
+            "entity": entity,
+            "entity_enforced": enforce_entity,
+            "entity_in_context": False,
+            "context": "",
+            "retrieved": [],
+            "abstained": True,
+        },
+    }
+    if not top_chunks:
+        return outcome
+
+    with timer.stage("prompt_build"):
+        context, context_chunks, context_stats = build_context(top_chunks)
+    CONTEXT_TOKENS_SAVED.inc(context_stats["tokens_saved"])
+    with timer.stage("log"):
+        log_trace_event(
+            "query.context_packed",
+            {
+                "query": query,
+                **context_stats,
+            },
+            trace_id=trace_id,
+        )
+    outcome["log"]["retrieved"] = retrieved
+    if LOG_DETAIL == "full":
+        outcome["log"]["context"] = context
+    else:
+        # rebuilt from the retrieved chunks on read, see resolve_log_entry
+        del outcome["log"]["context"]
+        outcome["log"]["context_hash"] = content_hash(context)
+
+    entity_in_context = True
+    if entity and enforce_entity:
+        entity_in_context = entity.lower() in context.lower()
+        if not entity_in_context:
+            with timer.stage("log"):
                 log_trace_event(
                     "query.entity_miss",
                     {
                         "query": query,
                         "entity": entity,
+                        "stage": "context",
                     },
                     trace_id=trace_id,
                 )
-                log_query_event(
-                    {
-                        "trace_id": trace_id,
-                        "query": query,
-                        "phrase_queries": phrase_queries,
-                        "top_k": TOP_K,
-                        "entity": entity,
-                        "entity_enforced": enforce_entity,
-                        "entity_in_context": False,
-                        "context": context,
-                        "retrieved": _serialize_retrieved_chunks(top_chunks),
-                        "answer": answer,
-                        "abstained": True,
-                        "provider": LLM_PROVIDER,
-                        "model": LLM_MODEL,
-                        "duration_ms": round((perf_counter() - start) * 1000, 2),
-                    }
-                )
-                return {"answer": answer, "sources": [], "trace_id": trace_id}
-
-        role_hit = None
-        if tokens & WORK_INTENT_TERMS and entity:
-            role_hit = _extract_role_for_org(context, entity)
-            if role_hit:
-                output = f"{role_hit}, {entity}"
-                sources = [
-                    {
-                        "document_id": chunk["document_id"],
-                        "filename": chunk["filename"],
-                        "chunk_index": chunk["chunk_index"],
-                        "score": chunk["score"],
-                        "preview": chunk["preview"],
-                    }
-                    for chunk in top_chunks
-                ]
+            return outcome
+    outcome["log"]["entity_in_context"] = entity_in_context
+
+    if tokens & WORK_INTENT_TERMS and entity:
+        role_hit = _extract_role_for_org(context, entity)
+        if role_hit:
+            output = f"{role_hit}, {entity}"
+            with timer.stage("log"):
                 log_trace_event(
                     "query.rule_hit",
                     {
@@ -333,28 +504,31 @@ async def query_docs(request: QueryRequest):
                     },
                     trace_id=trace_id,
                 )
-                log_query_event(
-                    {
-                        "trace_id": trace_id,
-                        "query": query,
-                        "phrase_queries": phrase_queries,
-                        "top_k": TOP_K,
-                        "entity": entity,
-                        "entity_enforced": enforce_entity,
-                        "entity_in_context": entity_in_context,
-                        "context": context,
-                        "retrieved": _serialize_retrieved_chunks(top_chunks),
-                        "answer": output,
-                        "abstained": False,
-                        "provider": LLM_PROVIDER,
-                        "model": LLM_MODEL,
-                        "rule_hit": "role_for_org",
-                        "duration_ms": round((perf_counter() - start) * 1000, 2),
-                    }
-                )
-                return {"answer": output, "sources": sources, "trace_id": trace_id}
+            outcome.update({"answer": output, "sources": _sources_from_chunks(top_chunks)})
+            outcome["log"].update({"abstained": False, "rule_hit": "role_for_org"})
+            return outcome
+
+    with timer.stage("abstain"):
+        confidence = confidence_features(tokens, top_chunks)
+        thresholds = early_abstain_thresholds(confidence)
+    outcome["log"]["confidence"] = confidence
+    if thresholds:
+        EARLY_ABSTENTIONS.inc()
+        with timer.stage("log"):
+            log_trace_event(
+                "query.early_abstain",
+                {
+                    "query": query,
+                    "confidence": confidence,
+                    "thresholds": thresholds,
+                },
+                trace_id=trace_id,
+            )
+        outcome["log"]["early_abstain"] = True
+        return outcome
 
-        subject_hint = _infer_subject_from_sources(top_chunks) or _infer_subject_from_context(context)
+    with timer.stage("prompt_build"):
+        subject_hint = _subject_hint(store, top_chunks)
         subject_line = ""
         if subject_hint:
             subject_line = (
@@ -375,20 +549,22 @@ Question:
 Answer:
 """
 
-        log_trace_event(
-            "query.prompt_built",
-            {
-                "query": query,
-                "context_chars": len(context),
-                "context_chunk_count": len(context_chunks),
-                "prompt_preview": preview_text(prompt, 600),
-            },
-            trace_id=trace_id,
-        )
+    with timer.stage("log"):
+        prompt_event = {
+            "query": query,
+            "context_chars": len(context),
+            "context_chunk_count": len(context_chunks),
+            "context_tokens": context_stats["context_tokens"],
+        }
+        if LOG_DETAIL != "refs":
+            prompt_event["prompt_preview"] = preview_text(prompt, 600)
+        log_trace_event("query.prompt_built", prompt_event, trace_id=trace_id)
 
-        output, llm_duration_ms = generate_text(prompt)
-        output = _normalize_answer(output)
+    with timer.stage("llm"):
+        output, llm_duration_ms = generate_text(prompt, trace_id=trace_id, priority=priority)
+    output = _normalize_answer(output)
 
+    with timer.stage("log"):
         log_trace_event(
             "query.llm_response",
             {
@@ -401,45 +577,115 @@ Answer:
             trace_id=trace_id,
         )
 
-        sources = [
-            {
-                "document_id": chunk["document_id"],
-                "filename": chunk["filename"],
-                "chunk_index": chunk["chunk_index"],
-                "score": chunk["score"],
-                "preview": chunk["preview"],
-            }
-            for chunk in top_chunks
-        ]
+    outcome.update({"answer": output, "sources": _sources_from_chunks(top_chunks)})
+    outcome["log"].update(
+        {
+            "abstained": output == "I don't know.",
+            "llm_duration_ms": llm_duration_ms,
+            "context_tokens": context_stats["context_tokens"],
+            "context_tokens_saved": context_stats["tokens_saved"],
+        }
+    )
+    return outcome
+
+
+def _profiled_pipeline(
+    query: str,
+    trace_id: str,
+    timer: StageTimer,
+    profile: bool,
+    filters: dict | None,
+    store: DocumentStore,
+) -> dict:
+    with profile_request(trace_id, "query", profile):
+        return _run_pipeline(query, trace_id, timer, filters, store=store)
+
+
+@router.post("/query", dependencies=[Depends(admission("query"))])
+async def query_docs(
+    request: QueryRequest,
+    response: Response,
+    http_request: Request,
+    x_profile: str | None = Header(default=None),
+):
+    trace_id = uuid.uuid4().hex[:12]
+    http_request.state.trace_id = trace_id
+    start = perf_counter()
+    timer = StageTimer("query")
 
-        total_duration_ms = round((perf_counter() - start) * 1000, 2)
-        log_query_event(
+    try:
+        # Whitespace is irrelevant to scoring (chunk text is whitespace-normalized),
+        # so collapsing it lets more duplicate requests share one pipeline run.
+        query = " ".join(request.query.split())
+        if not query:
+            return {"answer": "I don't know.", "sources": [], "trace_id": trace_id}
+
+        filters = request.filters.to_store_filters() if request.filters else {}
+        admitted = getattr(http_request.state, "admission", None)
+        log_trace_event(
+            "query.received",
             {
-                "trace_id": trace_id,
                 "query": query,
-                "phrase_queries": phrase_queries,
-                "top_k": TOP_K,
-                "entity": entity,
-                "entity_enforced": enforce_entity,
-                "entity_in_context": entity_in_context,
-                "context": context,
-                "retrieved": _serialize_retrieved_chunks(top_chunks),
-                "answer": output,
-                "abstained": output == "I don't know.",
+                "filters": filters,
                 "provider": LLM_PROVIDER,
                 "model": LLM_MODEL,
-                "llm_duration_ms": llm_duration_ms,
-                "duration_ms": total_duration_ms,
-            }
+                "admission": admitted,
+            },
+            trace_id=trace_id,
         )
+
+        # one generation for the whole request; versions never repeat across generations
+        store = await async_store.read(get_document_store)
+        flight_key = (query, json.dumps(filters, sort_keys=True), await async_store.read(store.corpus_version))
+        profile = should_profile(x_profile)
+        waited = perf_counter()
+        outcome, is_leader = await _query_flights.do(
+            flight_key,
+            lambda: run_in_threadpool(_profiled_pipeline, query, trace_id, timer, profile, filters, store),
+        )
+
+        coalesced_from = None
+        if not is_leader:
+            coalesced_from = outcome["trace_id"]
+            timer.add("coalesce_wait", (perf_counter() - waited) * 1000)
+            QUERIES_COALESCED.inc()
+            log_trace_event(
+                "query.coalesced",
+                {
+                    "query": query,
+                    "leader_trace_id": coalesced_from,
+                    "wait_ms": timer.durations_ms["coalesce_wait"],
+                },
+                trace_id=trace_id,
+            )
+
+        total_duration_ms = round((perf_counter() - start) * 1000, 2)
+        with timer.stage("log"):
+            log_query_event(
+                {
+                    "trace_id": trace_id,
+                    "query": query,
+                    **outcome["log"],
+                    "answer": outcome["answer"],
+                    "provider": LLM_PROVIDER,
+                    "model": LLM_MODEL,
+                    "coalesced_from": coalesced_from,
+                    "admission": admitted,
+                    "stage_timings_ms": timer.as_dict(),
+                    "duration_ms": total_duration_ms,
+                }
+            )
+        timer.observe()
+        response.headers["Server-Timing"] = timer.server_timing()
         logger.info(
-            "Answered trace_id=%s duration_ms=%s chunks=%s query=%s",
+            "Answered trace_id=%s duration_ms=%s chunks=%s coalesced_from=%s query=%s",
             trace_id,
             total_duration_ms,
-            len(top_chunks),
+            len(outcome["sources"]),
+            coalesced_from or "-",
             query,
         )
-        return {"answer": output, "sources": sources, "trace_id": trace_id}
+        return {"answer": outcome["answer"], "sources": outcome["sources"], "trace_id": trace_id}
 
     except HTTPException:
         raise
@@ -1,31 +1,137 @@
+import multiprocessing
+import tarfile
+import threading
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
-from fastapi import APIRouter, File, UploadFile
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Request, UploadFile
 
-from app.core.document_store import get_document_store
+from app.config import (
+    UPLOAD_COMMIT_BATCH,
+    UPLOAD_MAX_BATCH_BYTES,
+    UPLOAD_MAX_FILES,
+    UPLOAD_MAX_MEMBER_BYTES,
+    UPLOAD_PARSE_WORKERS,
+)
+from app.core.admission import admission
+from app.core.async_store import async_store
+from app.core.document_store import DocumentStore, get_document_store, rebuild_in_progress
+from app.core.facts import iter_facts
+from app.core.loaders import supported_extensions
+from app.core.metrics import set_corpus_size
+from app.core.profiling import profile_request, should_profile
 from app.core.rag_logger import get_app_logger, log_trace_event, preview_text
-from app.core.utils import compute_file_hash, load_and_split, save_upload
+from app.core.retrieval_index import ensure_retrieval_index
+from app.core.utils import (
+    UploadTooLarge,
+    compute_file_hash,
+    iter_chunk_batches,
+    parse_document,
+    save_stream,
+    save_upload,
+)
 
 
 router = APIRouter()
 logger = get_app_logger("personal_rag.upload")
+TRACE_PREVIEW_CHUNKS = 10
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+REBUILD_RETRY_AFTER_SECONDS = 30
 
+_parse_pool: ProcessPoolExecutor | None = None
+_parse_pool_lock = threading.Lock()
 
-@router.post("/upload")
-async def upload_doc(file: UploadFile = File(...)):
+
+@router.post("/upload", dependencies=[Depends(admission("upload"))])
+async def upload_doc(
+    request: Request,
+    file: UploadFile = File(...),
+    x_profile: str | None = Header(default=None),
+):
+    trace_id = uuid.uuid4().hex[:12]
+    request.state.trace_id = trace_id
+    # ingest runs on the store's writer thread, one upload at a time
+    return await async_store.write(_profiled, _index_upload, file, trace_id, should_profile(x_profile))
+
+
+@router.post("/upload/batch", dependencies=[Depends(admission("upload"))])
+async def upload_batch(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    x_profile: str | None = Header(default=None),
+):
+    if len(files) > UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {UPLOAD_MAX_FILES} files per batch")
+    trace_id = uuid.uuid4().hex[:12]
+    request.state.trace_id = trace_id
+    return await async_store.write(_profiled, _index_batch, files, trace_id, should_profile(x_profile))
+
+
+def _refuse_during_rebuild() -> None:
+    """Uploads would land in the store a running rebuild is about to replace.
+
+    Checked on the writer thread right before ingest, so uploads queued behind
+    another one when the rebuild started are refused too.
+    """
+    rebuild = rebuild_in_progress()
+    if rebuild:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Store rebuild in progress (started {rebuild.get('started_at')}), retry later",
+            headers={"Retry-After": str(REBUILD_RETRY_AFTER_SECONDS)},
+        )
+
+
+def _profiled(index, uploads, trace_id: str, profile: bool):
+    _refuse_during_rebuild()
+    # resolved once, so the writes and the retrieval index refresh hit the same generation
+    store = get_document_store()
+    with profile_request(trace_id, "upload", profile):
+        return index(store, uploads, trace_id)
+
+
+def _logged_batches(file_path: str, previews: list[str]):
+    """Stream chunk batches while logging each chunk and keeping the first few previews."""
+    filename = Path(file_path).name
+    index = 0
+    for batch in iter_chunk_batches(file_path):
+        for chunk in batch:
+            index += 1
+            preview = preview_text(chunk.page_content, 220)
+            if len(previews) < TRACE_PREVIEW_CHUNKS:
+                previews.append(preview)
+            logger.info(
+                "Chunk %s filename=%s chars=%s preview=%s",
+                index,
+                filename,
+                len(chunk.page_content),
+                preview,
+            )
+        yield batch
+
+
+def _index_upload(store: DocumentStore, file: UploadFile, trace_id: str):
     file_path = save_upload(file)
-    chunks = load_and_split(file_path)
     content_hash = compute_file_hash(file_path)
     file_size = Path(file_path).stat().st_size
+    previews: list[str] = []
 
-    store = get_document_store()
-    result = store.upsert_document(
+    result = store.upsert_document_stream(
         file_path=file_path,
         content_hash=content_hash,
         file_size=file_size,
-        chunks=chunks,
+        chunk_batches=_logged_batches(file_path, previews),
+        facts=iter_facts(file_path),
     )
 
+    if result["status"] != "unchanged":
+        ensure_retrieval_index(store)
+    set_corpus_size(store.count_documents(), store.count_chunks())
+
     document = result["document"]
     log_trace_event(
         "upload.indexed",
@@ -36,9 +142,11 @@ async def upload_doc(file: UploadFile = File(...)):
             "chunk_count": document["chunk_count"],
             "file_size": document["file_size"],
             "content_hash": document["content_hash"],
-            "chunk_previews": [preview_text(chunk.page_content, 220) for chunk in chunks[:10]],
+            "chunk_previews": previews,
+            "request_trace_id": trace_id,
         },
         trace_id=document["id"],
+        always=True,
     )
     logger.info(
         "Indexed filename=%s document_id=%s chunks=%s status=%s",
@@ -47,18 +155,253 @@ async def upload_doc(file: UploadFile = File(...)):
         document["chunk_count"],
         result["status"],
     )
-    for index, chunk in enumerate(chunks, start=1):
-        logger.info(
-            "Chunk %s/%s filename=%s chars=%s preview=%s",
-            index,
-            len(chunks),
-            document["filename"],
-            len(chunk.page_content),
-            preview_text(chunk.page_content, 220),
-        )
 
     return {
         "status": result["status"],
         "message": f"{result['status'].capitalize()} {document['chunk_count']} chunks for {document['filename']}",
         "document": document,
+        "trace_id": trace_id,
+    }
+
+
+def _get_parse_pool() -> ProcessPoolExecutor | None:
+    """Lazily start the parser processes shared by batch uploads."""
+    global _parse_pool
+    if UPLOAD_PARSE_WORKERS <= 0:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn rather than fork: the server process is already running threads
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=UPLOAD_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _archive_members(upload: UploadFile):
+    """Yield (name, declared size, stream) for each regular file in a zip or tar upload.
+
+    Members are decompressed as streams straight from the spooled upload, so the
+    archive is never extracted in memory.
+    """
+    if upload.filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(upload.file) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as stream:
+                        yield info.filename, info.file_size, stream
+        return
+    with tarfile.open(fileobj=upload.file, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, archive.extractfile(member)
+
+
+def _stage_uploads(files: list[UploadFile]) -> tuple[list[dict], list[dict]]:
+    """Save every uploaded file and archive member to the upload folder.
+
+    Returns the per-file results in upload order plus the staged entries that
+    still need indexing. Archive paths are flattened to their file names.
+    Archive members larger than ``UPLOAD_MAX_MEMBER_BYTES`` decompressed, and
+    files past ``UPLOAD_MAX_BATCH_BYTES`` in total, are reported as failed.
+    When the batch has too many files nothing stays staged and ValueError is raised.
+    """
+    supported = supported_extensions()
+    results: list[dict] = []
+    staged: list[dict] = []
+    seen: set[str] = set()
+    written = 0
+
+    def stage(name: str, stream, archive: str | None = None, size: int | None = None):
+        nonlocal written
+        filename = Path(name).name
+        if not filename or filename.startswith("."):
+            return
+        result = {"filename": filename}
+        if archive:
+            result["archive"] = archive
+        results.append(result)
+        if len(results) > UPLOAD_MAX_FILES:
+            raise ValueError(f"At most {UPLOAD_MAX_FILES} files per batch")
+        if Path(filename).suffix.lower() not in supported:
+            result.update(status="skipped", error="unsupported file type")
+        elif filename in seen:
+            result.update(status="skipped", error="duplicate filename in batch")
+        else:
+            limit = UPLOAD_MAX_BATCH_BYTES - written
+            if archive:
+                limit = min(limit, UPLOAD_MAX_MEMBER_BYTES)
+            try:
+                if size is not None and size > limit:
+                    raise UploadTooLarge(limit)
+                path = save_stream(filename, stream, max_bytes=limit)
+            except UploadTooLarge as exc:
+                result.update(status="failed", error=f"{exc} decompressed" if archive else str(exc))
+                return
+            seen.add(filename)
+            written += Path(path).stat().st_size
+            staged.append({"result": result, "path": path})
+
+    try:
+        for upload in files:
+            filename = upload.filename or "upload.bin"
+            if not _is_archive(filename):
+                stage(filename, upload.file)
+                continue
+            try:
+                for name, size, stream in _archive_members(upload):
+                    stage(name, stream, archive=filename, size=size)
+            except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as exc:
+                results.append(
+                    {"filename": Path(filename).name, "status": "failed", "error": f"unreadable archive: {exc}"}
+                )
+    except ValueError:
+        for entry in staged:
+            Path(entry["path"]).unlink(missing_ok=True)
+        raise
+    return results, staged
+
+
+def _parse_result(entry: dict, future):
+    try:
+        return entry, future.result()
+    except BrokenProcessPool as exc:
+        # a crashed parser breaks the whole pool; start a fresh one next time
+        shutdown_parse_pool()
+        return entry, exc
+    except Exception as exc:
+        return entry, exc
+
+
+def _parsed(entries: list[dict]):
+    """Yield (entry, (chunk batches, facts) or the parse error) in order.
+
+    Files are parsed on the process pool with a bounded number in flight, so
+    only a window of parsed documents is held in memory at once.
+    """
+    pool = _get_parse_pool()
+    if pool is None:
+        for entry in entries:
+            try:
+                yield entry, parse_document(entry["path"])
+            except Exception as exc:
+                yield entry, exc
+        return
+
+    window = deque()
+    for entry in entries:
+        try:
+            future = pool.submit(parse_document, entry["path"])
+        except BrokenProcessPool as exc:
+            future = Future()
+            future.set_exception(exc)
+        window.append((entry, future))
+        if len(window) >= max(UPLOAD_PARSE_WORKERS * 2, UPLOAD_COMMIT_BATCH):
+            yield _parse_result(*window.popleft())
+    while window:
+        yield _parse_result(*window.popleft())
+
+
+def _commit(store, group: list[tuple[dict, tuple]]) -> None:
+    """Write a group of parsed files in one transaction and record their statuses."""
+    if not group:
+        return
+    try:
+        outcomes = store.upsert_documents(
+            [
+                {
+                    "file_path": entry["path"],
+                    "content_hash": entry["content_hash"],
+                    "file_size": entry["file_size"],
+                    "chunk_batches": chunk_batches,
+                    "facts": facts,
+                }
+                for entry, (chunk_batches, facts) in group
+            ]
+        )
+    except Exception as exc:
+        logger.exception("Batch commit failed for %s files", len(group))
+        for entry, _ in group:
+            entry["result"].update(status="failed", error=str(exc))
+        return
+    for (entry, _), outcome in zip(group, outcomes):
+        document = outcome["document"]
+        entry["result"].update(
+            status=outcome["status"],
+            document_id=document["id"],
+            chunk_count=document["chunk_count"],
+        )
+
+
+def _index_batch(store: DocumentStore, files: list[UploadFile], trace_id: str):
+    try:
+        results, staged = _stage_uploads(files)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    for entry in staged:
+        entry["content_hash"] = compute_file_hash(entry["path"])
+        entry["file_size"] = Path(entry["path"]).stat().st_size
+
+    unchanged = store.unchanged_filenames(
+        {entry["result"]["filename"]: entry["content_hash"] for entry in staged}
+    )
+    # unchanged files only refresh their metadata (and facts from an older
+    # extractor), so they are never chunked
+    _commit(
+        store,
+        [
+            (entry, ((), iter_facts(entry["path"])))
+            for entry in staged
+            if entry["result"]["filename"] in unchanged
+        ],
+    )
+
+    group = []
+    for entry, parsed in _parsed([entry for entry in staged if entry["result"]["filename"] not in unchanged]):
+        if isinstance(parsed, Exception):
+            logger.warning("Failed to parse filename=%s: %s", entry["result"]["filename"], parsed)
+            entry["result"].update(status="failed", error=str(parsed) or type(parsed).__name__)
+            continue
+        group.append((entry, parsed))
+        if len(group) >= UPLOAD_COMMIT_BATCH:
+            _commit(store, group)
+            group = []
+    _commit(store, group)
+
+    counts: dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    if counts.get("indexed") or counts.get("reindexed"):
+        ensure_retrieval_index(store)
+    set_corpus_size(store.count_documents(), store.count_chunks())
+
+    log_trace_event(
+        "upload.batch_indexed",
+        {"counts": counts, "files": results, "request_trace_id": trace_id},
+        trace_id=trace_id,
+        always=True,
+    )
+    logger.info("Batch upload trace_id=%s files=%s counts=%s", trace_id, len(results), counts)
+
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    return {
+        "status": "partial" if counts.get("failed") else "ok",
+        "message": f"Processed {len(results)} files: {summary or 'nothing to index'}",
+        "counts": counts,
+        "files": results,
+        "trace_id": trace_id,
     }
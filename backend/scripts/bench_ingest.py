@@ -0,0 +1,197 @@
+import argparse
+import json
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+DEFAULT_PAGES = 5000
+LINES_PER_PAGE = 45
+WORDS = (
+    "retrieval latency budget chunk overlap embedding sqlite index worker corpus "
+    "resume project experience python fastapi streaming memory allocator page"
+).split()
+
+
+def _page_stream(page_number: int) -> bytes:
+    lines = ["BT", "/F1 10 Tf", "50 780 Td", "12 TL"]
+    for line_number in range(LINES_PER_PAGE):
+        words = [WORDS[(page_number * 7 + line_number * 3 + offset) % len(WORDS)] for offset in range(12)]
+        text = f"Page {page_number + 1} line {line_number + 1}: " + " ".join(words) + "."
+        lines.append(f"({text}) Tj T*")
+    lines.append("ET")
+    return "\n".join(lines).encode("latin-1")
+
+
+def write_synthetic_pdf(path: Path, pages: int) -> None:
+    """Write an uncompressed text PDF without needing a PDF authoring library."""
+    # objects: 1 catalog, 2 pages tree, 3 font, then (page, content) pairs
+    offsets: list[int] = []
+    page_ids = [4 + index * 2 for index in range(pages)]
+    with open(path, "wb") as handle:
+        def write_object(body: bytes) -> None:
+            offsets.append(handle.tell())
+            handle.write(f"{len(offsets)} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        handle.write(b"%PDF-1.4\n")
+        write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+        write_object(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        for page_number, page_id in enumerate(page_ids):
+            write_object(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+            )
+            stream = _page_stream(page_number)
+            write_object(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+        xref_offset = handle.tell()
+        handle.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            handle.write(f"{offset:010d} 00000 n \n".encode())
+        handle.write(
+            f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_split(file_path: str):
+    """The pre-streaming ingest path: load the whole file, then split it with langchain."""
+    from app.core.loaders import get_loader_class, load_object
+    from app.core.utils import (
+        PDF_CHUNK_OVERLAP,
+        PDF_CHUNK_SIZE,
+        TEXT_CHUNK_OVERLAP,
+        TEXT_CHUNK_SIZE,
+        document_header,
+    )
+
+    ext = Path(file_path).suffix.lower()
+    documents = get_loader_class(ext)(file_path).load()
+    filename = Path(file_path).name
+    header = document_header(filename)
+
+    splitter_class = load_object("langchain_text_splitters:RecursiveCharacterTextSplitter")
+    if ext == ".pdf":
+        splitter = splitter_class(chunk_size=PDF_CHUNK_SIZE, chunk_overlap=PDF_CHUNK_OVERLAP)
+    else:
+        splitter = splitter_class(chunk_size=TEXT_CHUNK_SIZE, chunk_overlap=TEXT_CHUNK_OVERLAP)
+
+    chunks = splitter.split_documents(documents)
+    for index, chunk in enumerate(chunks):
+        cleaned = re.sub(r"\s+", " ", chunk.page_content).strip()
+        chunk.page_content = f"{header}{cleaned}".strip()
+        chunk.metadata = {**(chunk.metadata or {}), "source": filename, "chunk_index": index, "file_ext": ext}
+    return chunks
+
+
+def run_worker(mode: str, file_path: str, db_path: str) -> dict:
+    from app.core.document_store import DocumentStore
+    from app.core.utils import compute_file_hash, iter_chunk_batches
+
+    store = DocumentStore(db_path)
+    baseline_mb = _peak_rss_mb()
+    started = perf_counter()
+    content_hash = compute_file_hash(file_path)
+    file_size = Path(file_path).stat().st_size
+    if mode == "legacy":
+        result = store.upsert_document(
+            file_path=file_path,
+            content_hash=content_hash,
+            file_size=file_size,
+            chunks=legacy_split(file_path),
+        )
+    else:
+        result = store.upsert_document_stream(
+            file_path=file_path,
+            content_hash=content_hash,
+            file_size=file_size,
+            chunk_batches=iter_chunk_batches(file_path),
+        )
+    return {
+        "mode": mode,
+        "file": Path(file_path).name,
+        "chunks": result["document"]["chunk_count"],
+        "seconds": round(perf_counter() - started, 2),
+        "baseline_rss_mb": round(baseline_mb, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "db_mb": round(Path(db_path).stat().st_size / (1024 * 1024), 2),
+    }
+
+
+def measure(mode: str, file_path: Path) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        completed = subprocess.run(
+            [
+                sys.executable,
+                str(Path(__file__).resolve()),
+                "--worker",
+                mode,
+                str(file_path),
+                str(Path(workdir) / "bench.sqlite3"),
+            ],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+    if completed.returncode != 0:
+        raise SystemExit(f"{mode} ingest of {file_path} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--worker":
+        print(json.dumps(run_worker(sys.argv[2], sys.argv[3], sys.argv[4])))
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Compare peak RSS and database size of whole-document and streaming PDF ingestion."
+    )
+    parser.add_argument("paths", nargs="*", help="PDF files to ingest.")
+    parser.add_argument(
+        "--synthetic-pages",
+        type=int,
+        default=DEFAULT_PAGES,
+        help="Also generate and ingest a synthetic PDF with this many pages (0 to skip).",
+    )
+    parser.add_argument(
+        "--modes",
+        default="legacy,stream",
+        help="Comma-separated ingestion modes to run (legacy, stream).",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        files = [Path(path).resolve() for path in args.paths]
+        if args.synthetic_pages:
+            synthetic = Path(workdir) / f"synthetic_{args.synthetic_pages}_pages.pdf"
+            write_synthetic_pdf(synthetic, args.synthetic_pages)
+            files.append(synthetic)
+
+        for file_path in files:
+            size_mb = file_path.stat().st_size / (1024 * 1024)
+            print(f"{file_path.name} ({size_mb:.1f} MB)")
+            for mode in args.modes.split(","):
+                result = measure(mode.strip(), file_path)
+                print(
+                    f"  {result['mode']:<7} chunks={result['chunks']:<6} seconds={result['seconds']:<7} "
+                    f"baseline_rss_mb={result['baseline_rss_mb']:<7} peak_rss_mb={result['peak_rss_mb']:<7} "
+                    f"db_mb={result['db_mb']}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_TARGET_MS = 1000.0
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, raw_name = line[len("import time:"):].split("|")
+            entries.append(
+                {
+                    "module": raw_name.strip(),
+                    # importtime indents nested imports by two spaces per level
+                    "depth": (len(raw_name) - len(raw_name.lstrip()) - 1) // 2,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                }
+            )
+        except ValueError:
+            continue
+    return entries
+
+
+def run_command(command: list[str]) -> tuple[float, str]:
+    started = perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    elapsed_ms = (perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise SystemExit(f"Command failed: {' '.join(command)}\n{completed.stderr}")
+    return elapsed_ms, completed.stderr
+
+
+def measure(module: str, runs: int, top: int) -> dict:
+    wall_ms = []
+    import_ms = []
+    last_entries: list[dict] = []
+    for _ in range(runs):
+        elapsed_ms, stderr = run_command([sys.executable, "-X", "importtime", "-c", f"import {module}"])
+        entries = parse_importtime(stderr)
+        wall_ms.append(elapsed_ms)
+        import_ms.append(next((entry["cumulative_ms"] for entry in entries if entry["module"] == module), 0.0))
+        last_entries = entries
+
+    cli_ms = [
+        run_command([sys.executable, "scripts/index_documents.py", "--help"])[0]
+        for _ in range(runs)
+    ]
+    slowest = sorted(last_entries, key=lambda entry: entry["cumulative_ms"], reverse=True)
+    direct_imports = [entry for entry in slowest if entry["depth"] == 1][:top]
+    return {
+        "module": module,
+        "runs": runs,
+        "wall_ms_median": round(statistics.median(wall_ms), 1),
+        "import_ms_median": round(statistics.median(import_ms), 1),
+        "index_cli_help_ms_median": round(statistics.median(cli_ms), 1),
+        "heaviest_direct_imports": direct_imports,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure cold-start import time with python -X importtime."
+    )
+    parser.add_argument("--module", default="app.main", help="Module to import.")
+    parser.add_argument("--runs", type=int, default=5, help="Cold-start runs to take the median of.")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest direct imports to list.")
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=DEFAULT_TARGET_MS,
+        help="Fail when the median wall time of a cold import exceeds this.",
+    )
+    parser.add_argument("--save", help="Write the measurement to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON written earlier with --save.")
+    args = parser.parse_args()
+
+    result = measure(args.module, args.runs, args.top)
+    print(f"{result['module']}: wall_ms_median={result['wall_ms_median']} import_ms_median={result['import_ms_median']}")
+    print(f"index_documents.py --help: wall_ms_median={result['index_cli_help_ms_median']}")
+    print("Heaviest direct imports:")
+    for entry in result["heaviest_direct_imports"]:
+        print(f"  {entry['cumulative_ms']:>9.1f} ms  {entry['module']}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        for key in ("wall_ms_median", "import_ms_median", "index_cli_help_ms_median"):
+            before = baseline.get(key)
+            if before:
+                change = (result[key] - before) / before * 100
+                print(f"{key}: {before} -> {result[key]} ({change:+.1f}%)")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+    if result["wall_ms_median"] > args.target_ms:
+        print(f"FAIL: cold start {result['wall_ms_median']}ms exceeds target {args.target_ms}ms")
+        raise SystemExit(1)
+    print(f"OK: cold start within target {args.target_ms}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+QUERIES = (
+    "What is Anish's GPA?",
+    "Where is Anish working right now?",
+    "What projects use Python and FastAPI?",
+    "What was the most recent role?",
+)
+
+
+def _memory_mb() -> dict:
+    """Resident and proportional set size; PSS splits shared pages between processes."""
+    values = {}
+    for path, keys in (("/proc/self/status", ("VmRSS",)), ("/proc/self/smaps_rollup", ("Pss",))):
+        try:
+            with open(path, encoding="utf-8") as handle:
+                for line in handle:
+                    name, _, rest = line.partition(":")
+                    if name in keys:
+                        values[name] = int(rest.split()[0]) / 1024
+        except FileNotFoundError:
+            pass
+    return {"rss_mb": round(values.get("VmRSS", 0), 1), "pss_mb": round(values.get("Pss", 0), 1)}
+
+
+def run_worker(mode: str, rounds: int) -> dict:
+    from app.core.document_store import get_document_store
+    from app.routes.query import _retrieve_chunks
+
+    store = get_document_store()
+    baseline = _memory_mb()
+    started = perf_counter()
+    if mode == "dicts":
+        # what every worker held while scoring before the shared index
+        corpus = store.list_chunks()
+        for _ in range(rounds):
+            for query in QUERIES:
+                lowered = [chunk["content"].lower() for chunk in corpus]
+                sum(query.lower() in text for text in lowered)
+    else:
+        for _ in range(rounds):
+            for query in QUERIES:
+                _retrieve_chunks(query)
+    elapsed_ms = (perf_counter() - started) * 1000 / (rounds * len(QUERIES))
+    return {"mode": mode, "baseline": baseline, "loaded": _memory_mb(), "ms_per_query": round(elapsed_ms, 2)}
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        print(json.dumps(run_worker(sys.argv[2], int(sys.argv[3]))), flush=True)
+        # stay alive until every worker has reported, so shared pages count once
+        sys.stdin.read()
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Compare per-worker memory of dict-based scoring and the shared retrieval index."
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent worker processes per mode.")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the sample queries.")
+    parser.add_argument("--modes", default="dicts,mmap", help="Comma-separated modes (dicts, mmap).")
+    args = parser.parse_args()
+
+    from app.core.document_store import get_document_store
+    from app.core.retrieval_index import ensure_retrieval_index
+
+    store = get_document_store()
+    print(f"corpus: {store.count_documents()} documents, {store.count_chunks()} chunks")
+    index_path = ensure_retrieval_index(store)
+    print(f"index: {index_path.name} ({index_path.stat().st_size / (1024 * 1024):.1f} MB)")
+
+    for mode in args.modes.split(","):
+        mode = mode.strip()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, str(Path(__file__).resolve()), "--worker", mode, str(args.rounds)],
+                cwd=ROOT,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            for _ in range(args.workers)
+        ]
+        results = [json.loads(worker.stdout.readline()) for worker in workers]
+        for worker in workers:
+            worker.communicate("")
+        print(mode)
+        for number, result in enumerate(results, start=1):
+            print(
+                f"  worker {number}: rss_mb {result['baseline']['rss_mb']} -> {result['loaded']['rss_mb']}  "
+                f"pss_mb {result['baseline']['pss_mb']} -> {result['loaded']['pss_mb']}  "
+                f"ms_per_query={result['ms_per_query']}"
+            )
+        total_pss = sum(result["loaded"]["pss_mb"] for result in results)
+        print(f"  total pss_mb: {total_pss:.1f}")
+
+
+if __name__ == "__main__":
+    main()
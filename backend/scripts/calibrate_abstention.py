@@ -0,0 +1,159 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.config import ABSTAIN_CALIBRATION_PATH, LOG_PATH
+from app.core.abstention import CONFIDENCE_FEATURES, confidence_features, fit_thresholds, refuses
+from app.core.rag_logger import utcnow_iso
+from eval_rag import index_logs, load_logs, read_rows
+
+
+def logged_features(entry: dict, store) -> dict | None:
+    """Confidence features of a logged query, rebuilt from its chunks for entries older than the field."""
+    from app.core.rag_logger import resolve_log_entry
+    from app.routes.query import _meaningful_tokens
+
+    if entry.get("confidence"):
+        return entry["confidence"]
+    if entry.get("rule_hit") or not entry.get("retrieved"):
+        # answered by a rule or refused before retrieval; never reaches the LLM
+        return None
+    retrieved = resolve_log_entry(entry, store)["retrieved"]
+    return confidence_features(_meaningful_tokens(entry["query"]), retrieved)
+
+
+def build_samples(eval_rows: list[dict], logs_path: Path) -> list[dict]:
+    """One sample per query that retrieval handed (or would hand) to the LLM.
+
+    The label is ``expected_abstain`` for eval queries; logged queries outside
+    the eval set are labelled by the LLM's own answer, so refusing them early
+    only skips calls that ended in "I don't know." anyway.
+    """
+    from app.core.document_store import get_document_store
+    from app.routes.query import _meaningful_tokens, _retrieve_chunks
+
+    store = get_document_store()
+    expected = {row["query"]: row["expected_abstain"] for row in eval_rows}
+    samples = []
+    latest = index_logs(load_logs(logs_path))
+    for query, entry in latest.items():
+        features = logged_features(entry, store)
+        if features is None:
+            continue
+        called_llm = "llm_duration_ms" in entry
+        if query in expected:
+            label, source = expected[query], "eval"
+        elif called_llm:
+            label, source = bool(entry.get("abstained")), "log"
+        else:
+            continue
+        samples.append(
+            {
+                "query": query,
+                "features": features,
+                "abstain": label,
+                "source": source,
+                "llm_abstained": bool(entry.get("abstained")) if called_llm else None,
+                "llm_duration_ms": entry.get("llm_duration_ms") or 0,
+            }
+        )
+    for query, label in expected.items():
+        if query in latest:
+            continue
+        # eval queries that were never asked are retrieved here; no LLM call is made
+        chunks = _retrieve_chunks(query)[0]
+        samples.append(
+            {
+                "query": query,
+                "features": confidence_features(_meaningful_tokens(query), chunks),
+                "abstain": label,
+                "source": "eval",
+                "llm_abstained": None,
+                "llm_duration_ms": 0,
+            }
+        )
+    return samples
+
+
+def report(samples: list[dict], thresholds: dict) -> dict:
+    refused = [sample for sample in samples if refuses(sample["features"], thresholds)]
+    llm_calls = [sample for sample in samples if sample["llm_abstained"] is not None]
+    saved = [sample for sample in llm_calls if refuses(sample["features"], thresholds)]
+
+    def quality(abstained) -> float | None:
+        """Share of LLM-answered queries whose abstain/answer decision matches the label."""
+        if not llm_calls:
+            return None
+        return round(sum(1 for sample in llm_calls if abstained(sample) == sample["abstain"]) / len(llm_calls), 3)
+
+    return {
+        "samples": len(samples),
+        "eval_samples": sum(1 for sample in samples if sample["source"] == "eval"),
+        "should_abstain": sum(1 for sample in samples if sample["abstain"]),
+        "refused": len(refused),
+        "false_abstentions": sum(1 for sample in refused if not sample["abstain"]),
+        "missed_abstentions": sum(1 for sample in samples if sample["abstain"]) - sum(
+            1 for sample in refused if sample["abstain"]
+        ),
+        "llm_calls_logged": len(llm_calls),
+        "llm_calls_saved": len(saved),
+        "llm_ms_saved": round(sum(sample["llm_duration_ms"] for sample in saved), 1),
+        "abstention_quality_before": quality(lambda sample: sample["llm_abstained"]),
+        "abstention_quality_after": quality(
+            lambda sample: sample["llm_abstained"] or refuses(sample["features"], thresholds)
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit the retrieval-confidence thresholds below which queries are refused without an LLM call."
+    )
+    parser.add_argument("--eval", default=str(ROOT / "evals" / "sample_eval.csv"), help="Eval CSV with expected_abstain.")
+    parser.add_argument("--logs", default=LOG_PATH, help="Query log (rag_queries.jsonl) to learn from.")
+    parser.add_argument(
+        "--max-false-abstain",
+        type=float,
+        default=0.0,
+        help="Share of answerable queries that may be refused (default 0).",
+    )
+    parser.add_argument("--output", default=ABSTAIN_CALIBRATION_PATH, help="Where the thresholds are written.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the report.")
+    args = parser.parse_args()
+
+    samples = build_samples(read_rows(args.eval), Path(args.logs))
+    if not samples:
+        print("No labelled queries to calibrate on.")
+        return
+    thresholds = fit_thresholds(samples, args.max_false_abstain)
+    summary = report(samples, thresholds)
+
+    print("Thresholds: " + " ".join(f"{feature}<{thresholds[feature]}" for feature in CONFIDENCE_FEATURES))
+    for key, value in summary.items():
+        print(f"{key}={value}")
+    if args.dry_run:
+        return
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.output).write_text(
+        json.dumps(
+            {
+                "thresholds": thresholds,
+                "calibrated_at": utcnow_iso(),
+                "max_false_abstain_rate": args.max_false_abstain,
+                "report": summary,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.core.compression import CODECS
+from app.core.document_store import DocumentStore, active_store_path
+
+
+def format_size(size: int) -> str:
+    return f"{size / (1024 * 1024):.2f} MB" if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rewrite the document store with compressed chunk text and report the size change."
+    )
+    parser.add_argument("--codec", choices=CODECS, default="zlib", help="Codec for stored text.")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Path to the SQLite store (default: the generation currently in service).",
+    )
+    args = parser.parse_args()
+
+    db_path = Path(args.db or active_store_path())
+    if not db_path.exists():
+        raise SystemExit(f"No store at {db_path}")
+
+    store = DocumentStore(str(db_path))
+    store.vacuum()
+    before = db_path.stat().st_size
+    stats = store.recompress(args.codec)
+    store.vacuum()
+    after = db_path.stat().st_size
+
+    print(
+        f"codec={stats['codec']} dictionary_id={stats['dictionary_id']} "
+        f"dictionary={stats['dictionary_bytes']} bytes from {stats['training_samples']} samples"
+    )
+    print(
+        f"rewrote {stats['segments_rewritten']} text segments and {stats['chunks_rewritten']} chunks "
+        f"({stats['metadata_rewritten']} with templated metadata)"
+    )
+    change = (after - before) / before * 100 if before else 0.0
+    print(f"size: {format_size(before)} -> {format_size(after)} ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
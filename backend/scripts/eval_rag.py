@@ -2,8 +2,18 @@ import argparse
 import csv
 import json
 import re
+import statistics
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from difflib import SequenceMatcher
 from pathlib import Path
+from time import perf_counter
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
 
 
 def normalize_tokens(text: str):
@@ -32,11 +42,14 @@ def load_logs(path: Path):
     return entries
 
 
-def find_last_log(entries, query):
-    for entry in reversed(entries):
-        if entry.get("query") == query:
-            return entry
-    return None
+def index_logs(entries):
+    """Map each query to its most recent log entry in one pass over the log."""
+    latest = {}
+    for entry in entries:
+        query = entry.get("query")
+        if query is not None:
+            latest[query] = entry
+    return latest
 
 
 def parse_list(value):
@@ -45,90 +58,211 @@ def parse_list(value):
     return [item.strip() for item in value.split("|") if item.strip()]
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--eval", required=True, help="Path to eval CSV file.")
-    parser.add_argument("--logs", required=True, help="Path to rag_queries.jsonl.")
-    args = parser.parse_args()
+def read_rows(path: str) -> list[dict]:
+    rows = []
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile):
+            rows.append(
+                {
+                    "query": (row.get("query") or "").strip(),
+                    "expected_answer": (row.get("expected_answer") or "").strip(),
+                    "expected_keywords": parse_list(row.get("expected_keywords", "")),
+                    "expected_sources": parse_list(row.get("expected_sources", "")),
+                    "expected_abstain": (row.get("expected_abstain") or "").strip().lower() == "true",
+                }
+            )
+    return rows
+
+
+def source_matches(source: str, expected_sources) -> bool:
+    return any(source.endswith(exp) or source == exp for exp in expected_sources)
+
+
+def grade(row: dict, answer: str, retrieved: list[dict]) -> dict:
+    expected_answer = row["expected_answer"]
+    expected_keywords = row["expected_keywords"]
+    expected_sources = row["expected_sources"]
+    expected_abstain = row["expected_abstain"]
+
+    context = "\n".join(chunk.get("content", "") for chunk in retrieved)
+    context_tokens = normalize_tokens(context)
+    answer_tokens = normalize_tokens(answer)
 
-    logs = load_logs(Path(args.logs))
+    answer_similarity = similarity(answer, expected_answer)
+    answer_correct = answer_similarity >= 0.75 if expected_answer else False
 
+    relevant_chunks = 0
+    for chunk in retrieved:
+        content = chunk.get("content", "").lower()
+        source = (chunk.get("metadata") or {}).get("source", "")
+        if any(keyword.lower() in content for keyword in expected_keywords):
+            relevant_chunks += 1
+        elif source_matches(source, expected_sources):
+            relevant_chunks += 1
+
+    retrieved_count = len(retrieved)
+    context_precision = (
+        relevant_chunks / retrieved_count if retrieved_count else 0.0
+    )
+
+    expected_relevant_total = len(expected_sources) or len(expected_keywords)
+    context_recall = (
+        relevant_chunks / expected_relevant_total
+        if expected_relevant_total
+        else None
+    )
+
+    token_overlap = (
+        len(answer_tokens & context_tokens) / len(answer_tokens)
+        if answer_tokens
+        else 0.0
+    )
+    faithfulness = token_overlap >= 0.3 or answer == "I don't know."
+
+    context_support = any(
+        keyword.lower() in context.lower() for keyword in expected_keywords
+    ) or (expected_answer and expected_answer.lower() in context.lower())
+
+    abstained = answer == "I don't know."
+    abstention_quality = (expected_abstain and abstained) or (
+        not expected_abstain and not abstained
+    )
+
+    return {
+        "query": row["query"],
+        "answer": answer,
+        "answer_similarity": round(answer_similarity, 3),
+        "answer_correct": answer_correct,
+        "faithfulness": faithfulness,
+        "context_precision": round(context_precision, 3),
+        "context_recall": round(context_recall, 3)
+        if context_recall is not None
+        else None,
+        "context_support": context_support,
+        "abstention_quality": abstention_quality,
+    }
+
+
+def grade_from_logs(rows: list[dict], logs_path: Path) -> list[dict]:
+    from app.core.document_store import get_document_store
+    from app.core.rag_logger import resolve_log_entry
+
+    store = get_document_store()
+    latest = index_logs(load_logs(logs_path))
     results = []
-    with open(args.eval, newline="", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            query = row.get("query", "").strip()
-            expected_answer = row.get("expected_answer", "").strip()
-            expected_keywords = parse_list(row.get("expected_keywords", ""))
-            expected_sources = parse_list(row.get("expected_sources", ""))
-            expected_abstain = row.get("expected_abstain", "").strip().lower() == "true"
-
-            log_entry = find_last_log(logs, query)
-            if not log_entry:
-                results.append({"query": query, "error": "no log entry"})
-                continue
+    for row in rows:
+        log_entry = latest.get(row["query"])
+        if not log_entry:
+            results.append({"query": row["query"], "error": "no log entry"})
+            continue
+        # entries logged as chunk references get their text back from the store
+        log_entry = resolve_log_entry(log_entry, store)
+        results.append(grade(row, log_entry.get("answer", ""), log_entry.get("retrieved", [])))
+    return results
 
-            answer = log_entry.get("answer", "")
-            retrieved = log_entry.get("retrieved", [])
-            context = "\n".join(chunk.get("content", "") for chunk in retrieved)
-            context_tokens = normalize_tokens(context)
-            answer_tokens = normalize_tokens(answer)
-
-            answer_similarity = similarity(answer, expected_answer)
-            answer_correct = answer_similarity >= 0.75 if expected_answer else False
-
-            relevant_chunks = 0
-            for chunk in retrieved:
-                content = chunk.get("content", "").lower()
-                source = (chunk.get("metadata") or {}).get("source", "")
-                if any(keyword.lower() in content for keyword in expected_keywords):
-                    relevant_chunks += 1
-                elif any(source.endswith(exp) or source == exp for exp in expected_sources):
-                    relevant_chunks += 1
-
-            retrieved_count = len(retrieved)
-            context_precision = (
-                relevant_chunks / retrieved_count if retrieved_count else 0.0
-            )
 
-            expected_relevant_total = len(expected_sources) or len(expected_keywords)
-            context_recall = (
-                relevant_chunks / expected_relevant_total
-                if expected_relevant_total
-                else None
-            )
+def run_pipeline(rows: list[dict], workers: int) -> list[dict]:
+    """Answer every row in-process through the query pipeline, ``workers`` at a time."""
+    from app.core.document_store import get_document_store
+    from app.core.metrics import StageTimer
+    from app.core.rag_logger import resolve_log_entry
+    from app.routes.query import _run_pipeline
 
-            token_overlap = (
-                len(answer_tokens & context_tokens) / len(answer_tokens)
-                if answer_tokens
-                else 0.0
+    store = get_document_store()
+
+    def answer(row):
+        try:
+            outcome = _run_pipeline(
+                row["query"], uuid.uuid4().hex[:12], StageTimer("eval"), priority="batch", store=store
             )
-            faithfulness = token_overlap >= 0.3 or answer == "I don't know."
+        except Exception as exc:
+            return {"query": row["query"], "error": f"pipeline failed: {exc}"}
+        return grade(row, outcome["answer"], resolve_log_entry(outcome["log"], store)["retrieved"])
 
-            context_support = any(
-                keyword.lower() in context.lower() for keyword in expected_keywords
-            ) or (expected_answer and expected_answer.lower() in context.lower())
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(answer, rows))
 
-            abstained = answer == "I don't know."
-            abstention_quality = (expected_abstain and abstained) or (
-                not expected_abstain and not abstained
-            )
 
-            results.append(
-                {
-                    "query": query,
-                    "answer": answer,
-                    "answer_similarity": round(answer_similarity, 3),
-                    "answer_correct": answer_correct,
-                    "faithfulness": faithfulness,
-                    "context_precision": round(context_precision, 3),
-                    "context_recall": round(context_recall, 3)
-                    if context_recall is not None
-                    else None,
-                    "context_support": context_support,
-                    "abstention_quality": abstention_quality,
-                }
-            )
+def evaluate_retrieval(row: dict, top_k: int) -> dict:
+    from app.routes.query import _retrieve_chunks
+
+    started = perf_counter()
+    top_chunks = _retrieve_chunks(row["query"], top_k=top_k)[0]
+    latency_ms = (perf_counter() - started) * 1000
+
+    result = {"query": row["query"], "latency_ms": round(latency_ms, 2), "recall_at_k": None, "mrr": None}
+    expected_sources = row["expected_sources"]
+    if not expected_sources:
+        return result
+    sources = [chunk.get("filename") or "" for chunk in top_chunks]
+    found = [exp for exp in expected_sources if any(source_matches(source, [exp]) for source in sources)]
+    first_hit = next(
+        (rank for rank, source in enumerate(sources, start=1) if source_matches(source, expected_sources)),
+        None,
+    )
+    result["recall_at_k"] = round(len(found) / len(expected_sources), 3)
+    result["mrr"] = round(1 / first_hit, 3) if first_hit else 0.0
+    return result
+
+
+def run_retrieval_only(rows: list[dict], workers: int, top_k: int) -> None:
+    """Score retrieval against ``expected_sources`` without any LLM calls."""
+    from app.routes.query import _retrieve_chunks
+
+    # one untimed query maps (or builds) the index and warms caches
+    started = perf_counter()
+    _retrieve_chunks(rows[0]["query"] if rows else "", top_k=top_k)
+    print(f"warmup_ms={(perf_counter() - started) * 1000:.1f}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda row: evaluate_retrieval(row, top_k), rows))
+    if not results:
+        print("No eval results.")
+        return
+
+    for result in results:
+        print(
+            f"{result['query']}: recall@{top_k}={result['recall_at_k']} "
+            f"mrr={result['mrr']} latency_ms={result['latency_ms']}"
+        )
+
+    graded = [result for result in results if result["recall_at_k"] is not None]
+    latencies = sorted(result["latency_ms"] for result in results)
+    print("\nAggregate:")
+    if graded:
+        print(f"recall@{top_k}_avg={statistics.fmean(r['recall_at_k'] for r in graded):.3f}")
+        print(f"mrr_avg={statistics.fmean(r['mrr'] for r in graded):.3f}")
+    print(f"graded_queries={len(graded)}/{len(results)}")
+    print(f"latency_ms_p50={statistics.median(latencies):.2f}")
+    print(f"latency_ms_p95={latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval", required=True, help="Path to eval CSV file.")
+    parser.add_argument(
+        "--logs",
+        help="Grade the answers already in this rag_queries.jsonl instead of running the pipeline.",
+    )
+    parser.add_argument(
+        "--retrieval-only",
+        action="store_true",
+        help="Only run retrieval and report recall@k/MRR against expected_sources (no LLM calls).",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Queries evaluated concurrently.")
+    parser.add_argument("--top-k", type=int, default=None, help="Retrieval depth (defaults to the query route's).")
+    args = parser.parse_args()
+
+    rows = read_rows(args.eval)
+    if args.retrieval_only:
+        from app.routes.query import TOP_K
+
+        run_retrieval_only(rows, max(args.workers, 1), args.top_k or TOP_K)
+        return
+    if args.logs:
+        results = grade_from_logs(rows, Path(args.logs))
+    else:
+        results = run_pipeline(rows, max(args.workers, 1))
 
     if not results:
         print("No eval results.")
@@ -7,11 +7,21 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from app.core.document_store import get_document_store
-from app.core.utils import compute_file_hash, load_and_split
+from app.config import ensure_data_dirs
+from app.core.document_store import (
+    abandon_generation,
+    activate_generation,
+    create_generation,
+    get_document_store,
+    rebuild_in_progress,
+)
+from app.core.facts import iter_facts
+from app.core.loaders import supported_extensions
+from app.core.retrieval_index import ensure_retrieval_index
+from app.core.utils import compute_file_hash, iter_chunk_batches
 
 
-SUPPORTED_SUFFIXES = {".pdf", ".txt", ".doc", ".docx"}
+SUPPORTED_SUFFIXES = supported_extensions()
 
 
 def iter_files(paths: list[str], recursive: bool):
@@ -28,6 +38,25 @@ def iter_files(paths: list[str], recursive: bool):
                     yield child
 
 
+def index_paths(store, paths: list[str], recursive: bool) -> int:
+    indexed = 0
+    for file_path in iter_files(paths, recursive=recursive):
+        result = store.upsert_document_stream(
+            file_path=str(file_path),
+            content_hash=compute_file_hash(str(file_path)),
+            file_size=file_path.stat().st_size,
+            chunk_batches=iter_chunk_batches(str(file_path)),
+            facts=iter_facts(str(file_path)),
+        )
+        document = result["document"]
+        indexed += 1
+        print(
+            f"{result['status']}: {document['filename']} "
+            f"({document['chunk_count']} chunks, id={document['id']})"
+        )
+    return indexed
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Index local files into the personal RAG corpus."
@@ -38,28 +67,41 @@ def main():
         action="store_true",
         help="Recursively scan directory paths.",
     )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help=(
+            "Build a fresh store generation from the given paths in a side file and "
+            "swap it into service when done. Documents not under the paths are dropped."
+        ),
+    )
     args = parser.parse_args()
 
-    store = get_document_store()
-    indexed = 0
-    for file_path in iter_files(args.paths, recursive=args.recursive):
-        chunks = load_and_split(str(file_path))
-        result = store.upsert_document(
-            file_path=str(file_path),
-            content_hash=compute_file_hash(str(file_path)),
-            file_size=file_path.stat().st_size,
-            chunks=chunks,
-        )
-        document = result["document"]
-        indexed += 1
-        print(
-            f"{result['status']}: {document['filename']} "
-            f"({document['chunk_count']} chunks, id={document['id']})"
-        )
+    ensure_data_dirs()
+    rebuild = rebuild_in_progress()
+    if rebuild:
+        # the live store is about to be replaced; writes to it would be lost
+        parser.exit(1, f"A rebuild (pid {rebuild.get('pid')}) is in progress; try again when it finishes.\n")
+    live_store = get_document_store()
+    # uploads are refused from here until the new generation is activated or abandoned
+    store = create_generation() if args.rebuild else live_store
+    try:
+        indexed = index_paths(store, args.paths, args.recursive)
+        if indexed and args.rebuild:
+            codec = live_store.compression_codec()
+            if codec != "none":
+                store.recompress(codec)
+            activate_generation(store)
+            print(f"Activated generation {store.db_path.name}")
+    finally:
+        if args.rebuild and rebuild_in_progress():
+            # no files, or indexing failed: the live store stays in service
+            abandon_generation(store)
 
     if indexed == 0:
         print("No supported files found.")
-
+        return
+    print(f"Retrieval index: {ensure_retrieval_index(store)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,31 @@
+import sys
+import tempfile
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import config  # noqa: E402
+
+
+# Modules copy these paths at import time, so point them at a scratch directory
+# before any test imports the app; tests never touch backend/data.
+DATA_DIR = Path(tempfile.mkdtemp(prefix="rag-tests-"))
+LOG_DIR = DATA_DIR / "logs"
+for name, path in {
+    "UPLOAD_DIR": DATA_DIR / "uploads",
+    "STORE_DB_PATH": DATA_DIR / "rag_store.sqlite3",
+    "STORE_GENERATIONS_DIR": DATA_DIR / "generations",
+    "STORE_POINTER_PATH": DATA_DIR / "rag_store.current",
+    "STORE_REBUILD_MARKER_PATH": DATA_DIR / "rag_store.rebuilding",
+    "RETRIEVAL_INDEX_DIR": DATA_DIR / "index",
+    "ABSTAIN_CALIBRATION_PATH": DATA_DIR / "abstain_calibration.json",
+    "LOG_DIR": LOG_DIR,
+    "LOG_PATH": LOG_DIR / "rag_queries.jsonl",
+    "TRACE_LOG_PATH": LOG_DIR / "rag_trace.jsonl",
+    "APP_LOG_PATH": LOG_DIR / "app.log",
+    "PROFILE_DIR": LOG_DIR / "profiles",
+}.items():
+    setattr(config, name, str(path))
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from app.core import abstention, retrieval_index
+from app.core.abstention import confidence_features, early_abstain_thresholds, fit_thresholds, refuses
+from app.core.document_store import DocumentStore
+from app.core.metrics import StageTimer
+from app.core.utils import TextChunk
+from app.routes import query
+
+
+def sample(top_score, token_coverage, abstain):
+    return {"features": {"top_score": top_score, "token_coverage": token_coverage}, "abstain": abstain}
+
+
+def test_separable_samples_refuse_every_unanswerable_query():
+    samples = [
+        sample(9, 0.9, False),
+        sample(7, 0.8, False),
+        sample(2, 0.2, True),
+        sample(1, 0.6, True),
+    ]
+    thresholds = fit_thresholds(samples)
+    assert all(refuses(item["features"], thresholds) == item["abstain"] for item in samples)
+
+
+def test_no_answerable_query_is_refused_by_default():
+    samples = [
+        sample(5, 0.5, False),
+        sample(5, 0.5, True),
+        sample(1, 0.1, True),
+    ]
+    thresholds = fit_thresholds(samples)
+    assert not refuses(samples[0]["features"], thresholds)
+    assert refuses(samples[2]["features"], thresholds)
+
+
+def test_false_abstain_budget_buys_more_refusals():
+    samples = [sample(score, 1.0, False) for score in (2, 6, 7, 8)] + [sample(1, 1.0, True), sample(3, 1.0, True)]
+    strict = fit_thresholds(samples)
+    loose = fit_thresholds(samples, max_false_abstain_rate=0.25)
+    assert sum(refuses(item["features"], strict) for item in samples if item["abstain"]) == 1
+    assert sum(refuses(item["features"], loose) for item in samples if item["abstain"]) == 2
+    assert sum(refuses(item["features"], loose) for item in samples if not item["abstain"]) == 1
+
+
+def test_ties_go_to_the_lowest_thresholds():
+    assert fit_thresholds([sample(5, 0.5, False), sample(6, 0.7, False)]) == {"top_score": 0, "token_coverage": 0}
+
+
+@pytest.fixture
+def calibrated(tmp_path, monkeypatch):
+    path = tmp_path / "abstain_calibration.json"
+    path.write_text(json.dumps({"thresholds": {"top_score": 10, "token_coverage": 0.5}}))
+    monkeypatch.setattr(abstention, "ABSTAIN_CALIBRATION_PATH", str(path))
+    monkeypatch.setattr(abstention, "EARLY_ABSTAIN", True)
+    monkeypatch.setattr(abstention, "_loaded", {"mtime": None, "thresholds": None})
+    return path
+
+
+def test_confidence_features():
+    chunks = [{"content": "Python and Go", "score": 12}, {"content": "Rust", "score": 3}]
+    assert confidence_features({"python", "rust", "java"}, chunks) == {"top_score": 12, "token_coverage": 0.667}
+    assert confidence_features({"python"}, []) == {"top_score": 0, "token_coverage": 0.0}
+
+
+def test_only_queries_below_a_threshold_abstain(calibrated, monkeypatch):
+    assert early_abstain_thresholds({"top_score": 12, "token_coverage": 0.9}) is None
+    assert early_abstain_thresholds({"top_score": 12, "token_coverage": 0.2}) == {"top_score": 10, "token_coverage": 0.5}
+    monkeypatch.setattr(abstention, "EARLY_ABSTAIN", False)
+    assert early_abstain_thresholds({"top_score": 0, "token_coverage": 0.0}) is None
+
+
+def test_early_abstention_skips_the_llm(calibrated, tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval_index, "RETRIEVAL_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(query, "generate_text", lambda *args, **kwargs: pytest.fail("LLM called"))
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    store.upsert_document(
+        file_path="/tmp/notes.txt",
+        content_hash="notes",
+        file_size=1,
+        chunks=[TextChunk(page_content="Document: notes.txt\nkubernetes cluster upgrade", metadata={"chunk_index": 0})],
+    )
+
+    outcome = query._run_pipeline("kubernetes salary negotiation tips", "trace", StageTimer("query"), store=store)
+    assert outcome["answer"] == "I don't know."
+    assert outcome["log"]["early_abstain"] is True
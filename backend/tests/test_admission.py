@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.admission import AdmissionLimiter
+
+
+def limiter(concurrency=1, queue_size=1, timeout=5.0):
+    return AdmissionLimiter("test", concurrency=concurrency, queue_size=queue_size, timeout=timeout)
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        slots = limiter(concurrency=1, queue_size=1)
+        held = await slots.acquire()
+        waiting = asyncio.ensure_future(slots.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as excinfo:
+            await slots.acquire()
+        slots.release(held)
+        slots.release(await waiting)
+        return excinfo.value, slots
+
+    error, slots = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert "queue full" in error.detail
+    # one waiter ahead plus this request, one slot, ~1s holds
+    assert error.headers == {"Retry-After": "2"}
+    assert (slots.active, slots.queue_depth(), slots.admitted, slots.rejected) == (0, 0, 2, 1)
+
+
+def test_wait_timeout_is_rejected_and_leaves_the_queue():
+    async def scenario():
+        slots = limiter(concurrency=1, queue_size=5, timeout=0.05)
+        held = await slots.acquire()
+        with pytest.raises(HTTPException) as excinfo:
+            await slots.acquire()
+        depth = slots.queue_depth()
+        slots.release(held)
+        return excinfo.value, depth, slots
+
+    error, depth, slots = asyncio.run(scenario())
+    assert error.status_code == 503 and "timeout" in error.detail
+    assert int(error.headers["Retry-After"]) >= 1
+    assert depth == 0
+    assert slots.active == 0
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def scenario():
+        slots = limiter(concurrency=1, queue_size=3)
+        order = []
+        held = await slots.acquire()
+
+        async def request(number):
+            ticket = await slots.acquire()
+            order.append(number)
+            slots.release(ticket)
+
+        waiters = [asyncio.ensure_future(request(number)) for number in range(3)]
+        await asyncio.sleep(0)
+        slots.release(held)
+        await asyncio.gather(*waiters)
+        return order, slots.active
+
+    assert asyncio.run(scenario()) == ([0, 1, 2], 0)
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        slots = limiter(concurrency=1, queue_size=2)
+        held = await slots.acquire()
+        waiting = asyncio.ensure_future(slots.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        slots.release(held)
+        return slots.active, slots.queue_depth()
+
+    assert asyncio.run(scenario()) == (0, 0)
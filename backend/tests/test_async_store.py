@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core import async_store as async_store_module
+from app.core.async_store import WRITE_METHODS, AsyncDocumentStore
+from app.core.document_store import DocumentStore
+
+
+class RecordingStore:
+    def __init__(self):
+        self.calls = []
+        self.active_writes = 0
+        self.max_active_writes = 0
+
+    def _record(self, name):
+        self.calls.append((name, threading.current_thread().name))
+
+    def count_chunks(self):
+        self._record("count_chunks")
+        return 7
+
+    def upsert_document(self, **kwargs):
+        self._record("upsert_document")
+        self.active_writes += 1
+        self.max_active_writes = max(self.max_active_writes, self.active_writes)
+        time.sleep(0.02)
+        self.active_writes -= 1
+        return kwargs
+
+
+@pytest.fixture
+def recording(monkeypatch):
+    store = RecordingStore()
+    monkeypatch.setattr(async_store_module, "get_document_store", lambda: store)
+    return store
+
+
+def run(coroutine_factory):
+    stores = AsyncDocumentStore(readers=2)
+    try:
+        return asyncio.run(coroutine_factory(stores))
+    finally:
+        stores.shutdown()
+
+
+def test_write_methods_exist_on_the_store():
+    assert all(callable(getattr(DocumentStore, name, None)) for name in WRITE_METHODS)
+
+
+def test_reads_and_writes_run_on_their_own_threads(recording):
+    async def scenario(stores):
+        loop_thread = threading.current_thread().name
+        count = await stores.count_chunks()
+        written = await stores.upsert_document(file_path="a")
+        return loop_thread, count, written
+
+    loop_thread, count, written = run(scenario)
+    assert (count, written) == (7, {"file_path": "a"})
+    threads = dict(recording.calls)
+    assert threads["count_chunks"].startswith("rag-store-read")
+    assert threads["upsert_document"].startswith("rag-store-write")
+    assert loop_thread not in threads.values()
+
+
+def test_concurrent_writes_are_serialized(recording):
+    async def scenario(stores):
+        await asyncio.gather(*(stores.upsert_document(file_path=str(number)) for number in range(4)))
+
+    run(scenario)
+    assert recording.max_active_writes == 1
+    assert len({thread for _, thread in recording.calls}) == 1
+
+
+def test_only_public_store_methods_are_exposed():
+    stores = AsyncDocumentStore(readers=1)
+    with pytest.raises(AttributeError):
+        stores._connect
+    with pytest.raises(AttributeError):
+        stores.no_such_method
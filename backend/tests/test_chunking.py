@@ -0,0 +1,76 @@
+import sqlite3
+
+from app.core.document_store import DocumentStore
+from app.core.utils import StreamingChunker, TextChunk, document_header
+
+
+def chunk_pages(pages, chunk_size=60, chunk_overlap=15):
+    chunker = StreamingChunker(chunk_size, chunk_overlap)
+    spans = []
+    for number, text in enumerate(pages):
+        spans.extend(chunker.feed(text, number))
+    spans.extend(chunker.finish())
+    return spans
+
+
+def normalized(pages):
+    return " ".join(" ".join(page.split()) for page in pages if page.split())
+
+
+def test_offsets_point_into_normalized_text():
+    pages = [
+        "The first  page has\nsome text. It keeps going for a while with more words here.",
+        "",
+        "Second page.   Another sentence follows and then the document ends.",
+    ]
+    text = normalized(pages)
+    spans = chunk_pages(pages)
+    assert len(spans) > 1
+    for chunk, _, start, end in spans:
+        assert len(chunk) <= 60
+        assert text[start:end] == chunk
+
+
+def test_chunks_cover_the_whole_text_with_overlap():
+    pages = [" ".join(f"word{index}" for index in range(200))]
+    text = normalized(pages)
+    spans = chunk_pages(pages)
+    assert spans[0][2] == 0
+    assert spans[-1][3] == len(text)
+    for (_, _, _, previous_end), (_, _, start, _) in zip(spans, spans[1:]):
+        # the next chunk starts inside the previous one and on a word boundary
+        assert start < previous_end
+        assert text[start - 1] == " "
+
+
+def test_cuts_prefer_sentence_ends():
+    # only the second half of the window is searched, so chunks never get tiny
+    spans = chunk_pages(["A sentence that runs long. Then more words that push past the limit."], 40, 5)
+    assert spans[0][0] == "A sentence that runs long."
+
+
+def test_chunk_reports_the_page_it_starts_on():
+    spans = chunk_pages(["alpha " * 20, "beta " * 20])
+    assert spans[0][1] == 0
+    assert spans[-1][1] == 1
+    assert all(page in (0, 1) for _, page, _, _ in spans)
+
+
+def test_empty_input_yields_nothing():
+    assert chunk_pages(["", "   \n\t"]) == []
+
+
+def test_store_keeps_spans_and_rebuilds_the_chunk_text(tmp_path):
+    pages = ["The first page has some text. It keeps going for a while with more words here.",
+             "Second page. Another sentence follows and then the document ends."]
+    header = document_header("a.pdf")
+    chunks = [
+        TextChunk(page_content=f"{header}{text}", metadata={"chunk_index": index, "page": page}, start=start, end=end)
+        for index, (text, page, start, end) in enumerate(chunk_pages(pages))
+    ]
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    store.upsert_document(file_path="/tmp/a.pdf", content_hash="h", file_size=1, chunks=chunks)
+
+    assert [chunk["content"] for chunk in store.list_chunks()] == [chunk.page_content for chunk in chunks]
+    stored = sqlite3.connect(store.db_path).execute("SELECT content FROM chunks").fetchall()
+    assert stored == [("",)] * len(chunks)
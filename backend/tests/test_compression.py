@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from app.core.compression import (
+    HEADER,
+    compress_text,
+    decompress_text,
+    train_dictionary,
+    training_samples,
+)
+from app.core.document_store import DocumentStore
+from app.core.utils import TextChunk
+
+TEXT = "Senior engineer at Acme Corp. Built the ingestion pipeline for Acme Corp. " * 20
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_round_trip_with_and_without_a_dictionary(codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    plain = compress_text(TEXT, codec)
+    assert isinstance(plain, bytes) and len(plain) < len(TEXT)
+    assert decompress_text(plain, lambda _: pytest.fail("no dictionary expected")) == TEXT
+
+    dictionary = train_dictionary(codec, training_samples([TEXT] * 50, sample_chars=256))
+    packed = compress_text(TEXT, codec, dictionary_id=7, dictionary=dictionary)
+    assert HEADER.unpack_from(packed)[1] == (7 if dictionary else 0)
+    assert decompress_text(packed, {7: dictionary}.get) == TEXT
+
+
+def test_plain_text_and_none_pass_through():
+    assert compress_text(TEXT, "none") == TEXT
+    assert decompress_text(TEXT, None) == TEXT
+    assert decompress_text(None, None) is None
+    with pytest.raises(ValueError):
+        decompress_text(HEADER.pack(b"x", 0) + b"data", None)
+
+
+def add(store, filename, texts, spans=False):
+    chunks = []
+    offset = 0
+    for index, text in enumerate(texts):
+        extra = {"start": offset, "end": offset + len(text)} if spans else {}
+        chunks.append(TextChunk(page_content=f"Document: {filename}\n{text}", metadata={"chunk_index": index}, **extra))
+        offset += len(text) + 1
+    store.upsert_document(file_path=f"/tmp/{filename}", content_hash=filename, file_size=1, chunks=chunks)
+
+
+def contents(store):
+    return [(chunk["filename"], chunk["content"]) for chunk in store.list_chunks()]
+
+
+def test_recompress_keeps_every_chunk_readable(tmp_path):
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    add(store, "plain.txt", [TEXT[:300], TEXT[300:600]])
+    add(store, "spans.pdf", [TEXT[:200], TEXT[201:400]], spans=True)
+    before = contents(store)
+    version = store.corpus_version()
+
+    store.recompress("zlib")
+    assert contents(store) == before
+    assert store.corpus_version() > version
+    rows = sqlite3.connect(store.db_path).execute(
+        "SELECT content FROM chunks WHERE start_offset IS NULL"
+    ).fetchall()
+    assert rows and all(isinstance(content, bytes) for content, in rows)
+
+    # later writes use the new format too, and switching back decompresses
+    add(store, "later.txt", [TEXT[:100]])
+    later = sqlite3.connect(store.db_path).execute(
+        "SELECT content FROM chunks JOIN documents ON documents.id = chunks.document_id WHERE filename = 'later.txt'"
+    ).fetchone()[0]
+    assert isinstance(later, bytes)
+    after = contents(store)
+    store.recompress("none")
+    assert contents(store) == after
+
+
+def test_unknown_codec_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        DocumentStore(str(tmp_path / "store.sqlite3")).recompress("lz4")
@@ -0,0 +1,50 @@
+from app.core.context_builder import build_context, estimate_tokens
+
+
+def chunk(document_id, index, body, filename=None):
+    filename = filename or f"{document_id}.txt"
+    return {
+        "id": f"{document_id}:{index}",
+        "document_id": document_id,
+        "chunk_index": index,
+        "filename": filename,
+        "content": f"Document: {filename}\n{body}",
+    }
+
+
+def test_adjacent_chunks_are_merged_without_the_overlap():
+    first = "The platform ingests resumes and splits them into overlapping windows of text."
+    second = "overlapping windows of text. Each window is scored against the query terms."
+    context, packed, stats = build_context([chunk("a", 1, second), chunk("a", 0, first)])
+    assert context == (
+        "Document: a.txt\n"
+        "The platform ingests resumes and splits them into overlapping windows of text."
+        " Each window is scored against the query terms."
+    )
+    assert [item["id"] for item in packed] == ["a:1", "a:0"]
+    assert stats["tokens_saved"] > 0
+
+
+def test_documents_keep_rank_order_with_one_header_each():
+    context, _, stats = build_context(
+        [chunk("b", 4, "beta four"), chunk("a", 0, "alpha zero"), chunk("b", 7, "beta seven")]
+    )
+    assert context == "Document: b.txt\nbeta four\n\nbeta seven\n\nDocument: a.txt\nalpha zero"
+    assert stats["document_count"] == 2
+
+
+def test_chunks_past_the_budget_are_dropped_but_the_best_is_kept():
+    long_body = "word " * 200
+    ranked = [chunk("a", 0, long_body), chunk("b", 0, "short"), chunk("c", 0, long_body)]
+    context, packed, stats = build_context(ranked, token_budget=270)
+    assert [item["id"] for item in packed] == ["a:0", "b:0"]
+    assert estimate_tokens(context) <= 270
+    assert stats["candidate_count"] == 3 and stats["packed_count"] == 2
+
+    _, packed, _ = build_context(ranked, token_budget=10)
+    assert [item["id"] for item in packed] == ["a:0"]
+
+
+def test_short_coincidental_overlap_is_not_removed():
+    context, _, _ = build_context([chunk("a", 0, "ends with the"), chunk("a", 1, "the next chunk")])
+    assert context == "Document: a.txt\nends with the the next chunk"
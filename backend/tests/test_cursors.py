@@ -0,0 +1,69 @@
+import pytest
+
+from app.core.document_store import DocumentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DocumentStore(str(tmp_path / "store.sqlite3"))
+
+
+def test_cursor_round_trip(store):
+    values = ["2026-01-01T00:00:00+00:00", 42]
+    assert store._decode_cursor(store._encode_cursor(values), 2) == values
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm90IGpzb24=", "eyJhIjogMX0="])
+def test_malformed_cursor_is_rejected(store, cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        store._decode_cursor(cursor, 1)
+
+
+def test_cursor_with_wrong_arity_is_rejected(store):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        store._decode_cursor(store._encode_cursor([1, 2]), 1)
+
+
+def test_page_documents_walks_every_document_once(store):
+    from app.core.utils import TextChunk
+
+    for index in range(5):
+        store.upsert_document(
+            file_path=f"/tmp/doc{index}.txt",
+            content_hash=f"hash{index}",
+            file_size=10,
+            chunks=[TextChunk(page_content=f"Document: doc{index}.txt\nbody {index}", metadata={"chunk_index": 0})],
+        )
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.page_documents(limit=2, cursor=cursor)
+        seen.extend(document["id"] for document in page)
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 5
+
+
+def test_chunk_pages_are_projected_to_the_requested_fields(store):
+    from app.core.utils import TextChunk
+
+    document = store.upsert_document(
+        file_path="/tmp/long.txt",
+        content_hash="long",
+        file_size=10,
+        chunks=[
+            TextChunk(page_content=f"Document: long.txt\npart {index}", metadata={"chunk_index": index})
+            for index in range(5)
+        ],
+    )["document"]
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.page_document_chunks(
+            document["id"], limit=2, cursor=cursor, fields=["id", "chunk_index"]
+        )
+        assert all(set(chunk) == {"id", "chunk_index"} for chunk in page)
+        seen.extend(chunk["chunk_index"] for chunk in page)
+        if cursor is None:
+            break
+    assert seen == [0, 1, 2, 3, 4]
+    with pytest.raises(ValueError):
+        store.page_document_chunks(document["id"], fields=["id", "secret"])
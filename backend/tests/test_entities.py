@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+from app.core.document_store import DocumentStore
+from app.core.entities import EntityCollector
+from app.core.utils import TextChunk
+
+DOCUMENTS = {
+    "Jane_Doe_Resume.pdf": "Jane Doe\nSoftware engineer at Acme Corp since 2021.",
+    "John_Smith_Resume.pdf": "John Smith\nData analyst at Globex Industries.",
+    "notes.txt": "Meeting notes about the Acme Corp contract renewal.",
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    for filename, text in DOCUMENTS.items():
+        store.upsert_document(
+            file_path=f"/tmp/{filename}",
+            content_hash=filename,
+            file_size=len(text),
+            chunks=[TextChunk(page_content=f"Document: {filename}\n{text}", metadata={"chunk_index": 0})],
+        )
+    return store
+
+
+def ids(store, *filenames):
+    return {document["id"] for document in store.list_documents() if document["filename"] in filenames}
+
+
+def forget_entities(store):
+    """Put the store back in the state of one indexed before entity extraction."""
+    connection = sqlite3.connect(store.db_path)
+    with connection:
+        connection.execute("DELETE FROM entities")
+        connection.execute("UPDATE documents SET entities_version = NULL")
+    connection.close()
+
+
+def test_collector_counts_sub_runs_and_keeps_the_heading():
+    collector = EntityCollector()
+    collector.add("Jane Doe\nWorked with JANE DOE SMITH at Acme Corp.")
+    assert collector.heading == "Jane Doe"
+    assert collector.mentions["jane doe"] == 2
+    assert collector.mentions["doe smith"] == 1
+    assert ("subject", "jane doe", "Jane Doe", 0) in collector.rows("Jane_Doe_Resume.pdf")
+
+
+def test_documents_are_scoped_by_entity(store):
+    assert set(store.documents_mentioning("acme  corp")) == ids(store, "Jane_Doe_Resume.pdf", "notes.txt")
+    assert set(store.documents_mentioning("Globex Industries")) == ids(store, "John_Smith_Resume.pdf")
+    assert store.documents_mentioning("Initech") == []
+    subjects = store.document_subjects(list(ids(store, "Jane_Doe_Resume.pdf")))
+    assert list(subjects.values()) == [{"subject": "Jane Doe", "heading": "Jane Doe"}]
+
+
+def test_backfill_fills_stale_documents_in_batches(store):
+    forget_entities(store)
+    # unextracted documents cannot be ruled out
+    assert store.documents_mentioning("Globex Industries") is None
+
+    assert store.backfill_entities(limit=2) == 2
+    assert store.backfill_entities(limit=2) == 1
+    assert store.backfill_entities(limit=2) == 0
+    assert set(store.documents_mentioning("Globex Industries")) == ids(store, "John_Smith_Resume.pdf")
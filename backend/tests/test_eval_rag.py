@@ -0,0 +1,59 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from app.routes import query
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "eval_rag.py"
+
+
+@pytest.fixture(scope="module")
+def eval_rag():
+    spec = importlib.util.spec_from_file_location("eval_rag", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def row(query, expected_sources=(), expected_abstain=False):
+    return {
+        "query": query,
+        "expected_answer": "",
+        "expected_keywords": [],
+        "expected_sources": list(expected_sources),
+        "expected_abstain": expected_abstain,
+    }
+
+
+def test_index_logs_keeps_the_latest_entry_per_query(eval_rag):
+    entries = [{"query": "a", "answer": "old"}, {"query": "b", "answer": "b"}, {"query": "a", "answer": "new"}]
+    assert eval_rag.index_logs(entries) == {"a": entries[2], "b": entries[1]}
+
+
+def test_retrieval_only_recall_and_mrr(eval_rag, monkeypatch):
+    ranked = [{"filename": "notes.txt"}, {"filename": "resume.pdf"}, {"filename": "cv.pdf"}]
+    monkeypatch.setattr(query, "_retrieve_chunks", lambda text, top_k: (ranked[:top_k], len(ranked), set(), []))
+
+    result = eval_rag.evaluate_retrieval(row("q", ["resume.pdf", "letter.pdf"]), top_k=3)
+    assert result["recall_at_k"] == 0.5
+    assert result["mrr"] == 0.5
+    unlabeled = eval_rag.evaluate_retrieval(row("q"), top_k=3)
+    assert unlabeled["recall_at_k"] is None and unlabeled["mrr"] is None
+
+
+def test_pipeline_runs_in_order_and_isolates_failures(eval_rag, monkeypatch):
+    def fake_pipeline(text, trace_id, timer, priority, store):
+        assert priority == "batch"
+        if text == "boom":
+            raise RuntimeError("llm down")
+        return {"answer": "I don't know.", "log": {"retrieved": []}}
+
+    monkeypatch.setattr(query, "_run_pipeline", fake_pipeline)
+    rows = [row("first", expected_abstain=True), row("boom"), row("last")]
+    results = eval_rag.run_pipeline(rows, workers=3)
+
+    assert [result["query"] for result in results] == ["first", "boom", "last"]
+    assert results[0]["abstention_quality"] is True
+    assert results[1] == {"query": "boom", "error": "pipeline failed: llm down"}
+    assert results[2]["abstention_quality"] is False
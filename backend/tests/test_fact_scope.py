@@ -0,0 +1,63 @@
+import pytest
+
+from app.core.document_store import DocumentStore
+from app.core.metrics import StageTimer
+from app.core.utils import TextChunk
+from app.routes import query
+
+
+def add_resume(store, filename, text, facts):
+    return store.upsert_document_stream(
+        file_path=f"/tmp/{filename}",
+        content_hash=filename,
+        file_size=len(text),
+        chunk_batches=[[TextChunk(page_content=f"Document: {filename}\n{text}", metadata={"chunk_index": 0})]],
+        facts=facts,
+    )["document"]["id"]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    monkeypatch.setattr(query, "log_trace_event", lambda *args, **kwargs: None)
+    store.jane = add_resume(
+        store,
+        "Jane_Doe_Resume.txt",
+        "Jane Doe\nEDUCATION\nStanford University 2019 - 2021\nGPA 3.9/4.0\nEXPERIENCE\nAcme Robotics 2021 - Present",
+        [
+            {"kind": "subject", "organization": "Jane Doe"},
+            {"kind": "education", "organization": "Stanford University", "end_date": "2021", "gpa": "3.9/4.0"},
+            {"kind": "experience", "organization": "Acme Robotics", "start_date": "2021", "end_date": "Present"},
+        ],
+    )
+    store.john = add_resume(
+        store,
+        "John_Smith_Resume.txt",
+        "John Smith\nEDUCATION\nState College 2020 - 2024\nGPA 8.1/10\nReferences: Jane Doe",
+        [
+            {"kind": "subject", "organization": "John Smith"},
+            {"kind": "education", "organization": "State College", "end_date": "2024", "gpa": "8.1/10"},
+            {"kind": "experience", "organization": "Globex", "start_date": "2024", "end_date": "Present"},
+        ],
+    )
+    return store
+
+
+def answer(store, question, entity=None, filters=None):
+    outcome = query._answer_from_facts(store, question, entity, "trace", StageTimer("query"), filters)
+    return outcome and outcome["answer"]
+
+
+def test_facts_of_several_resumes_are_not_merged(store):
+    assert answer(store, "What was my GPA?") is None
+    assert answer(store, "Where have I worked?") is None
+
+
+def test_filters_pick_one_resume(store):
+    assert answer(store, "What was my GPA?", filters={"document_ids": [store.john]}) == "8.1/10"
+
+
+def test_entity_selects_the_resume_about_it(store):
+    # John's resume mentions Jane Doe, but is not about her
+    assert answer(store, "What was Jane Doe's GPA?", entity="Jane Doe") == "3.9/4.0"
+    assert answer(store, "What was Mary Major's GPA?", entity="Mary Major") is None
@@ -0,0 +1,84 @@
+import pytest
+
+from app.core.facts import answer_from_facts, org_key
+
+
+def experience(organization, role, start, end):
+    return {
+        "kind": "experience",
+        "organization": organization,
+        "org_key": org_key(organization),
+        "role": role,
+        "start_date": start,
+        "end_date": end,
+    }
+
+
+def education(organization, degree, start, end, gpa=None):
+    return {
+        "kind": "education",
+        "organization": organization,
+        "org_key": org_key(organization),
+        "degree": degree,
+        "start_date": start,
+        "end_date": end,
+        "gpa": gpa,
+    }
+
+
+def skill(name, category):
+    return {"kind": "skill", "skill": name, "category": category}
+
+
+FACTS = [
+    {"kind": "subject", "organization": "Jane Doe", "org_key": org_key("Jane Doe")},
+    experience("Acme Robotics", "Software Engineer", "Jan 2021", "Present"),
+    experience("Globex", "Intern", "May 2019", "Aug 2019"),
+    education("Stanford University", "Master of Science in Computer Science", "2019", "2021", gpa="3.9/4.0"),
+    education("State College", "Bachelor of Engineering", "2015", "2019", gpa="8.1/10"),
+    skill("Python", "Languages"),
+    skill("Rust", "Languages"),
+    skill("Docker", "Tools"),
+]
+
+
+@pytest.mark.parametrize(
+    "query, answer, intent",
+    [
+        ("Where does she work now?", "Acme Robotics", "current_employer"),
+        ("What is her current role?", "Software Engineer, Acme Robotics", "current_role"),
+        ("What was her role at Globex?", "Intern, Globex", "role_at_org"),
+        ("When did she work at Globex?", "May 2019 - Aug 2019", "dates_at_org"),
+        ("Which companies has she worked at?", "Acme Robotics; Globex", "employers"),
+        ("What was her GPA?", "3.9/4.0", "gpa"),
+        ("What was her bachelor GPA?", "8.1/10", "gpa"),
+        ("Where did she study?", "Stanford University; State College", "institutions"),
+        ("Does she know Rust?", "Yes: Rust", "has_skill"),
+        ("What languages does she know?", "Languages: Python, Rust", "skills"),
+    ],
+)
+def test_answers_narrow_questions(query, answer, intent):
+    result = answer_from_facts(query, FACTS)
+    assert result is not None
+    assert result[:2] == (answer, intent)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "Summarize her thesis",
+        "What do you know about distributed systems?",
+        "Did she enjoy working at Acme Robotics?",
+    ],
+)
+def test_other_questions_go_to_retrieval(query):
+    assert answer_from_facts(query, FACTS) is None
+
+
+def test_unknown_entity_is_not_answered_from_facts():
+    assert answer_from_facts("Where does John Smith work now?", FACTS, entity="John Smith") is None
+    assert answer_from_facts("Where does Jane Doe work now?", FACTS, entity="Jane Doe")[0] == "Acme Robotics"
+
+
+def test_no_facts():
+    assert answer_from_facts("What was her GPA?", []) is None
@@ -0,0 +1,101 @@
+import sqlite3
+from datetime import datetime
+from fnmatch import fnmatchcase
+
+import pytest
+
+from app.core import retrieval_index
+from app.core.document_store import DocumentStore
+from app.core.utils import TextChunk
+from app.routes.query import QueryFilters, _retrieve_chunks
+
+UPDATED_AT = {
+    "resume.pdf": "2026-01-10T00:00:00+00:00",
+    "notes.txt": "2026-02-10T00:00:00+00:00",
+    "report.pdf": "2026-03-10T00:00:00+00:00",
+    "letter.docx": "2026-04-10T00:00:00+00:00",
+}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval_index, "RETRIEVAL_INDEX_DIR", str(tmp_path / "index"))
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    for filename in UPDATED_AT:
+        ext = "." + filename.rsplit(".", 1)[1]
+        store.upsert_document(
+            file_path=f"/tmp/{filename}",
+            content_hash=filename,
+            file_size=1,
+            chunks=[
+                TextChunk(
+                    page_content=f"Document: {filename}\nkubernetes migration part {index}",
+                    metadata={"chunk_index": index, "file_ext": ext, "page": index if ext == ".pdf" else None},
+                )
+                for index in range(3)
+            ],
+        )
+    connection = sqlite3.connect(store.db_path)
+    with connection:
+        connection.executemany(
+            "UPDATE documents SET updated_at = ? WHERE filename = ?",
+            [(updated_at, filename) for filename, updated_at in UPDATED_AT.items()],
+        )
+    connection.close()
+    return store
+
+
+def matches(chunk, filters):
+    """The filters evaluated in Python, as retrieval did before the pushdown."""
+    filename = chunk["filename"]
+    if "filename" in filters and not fnmatchcase(filename, filters["filename"]):
+        return False
+    if "file_ext" in filters and "." + filename.rsplit(".", 1)[1] not in [f".{ext}" for ext in filters["file_ext"]]:
+        return False
+    if "document_ids" in filters and chunk["document_id"] not in filters["document_ids"]:
+        return False
+    if "updated_after" in filters and UPDATED_AT[filename] < filters["updated_after"]:
+        return False
+    if "updated_before" in filters and UPDATED_AT[filename] >= filters["updated_before"]:
+        return False
+    if "pages" in filters and chunk["metadata"].get("page") not in filters["pages"]:
+        return False
+    return True
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"filename": "re*"},
+        {"file_ext": ["pdf"]},
+        {"file_ext": ["txt", "docx"]},
+        {"updated_after": "2026-02-10T00:00:00+00:00"},
+        {"updated_before": "2026-03-10T00:00:00+00:00"},
+        {"pages": [0, 2]},
+        {"file_ext": ["pdf"], "pages": [1], "updated_after": "2026-02-01T00:00:00+00:00"},
+        {"filename": "*.zip"},
+    ],
+)
+def test_sql_filters_match_python_filtering(store, filters):
+    everything = store.list_chunks()
+    expected = [chunk["id"] for chunk in everything if matches(chunk, filters)]
+    assert len(everything) == 12
+    assert [chunk["id"] for chunk in store.list_chunks(filters=filters)] == expected
+    assert sorted(f"{document_id}:{index}" for document_id, index in store.list_chunk_keys(filters)) == sorted(expected)
+
+
+def test_document_id_filter(store):
+    document_id = store.list_chunks(filters={"filename": "notes.txt"})[0]["document_id"]
+    chunks = store.list_chunks(filters={"document_ids": [document_id]})
+    assert {chunk["filename"] for chunk in chunks} == {"notes.txt"}
+
+
+def test_retrieval_only_scores_chunks_inside_the_filter(store):
+    chunks, _, _, _ = _retrieve_chunks("kubernetes migration", top_k=20, filters={"file_ext": ["pdf"]}, store=store)
+    assert chunks
+    assert {chunk["filename"] for chunk in chunks} == {"resume.pdf", "report.pdf"}
+
+
+def test_naive_datetimes_are_treated_as_utc():
+    filters = QueryFilters(updated_after=datetime(2026, 2, 1), file_ext=[]).to_store_filters()
+    assert filters == {"updated_after": "2026-02-01T00:00:00+00:00"}
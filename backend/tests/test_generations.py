@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from app.core import document_store
+from app.core.document_store import (
+    DocumentStore,
+    abandon_generation,
+    activate_generation,
+    active_store_path,
+    create_generation,
+    get_document_store,
+    rebuild_in_progress,
+)
+from app.core.utils import TextChunk
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_store, "STORE_DB_PATH", str(tmp_path / "rag_store.sqlite3"))
+    monkeypatch.setattr(document_store, "STORE_GENERATIONS_DIR", str(tmp_path / "generations"))
+    monkeypatch.setattr(document_store, "STORE_POINTER_PATH", str(tmp_path / "rag_store.current"))
+    monkeypatch.setattr(document_store, "STORE_REBUILD_MARKER_PATH", str(tmp_path / "rag_store.rebuilding"))
+    return tmp_path
+
+
+def add(store, filename, text):
+    return store.upsert_document(
+        file_path=f"/tmp/{filename}",
+        content_hash=text,
+        file_size=len(text),
+        chunks=[TextChunk(page_content=f"Document: {filename}\n{text}", metadata={"chunk_index": 0})],
+    )["document"]
+
+
+def test_activation_swaps_the_store_and_bumps_the_version(data_dir):
+    live = get_document_store()
+    add(live, "a.txt", "alpha")
+    generation = create_generation()
+    assert rebuild_in_progress()["generation"] == generation.db_path.name
+    add(generation, "b.txt", "beta")
+    # a write to the live store during the rebuild must not be shadowed by an older version
+    add(live, "c.txt", "gamma")
+
+    activate_generation(generation)
+    assert active_store_path() == str(generation.db_path)
+    assert rebuild_in_progress() is None
+    current = get_document_store()
+    assert [document["filename"] for document in current.list_documents()] == ["b.txt"]
+    assert current.corpus_version() > live.corpus_version()
+
+
+def test_second_rebuild_is_refused(data_dir):
+    create_generation()
+    with pytest.raises(RuntimeError):
+        create_generation()
+
+
+def test_marker_of_a_dead_process_is_ignored(data_dir):
+    (data_dir / "rag_store.rebuilding").write_text(json.dumps({"pid": 2**22 + 1, "generation": "x"}))
+    assert rebuild_in_progress() is None
+
+
+def test_abandon_removes_the_generation_and_the_marker(data_dir):
+    generation = create_generation()
+    abandon_generation(generation)
+    assert not generation.db_path.exists()
+    assert rebuild_in_progress() is None
+    assert active_store_path() == str(data_dir / "rag_store.sqlite3")
+
+
+def test_rebuilt_documents_keep_their_ids(data_dir):
+    live = get_document_store()
+    kept = add(live, "resume.pdf", "v1")
+    renamed = add(live, "notes.txt", "same text")
+    generation = create_generation()
+    assert add(generation, "resume.pdf", "v2")["id"] == kept["id"]
+    assert add(generation, "notes-renamed.txt", "same text")["id"] == renamed["id"]
+    # a second copy of that content cannot take the same id
+    assert add(generation, "notes-copy.txt", "same text")["id"] != renamed["id"]
+    assert add(generation, "new.txt", "fresh")["id"] not in {kept["id"], renamed["id"]}
+
+
+
+def test_query_reads_one_generation_even_if_the_pointer_moves(data_dir, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.routes import query
+
+    old = DocumentStore(str(data_dir / "old.sqlite3"))
+    new = DocumentStore(str(data_dir / "new.sqlite3"))
+    add(old, "kafka.txt", "The ingestion service consumes events from kafka topics.")
+    add(new, "empty.txt", "nothing relevant here")
+    # the first lookup sees the old generation, every later one the new
+    stores = iter([old])
+    monkeypatch.setattr(query, "get_document_store", lambda: next(stores, new))
+    monkeypatch.setattr(query, "generate_text", lambda prompt, **kwargs: ("It uses kafka.", 1.0))
+
+    response = TestClient(app).post("/api/query", json={"query": "which kafka topics are consumed?"})
+    assert response.status_code == 200
+    assert [source["filename"] for source in response.json()["sources"]] == ["kafka.txt"]
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import pytest
+
+from app.core.document_store import DocumentStore
+from app.core.utils import TextChunk, iter_chunk_batches, iter_pdf_pages
+
+RESUME_PDF = Path(__file__).resolve().parents[1] / "backend" / "data" / "uploads" / "Anish_Resume.pdf"
+
+
+def batches(texts):
+    for index, text in enumerate(texts):
+        yield [TextChunk(page_content=f"Document: a.txt\n{text}", metadata={"chunk_index": index})]
+
+
+def test_unchanged_hash_never_consumes_the_batches(tmp_path):
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    store.upsert_document_stream(
+        file_path="/tmp/a.txt", content_hash="h1", file_size=5, chunk_batches=batches(["one", "two"])
+    )
+
+    def must_not_parse():
+        raise AssertionError("batches consumed for an unchanged document")
+        yield
+
+    result = store.upsert_document_stream(
+        file_path="/tmp/a.txt", content_hash="h1", file_size=5, chunk_batches=must_not_parse()
+    )
+    assert result["status"] == "unchanged"
+    assert store.count_chunks() == 2
+
+
+def test_failure_mid_stream_rolls_back(tmp_path):
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    store.upsert_document_stream(
+        file_path="/tmp/a.txt", content_hash="h1", file_size=5, chunk_batches=batches(["one", "two"])
+    )
+
+    def broken():
+        yield from batches(["three", "four"])
+        raise RuntimeError("parser crashed")
+
+    with pytest.raises(RuntimeError):
+        store.upsert_document_stream(
+            file_path="/tmp/a.txt", content_hash="h2", file_size=9, chunk_batches=broken()
+        )
+    assert store.count_documents() == 1
+    assert store.count_chunks() == 2
+
+
+@pytest.mark.skipif(not RESUME_PDF.exists(), reason="sample PDF not present")
+def test_pdf_is_read_and_batched_page_by_page():
+    pages = list(iter_pdf_pages(str(RESUME_PDF)))
+    assert [page for page, _, _ in pages] == list(range(len(pages)))
+    assert all(total == len(pages) for _, total, _ in pages)
+
+    chunks = [chunk for batch in iter_chunk_batches(str(RESUME_PDF), batch_size=2) for chunk in batch]
+    assert [chunk.metadata["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk.metadata["total_pages"] == len(pages) for chunk in chunks)
+    assert all(len(batch) <= 2 for batch in iter_chunk_batches(str(RESUME_PDF), batch_size=2))
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.core.loaders import get_loader_class, load_object, supported_extensions
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("langchain", "langchain_community", "langchain_huggingface", "pypdf", "chromadb", "torch")
+
+
+def test_importing_the_app_leaves_heavy_modules_unloaded():
+    script = (
+        "import sys, app.main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_load_object_resolves_and_caches():
+    assert load_object("json:dumps") is load_object("json:dumps")
+    assert load_object("json:dumps")({"a": 1}) == '{"a": 1}'
+
+
+def test_unknown_extension_is_rejected_before_any_import():
+    assert ".pdf" in supported_extensions()
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        get_loader_class(".exe")
@@ -0,0 +1,146 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core import llm_provider
+from app.core.llm_provider import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ProviderBusy,
+    ProviderError,
+    _final_error,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_provider, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_threshold_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.retry_after() == pytest.approx(20)
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_one_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.retry_after() == pytest.approx(30)
+
+
+def test_final_error_without_errors():
+    error = _final_error([])
+    assert error.status_code == 503
+
+
+def test_final_error_keeps_the_primary_error():
+    primary = ProviderError("bad key", provider="groq")
+    fallback = ProviderError("connection refused", provider="ollama", retryable=True)
+    assert _final_error([primary, fallback]) is primary
+
+
+def test_rate_limit_behind_an_unreachable_fallback_becomes_503():
+    rate_limited = ProviderError("slow down", provider="groq", retry_after=19.2, upstream_status=429)
+    fallback = ProviderError("connection refused", provider="ollama", retryable=True)
+    error = _final_error([rate_limited, fallback])
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "20"}
+    assert error.detail == "slow down"
+
+
+def test_primary_actionable_error_wins_over_the_fallback():
+    busy = ProviderBusy("queue full", provider="groq", retry_after=5)
+    circuit = CircuitOpenError("circuit open", provider="ollama", retry_after=60)
+    assert _final_error([busy, circuit]).headers == {"Retry-After": "5"}
+
+
+def test_open_circuit_without_a_hint_uses_the_reset_interval(monkeypatch):
+    monkeypatch.setattr(llm_provider, "LLM_CIRCUIT_RESET_SECONDS", 45)
+    error = _final_error([CircuitOpenError("circuit open", provider="groq")])
+    assert error.headers == {"Retry-After": "45"}
+
+
+def test_plain_http_exception_is_passed_through():
+    error = HTTPException(status_code=500, detail="unsupported provider")
+    assert _final_error([error]) is error
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    calls = []
+
+    def failing(prompt, settings, priority):
+        calls.append("groq")
+        raise ProviderError("Groq returned status 500", provider="groq", upstream_status=500)
+
+    def working(prompt, settings, priority):
+        calls.append("ollama")
+        return "answer", 12.0
+
+    monkeypatch.setattr(llm_provider, "LLM_PROVIDER", "groq")
+    monkeypatch.setattr(llm_provider, "LLM_FALLBACK_PROVIDER", "ollama")
+    monkeypatch.setattr(llm_provider, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(llm_provider, "_GENERATORS", {"groq": failing, "ollama": working})
+    monkeypatch.setattr(
+        llm_provider,
+        "_breakers",
+        {name: CircuitBreaker(failure_threshold=2, reset_seconds=30) for name in ("groq", "ollama")},
+    )
+    return calls
+
+
+def test_generate_text_fails_over_to_the_fallback(providers):
+    assert llm_provider.generate_text("prompt") == ("answer", 12.0)
+    assert providers == ["groq", "ollama"]
+
+
+def test_open_circuit_skips_the_primary(providers):
+    llm_provider.generate_text("prompt")
+    llm_provider.generate_text("prompt")
+    providers.clear()
+
+    assert llm_provider.generate_text("prompt") == ("answer", 12.0)
+    assert providers == ["ollama"]
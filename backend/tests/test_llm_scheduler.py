@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from app.core import llm_scheduler
+from app.core.llm_scheduler import LLMScheduler, SchedulerTimeout, parse_reset_duration
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # a frozen clock: buckets only change when a test sets them
+    monkeypatch.setattr(llm_scheduler, "monotonic", lambda: 1000.0)
+    return LLMScheduler("test", requests_per_minute=60, tokens_per_minute=6000)
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def _grant_one_request(scheduler):
+    with scheduler._condition:
+        scheduler.requests.tokens = 1
+        scheduler._condition.notify_all()
+
+
+def test_parse_reset_duration():
+    assert parse_reset_duration("7.66s") == pytest.approx(7.66)
+    assert parse_reset_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_reset_duration("250ms") == pytest.approx(0.25)
+    assert parse_reset_duration("12") == 12.0
+    assert parse_reset_duration("soon") is None
+    assert parse_reset_duration(None) is None
+
+
+def test_interactive_call_overtakes_queued_batch_work(scheduler):
+    scheduler.requests.tokens = 0
+    order = []
+
+    def call(priority):
+        scheduler.acquire(10, priority=priority, timeout=30)
+        order.append(priority)
+
+    batch = threading.Thread(target=call, args=("batch",))
+    batch.start()
+    _wait_until(lambda: len(scheduler._queue) == 1)
+    interactive = threading.Thread(target=call, args=("interactive",))
+    interactive.start()
+    _wait_until(lambda: len(scheduler._queue) == 2)
+
+    _grant_one_request(scheduler)
+    interactive.join(5)
+    assert order == ["interactive"]
+
+    _grant_one_request(scheduler)
+    batch.join(5)
+    assert order == ["interactive", "batch"]
+    assert scheduler._queue == []
+
+
+def test_timeout_reports_when_budget_returns(scheduler):
+    scheduler.requests.tokens = 0
+    with pytest.raises(SchedulerTimeout) as excinfo:
+        scheduler.acquire(10, timeout=0)
+    # one request refills in a second at 60 RPM
+    assert excinfo.value.retry_after == pytest.approx(1.0)
+    assert scheduler._queue == []
+
+
+def test_settle_refunds_over_reserved_tokens(scheduler):
+    scheduler.acquire(1000)
+    assert scheduler.tokens.tokens == 5000
+    scheduler.settle(1000, 400)
+    assert scheduler.tokens.tokens == 5600
+    scheduler.settle(1000, None)
+    assert scheduler.tokens.tokens == 5600
+
+
+def test_observe_headers_trusts_the_provider(scheduler):
+    scheduler.observe_headers({
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "2m59.56s",
+        "x-ratelimit-remaining-tokens": "500",
+        "x-ratelimit-limit-tokens": "12000",
+    })
+    assert scheduler.requests.tokens == 0
+    assert scheduler.paused_until == pytest.approx(1179.56)
+    assert scheduler.tokens.tokens == 500
+    assert scheduler.tokens.capacity == 12000
+    assert scheduler.tokens.refill_per_second == 200
+
+
+def test_retry_after_pauses_the_queue(scheduler):
+    scheduler.observe_headers({"retry-after": "30"})
+    assert scheduler.paused_until == 1030.0
+    with pytest.raises(SchedulerTimeout) as excinfo:
+        scheduler.acquire(10, timeout=0)
+    assert excinfo.value.retry_after == 30.0
@@ -0,0 +1,95 @@
+import tracemalloc
+from collections import defaultdict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import memory
+from app.core.memory import RequestMemoryTrace, record_request_memory, should_trace_memory
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def fresh_history(monkeypatch):
+    monkeypatch.setattr(memory, "_route_peaks", defaultdict(dict))
+    monkeypatch.setattr(memory, "_route_growth", {})
+
+
+def test_trace_reports_peak_retained_and_sites():
+    trace = RequestMemoryTrace.begin()
+    kept = bytearray(2 * MB)
+    temporary = bytearray(6 * MB)
+    del temporary
+    usage = trace.finish()
+
+    assert not tracemalloc.is_tracing()
+    assert usage["peak_bytes"] >= 8 * MB
+    assert 2 * MB <= usage["retained_bytes"] < 3 * MB
+    assert usage["retained_sites"][0]["site"].startswith("test_memory.py:")
+    assert usage["retained_sites"][0]["bytes"] >= 2 * MB
+    del kept
+
+
+def test_only_one_request_is_traced_at_a_time():
+    first = RequestMemoryTrace.begin()
+    try:
+        assert RequestMemoryTrace.begin() is None
+    finally:
+        first.finish()
+    second = RequestMemoryTrace.begin()
+    assert second is not None
+    second.finish()
+
+
+def test_header_opts_a_request_in(monkeypatch):
+    monkeypatch.setattr(memory, "MEMORY_TRACE_SAMPLE_RATE", 0)
+    assert should_trace_memory("1") and should_trace_memory(" TRUE ")
+    assert not should_trace_memory(None) and not should_trace_memory("0")
+
+
+def usage(peak_bytes):
+    return {"peak_bytes": peak_bytes, "retained_bytes": 0, "peak_sites": [], "retained_sites": []}
+
+
+def record(corpus_chunks, peak_bytes, route="/api/query"):
+    return record_request_memory(
+        usage(peak_bytes),
+        trace_id="t",
+        route=route,
+        method="POST",
+        status=200,
+        corpus_chunks=corpus_chunks,
+        duration_ms=1.0,
+    )
+
+
+def test_peaks_proportional_to_the_corpus_are_flagged(fresh_history):
+    record(100, MB)
+    record(400, 4 * MB)
+    assert memory._route_growth["POST /api/query"] == {
+        "corpus_chunks": [100, 400],
+        "median_peak_bytes": [MB, 4 * MB],
+        "elasticity": 1.0,
+        "growing": True,
+    }
+
+
+def test_flat_peaks_are_not_flagged(fresh_history):
+    record(100, MB, route="/api/documents")
+    record(150, MB, route="/api/documents")
+    # not enough corpus growth to judge yet
+    assert "POST /api/documents" not in memory._route_growth
+    record(1000, MB, route="/api/documents")
+    assert memory._route_growth["POST /api/documents"]["growing"] is False
+
+
+def test_traced_request_gets_memory_headers():
+    from app.main import app
+
+    client = TestClient(app)
+    response = client.get("/", headers={"X-Memory-Trace": "1"})
+    assert response.status_code == 200
+    assert int(response.headers["X-Memory-Peak-Bytes"]) >= 0
+    trace_id = response.headers["X-Trace-Id"]
+    assert memory.memory_report(trace_id=trace_id)["recent"][0]["route"] == "/"
@@ -0,0 +1,56 @@
+import re
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core.metrics import StageTimer
+
+
+def stage_samples(route, stage):
+    return REGISTRY.get_sample_value("rag_stage_duration_seconds_count", {"route": route, "stage": stage}) or 0
+
+
+def test_repeated_stages_accumulate():
+    timer = StageTimer("test")
+    timer.add("score", 1.5)
+    timer.add("log", 0.25)
+    timer.add("score", 2.0)
+    assert timer.as_dict() == {"score": 3.5, "log": 0.25}
+    assert timer.server_timing() == "score;dur=3.5, log;dur=0.25"
+
+
+def test_stage_context_records_time_even_on_error():
+    timer = StageTimer("test")
+    try:
+        with timer.stage("llm"):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert "llm" in timer.as_dict()
+
+
+def test_observe_counts_each_stage_once_per_request():
+    timer = StageTimer("observe-test")
+    for _ in range(3):
+        with timer.stage("score"):
+            pass
+    timer.observe()
+    assert stage_samples("observe-test", "score") == 1
+
+
+def test_query_response_carries_server_timing():
+    from app.main import app
+
+    client = TestClient(app)
+    before = stage_samples("query", "corpus_load")
+    response = client.post("/api/query", json={"query": "which vector database is used?"})
+    assert response.status_code == 200
+    timings = dict(
+        re.fullmatch(r"([a-z_]+);dur=([0-9.]+)", part).groups() for part in response.headers["Server-Timing"].split(", ")
+    )
+    # pipeline stages from the route, then admission and total from the middleware
+    assert {"corpus_load", "score", "log", "total"} <= set(timings)
+    assert list(timings)[-1] == "total"
+    assert float(timings["total"]) >= float(timings["score"])
+    assert float(response.headers["X-Response-Time-Ms"]) == float(timings["total"])
+    assert stage_samples("query", "corpus_load") == before + 1
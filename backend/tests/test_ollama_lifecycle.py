@@ -0,0 +1,59 @@
+import time
+
+import pytest
+import requests
+
+from app.core import ollama_lifecycle as lifecycle_module
+from app.core.ollama_lifecycle import COLD_LOAD_MS, OllamaLifecycle, context_window, keep_alive_value
+
+SETTINGS = {"base_url": "http://ollama.invalid", "model": "llama3", "timeout": 1}
+
+
+@pytest.fixture
+def lifecycle(monkeypatch):
+    lifecycle = OllamaLifecycle(SETTINGS)
+    yield lifecycle
+    lifecycle.stop()
+
+
+def test_keep_alive_accepts_seconds_or_durations():
+    assert keep_alive_value("-1") == -1
+    assert keep_alive_value("30m") == "30m"
+
+
+def test_context_window_is_fixed_and_rounded(monkeypatch):
+    monkeypatch.setattr(lifecycle_module, "OLLAMA_NUM_CTX", 0)
+    monkeypatch.setattr(lifecycle_module, "CONTEXT_TOKEN_BUDGET", 3000)
+    assert context_window() == 4096
+    monkeypatch.setattr(lifecycle_module, "OLLAMA_NUM_CTX", 8192)
+    assert context_window() == 8192
+
+
+def test_calls_are_split_by_load_duration(lifecycle):
+    assert lifecycle.record_call(900.0, (COLD_LOAD_MS + 1) * 1_000_000) == "cold"
+    assert lifecycle.record_call(120.0, 1_000) == "warm"
+    assert lifecycle.record_call(110.0, None) == "warm"
+    status = lifecycle.status()
+    assert status["cold"]["count"] == 1 and status["warm"]["count"] == 2
+    assert status["loaded"] is True
+
+
+@pytest.mark.parametrize("preload", [False, True])
+def test_keep_warm_waits_a_full_interval_after_startup(lifecycle, monkeypatch, preload):
+    calls = []
+
+    def unreachable(*args, **kwargs):
+        calls.append(time.monotonic())
+        raise requests.ConnectionError("refused")
+
+    monkeypatch.setattr(lifecycle_module, "OLLAMA_PRELOAD", preload)
+    monkeypatch.setattr(lifecycle_module, "OLLAMA_KEEP_WARM_SECONDS", 0.4)
+    monkeypatch.setattr(lifecycle_module.requests, "post", unreachable)
+
+    lifecycle.start()
+    time.sleep(0.2)
+    # only the preload itself, never an immediate ping after it fails
+    assert len(calls) == int(preload)
+    time.sleep(0.4)
+    assert len(calls) == int(preload) + 1
+    assert lifecycle.failures == len(calls)
@@ -0,0 +1,76 @@
+import json
+import pstats
+import threading
+import time
+
+import pytest
+
+from app.core import profiling
+from app.core.profiling import get_profile_path, list_profiles, profile_request
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_INTERVAL_MS", 1)
+    monkeypatch.setattr(profiling, "log_trace_event", lambda *args, **kwargs: None)
+    return tmp_path
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_profiled_block_writes_all_formats(profile_dir):
+    with profile_request("abc123", "query", True):
+        busy(0.05)
+    meta = json.loads((profile_dir / "abc123.json").read_text())
+    assert meta["kind"] == "query"
+    assert meta["sample_count"] > 0
+    pstats.Stats(str(get_profile_path("abc123", "pstats")))
+    stacks = get_profile_path("abc123", "collapsed").read_text().splitlines()
+    assert any("busy (test_profiling.py" in line for line in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert [entry["trace_id"] for entry in list_profiles()] == ["abc123"]
+
+
+def test_disabled_profile_writes_nothing(profile_dir):
+    with profile_request("abc123", "query", False):
+        pass
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_concurrent_profile_is_skipped(profile_dir):
+    inside, release = threading.Event(), threading.Event()
+
+    def first():
+        with profile_request("aaaaaa", "query", True):
+            inside.set()
+            release.wait()
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    inside.wait()
+    with profile_request("bbbbbb", "query", True):
+        pass
+    release.set()
+    thread.join()
+    assert get_profile_path("aaaaaa", "pstats") is not None
+    assert get_profile_path("bbbbbb", "pstats") is None
+
+
+def test_old_captures_are_pruned(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_CAPTURES", 2)
+    for trace_id in ("aaaaa1", "aaaaa2", "aaaaa3"):
+        with profile_request(trace_id, "upload", True):
+            pass
+        time.sleep(0.01)
+    assert [entry["trace_id"] for entry in list_profiles()] == ["aaaaa3", "aaaaa2"]
+    assert not list(profile_dir.glob("aaaaa1*"))
+
+
+@pytest.mark.parametrize("trace_id, fmt", [("../../etc", "pstats"), ("abc123", "html")])
+def test_profile_lookup_rejects_bad_input(trace_id, fmt):
+    assert get_profile_path(trace_id, fmt) is None
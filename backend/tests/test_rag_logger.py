@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from app.core import rag_logger
+from app.core.document_store import DocumentStore
+from app.core.rag_logger import content_hash, log_trace_event, read_recent_jsonl, resolve_log_entry, trace_sampled
+from app.core.utils import TextChunk
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    index(store, "first version")
+    return store
+
+
+def index(store, text):
+    return store.upsert_document(
+        file_path="/tmp/a.txt",
+        content_hash=text,
+        file_size=len(text),
+        chunks=[TextChunk(page_content=f"Document: a.txt\n{text}", metadata={"chunk_index": 0})],
+    )["document"]
+
+
+def reference(store):
+    chunk = store.list_chunks()[0]
+    return {"id": chunk["id"], "chunk_index": 0, "content_hash": content_hash(chunk["content"])}
+
+
+def test_references_resolve_to_current_text(store):
+    entry = resolve_log_entry({"retrieved": [reference(store)]}, store)
+    chunk = entry["retrieved"][0]
+    assert chunk["content"] == "Document: a.txt\nfirst version"
+    assert chunk["stale"] is False
+    assert chunk["preview"]
+
+
+def test_changed_chunk_is_flagged_stale(store):
+    logged = reference(store)
+    index(store, "second version")
+    chunk = resolve_log_entry({"retrieved": [logged]}, store)["retrieved"][0]
+    assert chunk["stale"] is True
+    assert chunk["content"].endswith("second version")
+
+
+def test_deleted_chunk_is_flagged_missing(store):
+    logged = {**reference(store), "id": "gone:0"}
+    assert resolve_log_entry({"retrieved": [logged]}, store)["retrieved"] == [{**logged, "missing": True}]
+
+
+def test_full_entries_are_left_alone(store):
+    entry = {"retrieved": [{"id": "x", "content": "logged in full"}]}
+    assert resolve_log_entry(entry, store) == entry
+
+
+def test_sampling_keeps_or_drops_whole_traces(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(rag_logger, "TRACE_LOG_PATH", str(path))
+    monkeypatch.setattr(rag_logger, "TRACE_SAMPLE_RATE", 0.5)
+    trace_ids = [f"trace{number}" for number in range(200)]
+    for trace_id in trace_ids:
+        log_trace_event("query.start", {}, trace_id=trace_id)
+        log_trace_event("query.end", {}, trace_id=trace_id)
+    log_trace_event("query.error", {}, trace_id="always", always=True)
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    kept = {event["trace_id"] for event in events} - {"always"}
+    assert 50 < len(kept) < 150
+    assert kept == {trace_id for trace_id in trace_ids if trace_sampled(trace_id)}
+    assert len(events) == 2 * len(kept) + 1
+    assert read_recent_jsonl(str(path), limit=1)[0]["trace_id"] == "always"
@@ -0,0 +1,117 @@
+import mmap
+import sqlite3
+
+import pytest
+
+from app.core import retrieval_index
+from app.core.document_store import DocumentStore
+from app.core.retrieval_index import RetrievalIndex, ensure_retrieval_index, get_retrieval_index, index_path
+from app.core.utils import TextChunk
+from app.routes.query import _expand_phrase_queries, _extract_phrases, _meaningful_tokens, _retrieve_chunks
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval_index, "RETRIEVAL_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(retrieval_index, "_INDEX", None)
+    store = DocumentStore(str(tmp_path / "store.sqlite3"))
+    add(store, "a.txt", ["python and kubernetes", "only python here"])
+    return store
+
+
+def add(store, filename, texts):
+    store.upsert_document(
+        file_path=f"/tmp/{filename}",
+        content_hash="|".join(texts),
+        file_size=1,
+        chunks=[
+            TextChunk(page_content=f"Document: {filename}\n{text}", metadata={"chunk_index": index})
+            for index, text in enumerate(texts)
+        ],
+    )
+
+
+def test_index_is_written_once_per_corpus_version(store):
+    path = ensure_retrieval_index(store)
+    assert path == index_path(store, store.corpus_version())
+    modified = path.stat().st_mtime_ns
+    assert ensure_retrieval_index(store) == path
+    assert path.stat().st_mtime_ns == modified
+
+
+def test_workers_map_the_file_read_only(store):
+    index = get_retrieval_index(store)
+    assert isinstance(index._map, mmap.mmap)
+    assert get_retrieval_index(store) is index
+    with pytest.raises(TypeError):
+        index._map[0:1] = b"x"
+
+
+def test_new_corpus_version_maps_a_new_index(store):
+    first = get_retrieval_index(store)
+    add(store, "b.txt", ["kubernetes cluster"])
+    second = get_retrieval_index(store)
+    assert second is not first
+    assert second.chunk_count == first.chunk_count + 1
+    assert RetrievalIndex(second.path).chunk_count == second.chunk_count
+
+
+def baseline_score(chunk, query, tokens, phrase_queries):
+    """Per-chunk scoring of the original dict-based retrieval."""
+    text = chunk["content"].lower()
+    filename = chunk["filename"].lower()
+    score = 30 if query.lower() and query.lower() in text else 0
+    for phrase in phrase_queries:
+        score += 20 if phrase.lower() in text else 0
+        score += 5 if phrase.lower() in filename else 0
+    for token in tokens:
+        if len(token) <= 1:
+            continue
+        score += min(text.count(token), 6) * 3
+        score += 2 if token in filename else 0
+    return score
+
+
+def baseline_ranking(store, query, top_k):
+    tokens = _meaningful_tokens(query)
+    phrase_queries = _expand_phrase_queries(_extract_phrases(query), tokens)
+    scored = [
+        {**chunk, "score": baseline_score(chunk, query, tokens, phrase_queries)}
+        for chunk in store.list_chunks()
+    ]
+    scored = [chunk for chunk in scored if chunk["score"] > 0]
+    scored.sort(key=lambda chunk: (chunk["score"], chunk["document_updated_at"], -chunk["chunk_index"]), reverse=True)
+    return [(chunk["id"], chunk["score"]) for chunk in scored[:top_k]], len(scored)
+
+
+@pytest.fixture
+def corpus(store):
+    add(store, "kubernetes_notes.txt", ["kubernetes kubernetes operators", "python tooling", "nothing relevant"])
+    add(store, "resume.pdf", ["Senior engineer. Python, Kubernetes and Go.", "python and kubernetes"])
+    add(store, "python_guide.txt", ["python and kubernetes", "python and kubernetes", '"machine learning" at scale'])
+    connection = sqlite3.connect(store.db_path)
+    with connection:
+        # two documents share a timestamp so ties fall through to chunk order
+        connection.execute("UPDATE documents SET updated_at = '2026-01-01T00:00:00+00:00' WHERE filename != 'resume.pdf'")
+    connection.close()
+    add(store, "extra.txt", ["python"])
+    return store
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "python",
+        "python and kubernetes",
+        "Where did he use Kubernetes?",
+        '"machine learning"',
+        "kubernetes notes",
+        "unrelated words entirely",
+    ],
+)
+@pytest.mark.parametrize("top_k", [2, 5, 50])
+def test_ranking_matches_the_baseline(corpus, query, top_k):
+    expected, scored_count = baseline_ranking(corpus, query, top_k)
+    chunks, count, _, _ = _retrieve_chunks(query, top_k=top_k, store=corpus)
+    assert [(chunk["id"], chunk["score"]) for chunk in chunks] == expected
+    assert count == scored_count
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)))
+        return results, calls, flight.in_flight()
+
+    results, calls, in_flight = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(leader for _, leader in results) == [False, False, True]
+    assert {value for value, _ in results} == {"result"}
+    assert in_flight == 0
+
+
+def test_exception_reaches_every_caller_and_is_not_cached():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flight.do("key", failing), flight.do("key", failing), return_exceptions=True
+        )
+        assert flight.in_flight() == 0
+
+        async def ok():
+            return "fresh"
+
+        return results, calls, await flight.do("key", ok)
+
+    results, calls, retry = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retry == ("fresh", True)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, flight.in_flight()
+
+    assert asyncio.run(scenario()) == (("done", False), 0)
+
+
+def test_cancelled_follower_does_not_cancel_the_work():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        release.set()
+        return await leader
+
+    assert asyncio.run(scenario()) == ("done", True)
@@ -0,0 +1,105 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+from fastapi import UploadFile
+
+from app.core import utils
+from app.routes import upload
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "BASE_UPLOAD_DIR", tmp_path)
+    return tmp_path
+
+
+def zip_upload(name, members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for member, data in members.items():
+            archive.writestr(member, data)
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename=name)
+
+
+def tar_upload(name, members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for member, data in members.items():
+            info = tarfile.TarInfo(member)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename=name)
+
+
+def plain(name, data=b"some text"):
+    return UploadFile(file=io.BytesIO(data), filename=name)
+
+
+def statuses(results):
+    return [(result["filename"], result.get("status", "staged")) for result in results]
+
+
+def test_archives_are_flattened_and_filtered(upload_dir):
+    results, staged = upload._stage_uploads(
+        [
+            plain("notes.txt"),
+            zip_upload("docs.zip", {"a/one.txt": b"one", "b/notes.txt": b"again", "image.png": b"png", ".hidden": b""}),
+            tar_upload("more.tar.gz", {"deep/dir/two.txt": b"two"}),
+        ]
+    )
+    assert statuses(results) == [
+        ("notes.txt", "staged"),
+        ("one.txt", "staged"),
+        ("notes.txt", "skipped"),
+        ("image.png", "skipped"),
+        ("two.txt", "staged"),
+    ]
+    assert results[2]["error"] == "duplicate filename in batch"
+    assert results[1]["archive"] == "docs.zip"
+    assert sorted(path.name for path in upload_dir.iterdir()) == ["notes.txt", "one.txt", "two.txt"]
+    assert (upload_dir / "two.txt").read_bytes() == b"two"
+    assert len(staged) == 3
+
+
+def test_unreadable_archive_fails_alone(upload_dir):
+    results, staged = upload._stage_uploads([plain("broken.zip", b"not a zip"), plain("ok.txt")])
+    assert statuses(results) == [("broken.zip", "failed"), ("ok.txt", "staged")]
+    assert len(staged) == 1
+
+
+def test_oversized_members_fail_without_filling_the_disk(upload_dir, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_MAX_MEMBER_BYTES", 1000)
+    bomb = b"\0" * 50_000
+    results, staged = upload._stage_uploads([zip_upload("bomb.zip", {"bomb.txt": bomb, "small.txt": b"fine"})])
+    assert statuses(results) == [("bomb.txt", "failed"), ("small.txt", "staged")]
+    assert "decompressed" in results[0]["error"]
+    assert not (upload_dir / "bomb.txt").exists()
+
+
+def test_lying_size_header_is_caught_while_copying(upload_dir, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_MAX_MEMBER_BYTES", 1000)
+    members = iter([("liar.txt", 10, io.BytesIO(b"x" * 5000))])
+    monkeypatch.setattr(upload, "_archive_members", lambda archive: members)
+    results, _ = upload._stage_uploads([plain("liar.zip")])
+    assert statuses(results) == [("liar.txt", "failed")]
+    assert not (upload_dir / "liar.txt").exists()
+
+
+def test_batch_total_is_capped(upload_dir, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_MAX_BATCH_BYTES", 2500)
+    members = {f"part{index}.txt": b"y" * 1000 for index in range(4)}
+    results, staged = upload._stage_uploads([tar_upload("parts.tar.gz", members)])
+    assert [status for _, status in statuses(results)] == ["staged", "staged", "failed", "failed"]
+    assert sum(path.stat().st_size for path in upload_dir.iterdir()) == 2000
+
+
+def test_too_many_files_leaves_nothing_staged(upload_dir, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_MAX_FILES", 3)
+    archive = zip_upload("many.zip", {f"file{index}.txt": b"text" for index in range(5)})
+    with pytest.raises(ValueError):
+        upload._stage_uploads([archive])
+    assert list(upload_dir.iterdir()) == []
@@ -1,14 +1,16 @@
 import { useState } from "react";
-import { uploadDocument } from "../services/api";
+import { uploadDocument, uploadDocuments } from "../services/api";
+
+const ARCHIVE_PATTERN = /\.(zip|tar|tgz|tar\.gz|tar\.bz2|tar\.xz)$/i;
 
 const FileUpload = ({ onUploadSuccess }) => {
-  const [file, setFile] = useState(null);
+  const [files, setFiles] = useState([]);
   const [isUploading, setIsUploading] = useState(false);
   const [error, setError] = useState("");
 
   const handleSubmit = async (event) => {
     event.preventDefault();
-    if (!file) {
+    if (!files.length) {
       setError("Select a file first.");
       return;
     }
@@ -17,13 +19,14 @@ const FileUpload = ({ onUploadSuccess }) => {
     setError("");
 
     try {
-      const result = await uploadDocument(file);
+      const single = files.length === 1 && !ARCHIVE_PATTERN.test(files[0].name);
+      const result = single ? await uploadDocument(files[0]) : await uploadDocuments(files);
       onUploadSuccess(result.message || "Uploaded successfully.");
     } catch (err) {
       setError(err.response?.data?.detail || err.message || "Upload failed.");
     } finally {
       setIsUploading(false);
-      setFile(null);
+      setFiles([]);
     }
   };
 
@@ -32,8 +35,9 @@ const FileUpload = ({ onUploadSuccess }) => {
       <label className="file-input">
         <input
           type="file"
-          accept=".pdf,.txt,.doc,.docx"
-          onChange={(event) => setFile(event.target.files[0] || null)}
+          accept=".pdf,.txt,.doc,.docx,.zip,.tar,.tgz,.gz,.bz2,.xz"
+          multiple
+          onChange={(event) => setFiles(Array.from(event.target.files))}
           disabled={isUploading}
         />
       </label>
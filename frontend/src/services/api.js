@@ -14,6 +14,16 @@ export const uploadDocument = async (file) => {
   return data;
 };
 
+export const uploadDocuments = async (files) => {
+  const formData = new FormData();
+  files.forEach((file) => formData.append("files", file));
+
+  const { data } = await api.post("/upload/batch", formData, {
+    headers: { "Content-Type": "multipart/form-data" },
+  });
+  return data;
+};
+
 export const queryDocuments = async (payload) => {
   const { data } = await api.post("/query", payload);
   return data;